@@ -1,120 +1,422 @@
 import gradio as gr
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
-from functools import lru_cache
-import re
+from transformers import (
+    AutoModelForCausalLM, AutoTokenizer, DynamicCache, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+)
+from transformers.generation.streamers import BaseStreamer
+import copy
+import math
+import os
+import queue
+import threading
+import time
+
+from prompts import TONE_PROMPTS, audio_friendly_formatting, tone_conversation
 
 # Load the Granite model
 model_path = "ibm-granite/granite-3.2-2b-instruct"
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
-@lru_cache(maxsize=1)
+# Generation budget: rewrites run about as long as their input, so each request generates
+# up to OUTPUT_RATIO x the input tokens + OUTPUT_MARGIN, within [MIN_NEW_TOKENS, MAX_NEW_TOKENS]
+OUTPUT_RATIO = 1.5
+OUTPUT_MARGIN = 32
+MIN_NEW_TOKENS = 64
+MAX_NEW_TOKENS = 1000
+# Prompt plus generation budget must fit here; longer inputs are rejected before generating
+MAX_CONTEXT_TOKENS = 8192
+
+# Micro-batching: requests arriving within BATCH_WINDOW seconds of each other (or while a
+# batch is generating) are generated together, up to MAX_BATCH_SIZE at a time
+BATCH_WINDOW = 0.02
+MAX_BATCH_SIZE = 8
+
+# Optional directory holding a pre-converted copy of the weights (safetensors in the runtime
+# dtype), e.g. on persistent Space storage; it is written on the first load and reused after
+WEIGHTS_CACHE_DIR = os.getenv("GRANITE_WEIGHTS_CACHE", "")
+# How long a request waits for the model while it is still loading
+MODEL_WAIT_TIMEOUT = 600
+
+# CPU precision (GPUs always use bfloat16): "float32" (default); "bfloat16", half the memory
+# and fast on CPUs with AVX512-BF16/AMX; or "int8", dynamic int8 quantization of the linear
+# layers, roughly a quarter of the float32 memory for the quantized weights
+CPU_PRECISION = os.getenv("GRANITE_CPU_PRECISION", "float32").strip().lower()
+if CPU_PRECISION not in ("float32", "bfloat16", "int8"):
+    raise ValueError(f"GRANITE_CPU_PRECISION must be float32, bfloat16 or int8, not {CPU_PRECISION!r}")
+
+if torch.cuda.is_available() or CPU_PRECISION == "bfloat16":
+    torch_dtype = torch.bfloat16
+else:
+    torch_dtype = torch.float32
+# int8 weights are quantized after loading; the cached weights stay in float32
+quantize_int8 = device == "cpu" and CPU_PRECISION == "int8"
+
+# The model loads in a background thread so the UI is up (and the port bound) immediately
+model = None
+tokenizer = None
+model_ready = threading.Event()
+model_error = None
+load_timings = {}
+# tone -> (prefix token ids, key/value cache of the prefix), filled by build_prefix_caches()
+prefix_caches = {}
+_load_lock = threading.Lock()
+_load_thread = None
+
+def _cached_weights_path():
+    if not WEIGHTS_CACHE_DIR:
+        return None
+    return os.path.join(WEIGHTS_CACHE_DIR, f"{model_path.replace('/', '--')}-{str(torch_dtype).split('.')[-1]}")
+
 def load_model():
-    model = AutoModelForCausalLM.from_pretrained(
-        model_path,
+    """Load tokenizer and weights, from the local weight cache when present; returns (model, tokenizer, source)"""
+    cached = _cached_weights_path()
+    use_cache = cached is not None and os.path.exists(os.path.join(cached, "config.json"))
+    source = cached if use_cache else model_path
+    # Batched prompts are padded on the left so every row ends where generation starts
+    loaded_tokenizer = AutoTokenizer.from_pretrained(source, padding_side="left")
+    if loaded_tokenizer.pad_token is None:
+        loaded_tokenizer.pad_token = loaded_tokenizer.eos_token
+    # safetensors are memory-mapped and copied straight into place, without a second full copy in RAM
+    loaded_model = AutoModelForCausalLM.from_pretrained(
+        source,
         device_map="auto",
-        torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
+        torch_dtype=torch_dtype,
+        low_cpu_mem_usage=True,
+        use_safetensors=True,
     )
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-    return model, tokenizer
+    loaded_model.eval()
+    if cached is not None and not use_cache:
+        try:
+            loaded_model.save_pretrained(cached, safe_serialization=True)
+            loaded_tokenizer.save_pretrained(cached)
+        except Exception as e:
+            print(f"Could not write the weight cache: {e}")
+    if quantize_int8:
+        # Linear weights become int8; activations are quantized on the fly per batch
+        loaded_model = torch.ao.quantization.quantize_dynamic(loaded_model, {torch.nn.Linear}, dtype=torch.qint8)
+    return loaded_model, loaded_tokenizer, "cache" if use_cache else "hub"
 
-model, tokenizer = load_model()
+def _load_in_background():
+    global model, tokenizer, model_error
+    start = time.perf_counter()
+    try:
+        loaded_model, loaded_tokenizer, source = load_model()
+        load_timings["weights_s"] = round(time.perf_counter() - start, 2)
+        load_timings["source"] = source
+        load_timings["precision"] = "int8" if quantize_int8 else str(torch_dtype).split(".")[-1]
+        model, tokenizer = loaded_model, loaded_tokenizer
+        # One tiny generation so the first user request does not pay for lazy initialisation
+        warm = time.perf_counter()
+        inputs = tokenizer("Hello", return_tensors="pt").to(device)
+        with torch.no_grad():
+            model.generate(**inputs, max_new_tokens=1, pad_token_id=tokenizer.pad_token_id)
+        load_timings["warmup_s"] = round(time.perf_counter() - warm, 2)
+        prefill = time.perf_counter()
+        try:
+            build_prefix_caches()
+        except Exception as e:
+            # Only an optimisation: requests then prefill their whole prompt
+            print(f"Could not build the prompt prefix caches: {e}")
+        load_timings["prefix_cache_s"] = round(time.perf_counter() - prefill, 2)
+    except Exception as e:
+        model_error = e
+    finally:
+        load_timings["ready_s"] = round(time.perf_counter() - start, 2)
+        print(f"Model load: {load_timings}" + (f" failed: {model_error}" if model_error else ""))
+        model_ready.set()
 
-def audio_friendly_formatting(text):
-    """Format text to be more audio-friendly for TTS conversion"""
-    # Remove excessive punctuation
-    text = re.sub(r'[.]{2,}', '...', text)
-    
-    # Ensure proper spacing after punctuation
-    text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
-    
-    # Convert numbers to words for better TTS pronunciation
-    numbers = {'1': 'one', '2': 'two', '3': 'three', '4': 'four', '5': 'five', 
-              '6': 'six', '7': 'seven', '8': 'eight', '9': 'nine', '0': 'zero'}
-    for num, word in numbers.items():
-        text = text.replace(num, word)
-    
-    # Add pauses for better audio pacing
-    text = re.sub(r'([,;:])', r'\1 ', text)
-    
-    # Ensure sentences end with proper punctuation
-    sentences = text.split('. ')
-    formatted_sentences = []
-    for sentence in sentences:
-        if sentence and not sentence.endswith(('.', '!', '?')):
-            sentence += '.'
-        formatted_sentences.append(sentence)
-    
-    return '. '.join(formatted_sentences)
+def build_prefix_caches():
+    """Prefill the fixed part of each tone's prompt once and keep its key/value cache"""
+    for tone in TONE_PROMPTS:
+        # The prefix is what the chat template renders the same way whatever the user's text
+        first = tokenizer.apply_chat_template(tone_conversation("a", tone), add_generation_prompt=True)
+        second = tokenizer.apply_chat_template(tone_conversation("b", tone), add_generation_prompt=True)
+        prefix = first[:next(i for i, (a, b) in enumerate(zip(first, second)) if a != b)]
+        with torch.no_grad():
+            output = model(torch.tensor([prefix], device=device), past_key_values=DynamicCache(), use_cache=True)
+        prefix_caches[tone] = (prefix, output.past_key_values)
 
-def rewrite_tone(text, tone, max_tokens=1000):
-    """Rewrite text in specified tone optimized for audio"""
-    
-    tone_prompts = {
-        "neutral": """You are an expert text rewriter. Rewrite the following text in a clear, neutral, and professional tone. 
-        Make it suitable for audio narration by using simple sentence structures, avoiding complex punctuation, 
-        and ensuring smooth flow. Keep the same meaning but make it sound natural when spoken aloud.""",
-        
-        "suspenseful": """You are an expert text rewriter. Rewrite the following text in a suspenseful, mysterious tone 
-        that builds tension and intrigue. Use shorter sentences for dramatic effect, create anticipation, 
-        and add elements that will sound engaging when narrated as audio. Make listeners want to know what happens next.""",
-        
-        "inspiring": """You are an expert text rewriter. Rewrite the following text in an inspiring, motivational tone 
-        that uplifts and energizes the reader. Use positive language, powerful imagery, and rhythmic phrases 
-        that will sound compelling when spoken aloud. Make it emotionally resonant and encouraging."""
+def start_model_loading():
+    """Start loading the model in the background (once)"""
+    global _load_thread
+    with _load_lock:
+        if _load_thread is None:
+            _load_thread = threading.Thread(target=_load_in_background, name="model-loader", daemon=True)
+            _load_thread.start()
+
+def wait_for_model(timeout=MODEL_WAIT_TIMEOUT):
+    """Block until the model is loaded; raises if loading failed or takes too long"""
+    start_model_loading()
+    if not model_ready.wait(timeout):
+        raise RuntimeError("The model is still loading, please try again shortly.")
+    if model_error is not None:
+        raise RuntimeError(f"The model failed to load: {model_error}")
+
+def readiness():
+    """Loading state of the model, for health checks and clients waiting on a cold start"""
+    return {
+        "ready": model_ready.is_set() and model_error is None,
+        "loading": _load_thread is not None and not model_ready.is_set(),
+        "error": str(model_error) if model_error else None,
+        "timings": dict(load_timings),
     }
-    
-    system_prompt = tone_prompts.get(tone, tone_prompts["neutral"])
-    
-    conversation = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"Please rewrite this text: {text}"}
-    ]
-    
-    # Apply chat template
-    input_ids = tokenizer.apply_chat_template(
-        conversation, 
-        return_tensors="pt", 
-        add_generation_prompt=True,
-        return_dict=True
-    ).to(device)
-    
-    # Generate response
+
+def warmup():
+    """Start loading the model if needed and wait until it is ready"""
+    try:
+        wait_for_model()
+    except RuntimeError:
+        pass
+    return readiness()
+
+def status_text():
+    state = readiness()
+    if state["ready"]:
+        timings = state["timings"]
+        return f"✅ Model ready ({timings.get('precision')}, loaded in {timings.get('ready_s')}s from {timings.get('source')})"
+    if state["error"]:
+        return f"❌ Model failed to load: {state['error']}"
+    return "⏳ Model is loading in the background; requests will wait for it."
+
+class _GenerationRequest:
+    def __init__(self, conversation, max_tokens, tone=None, streamer=None):
+        self.conversation = conversation
+        self.max_tokens = max_tokens
+        self.tone = tone
+        self.streamer = streamer
+        self.stop = threading.Event()
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+class MicroBatcher:
+    """Collects concurrent generation requests and runs them as one batched generate call"""
+
+    def __init__(self, window=BATCH_WINDOW, max_batch_size=MAX_BATCH_SIZE):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._requests = queue.Queue()
+        threading.Thread(target=self._run, name="generate-batcher", daemon=True).start()
+
+    def submit(self, conversation, max_tokens, tone=None, streamer=None):
+        """Queue a conversation without waiting; the returned request's done event is set when it finishes"""
+        request = _GenerationRequest(conversation, max_tokens, tone, streamer)
+        self._requests.put(request)
+        return request
+
+    def generate(self, conversation, max_tokens, tone=None):
+        """Generate a reply to one conversation; blocks until its batch has finished"""
+        request = self.submit(conversation, max_tokens, tone)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.response
+
+    def _run(self):
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                try:
+                    # Requests that queued up during the previous batch are taken without waiting
+                    batch.append(self._requests.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                for request, response in zip(batch, generate_batch(batch)):
+                    request.response = response
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    if request.streamer is not None:
+                        request.streamer.end()  # lets the consumer stop iterating
+            for request in batch:
+                request.done.set()
+
+class _StopWhenSet(StoppingCriteria):
+    """Ends generation once every event is set, e.g. when all the streaming clients have gone away"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return all(event.is_set() for event in self.events)
+
+class _BatchStreamer(BaseStreamer):
+    """Feeds each row of a batched generate call to that request's own streamer
+
+    Rows stop being fed after their own token budget, at the end of their reply
+    or once their client has gone away; the other rows keep generating.
+    """
+
+    def __init__(self, requests):
+        self.requests = requests
+        self.generated = [0] * len(requests)
+        self.finished = [request.streamer is None for request in requests]
+
+    def put(self, value):
+        # The first call carries the (left-padded) prompts, which the row streamers skip;
+        # later calls carry one new token per row
+        for row, request in enumerate(self.requests):
+            if self.finished[row]:
+                continue
+            tokens = value[row].reshape(-1)
+            request.streamer.put(tokens)
+            if value.dim() == 1:
+                self.generated[row] += 1
+                self.finished[row] = (self.generated[row] >= request.max_tokens or request.stop.is_set()
+                                      or tokens[0].item() == tokenizer.eos_token_id)
+
+    def end(self):
+        for request in self.requests:
+            if request.streamer is not None:
+                request.streamer.end()
+
+def generation_inputs(conversation, tone=None):
+    """Model inputs for one conversation, resuming from the tone's cached prompt prefix when it applies"""
+    ids = tokenizer.apply_chat_template(conversation, add_generation_prompt=True)
+    input_ids = torch.tensor([ids], device=device)
+    inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+    prefix, cache = prefix_caches.get(tone, ((), None))
+    if cache is not None and len(prefix) < len(ids) and ids[:len(prefix)] == list(prefix):
+        # generate() only prefills the tokens past the cached ones; it extends the cache it is
+        # given, so each request gets its own copy
+        inputs["past_key_values"] = copy.deepcopy(cache)
+    return inputs
+
+def generate_one(conversation, max_tokens, tone=None, streamer=None, stop=None):
+    """Generate and decode the reply to a single conversation, optionally streaming it and stopping early"""
+    inputs = generation_inputs(conversation, tone)
     with torch.no_grad():
         output = model.generate(
-            **input_ids,
+            **inputs,
             max_new_tokens=max_tokens,
             temperature=0.7,
             do_sample=True,
-            pad_token_id=tokenizer.eos_token_id
+            pad_token_id=tokenizer.pad_token_id,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList([_StopWhenSet([stop])]) if stop is not None else None
         )
+    return tokenizer.decode(output[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+def generate_batch(requests):
+    """Run one left-padded generate call for several requests and decode each reply, streaming the rows that ask for it"""
+    if len(requests) == 1:
+        # A lone request can reuse its tone's prefix cache; left padding would misalign it in a batch
+        request = requests[0]
+        return [generate_one(request.conversation, request.max_tokens, request.tone, request.streamer, request.stop)]
+    prompts = [
+        tokenizer.apply_chat_template(request.conversation, tokenize=False, add_generation_prompt=True)
+        for request in requests
+    ]
+    # The chat template already contains the special tokens
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True, add_special_tokens=False).to(device)
+    streaming = any(request.streamer is not None for request in requests)
+    with torch.no_grad():
+        output = model.generate(
+            **inputs,
+            max_new_tokens=max(request.max_tokens for request in requests),
+            temperature=0.7,
+            do_sample=True,
+            pad_token_id=tokenizer.pad_token_id,
+            streamer=_BatchStreamer(requests) if streaming else None,
+            # Requests that are not streamed never stop early, so only an all-streamed batch can
+            stopping_criteria=StoppingCriteriaList([_StopWhenSet([request.stop for request in requests])])
+        )
+    prompt_length = inputs["input_ids"].shape[1]
+    # Rows that finished early are padded; each reply is also cut to its own budget
+    return [
+        tokenizer.decode(output[i, prompt_length:prompt_length + request.max_tokens], skip_special_tokens=True)
+        for i, request in enumerate(requests)
+    ]
+
+batcher = MicroBatcher()
+
+def max_new_tokens_for(text):
+    """Generation budget sized from the exact token length of the input text"""
+    text_tokens = len(tokenizer.encode(text, add_special_tokens=False))
+    wanted = math.ceil(text_tokens * OUTPUT_RATIO) + OUTPUT_MARGIN
+    return max(MIN_NEW_TOKENS, min(MAX_NEW_TOKENS, wanted))
+
+def prepare_rewrite(text, tone, max_tokens=None):
+    """Wait for the model, then build the conversation and budget of a rewrite; returns (conversation, tone, max_tokens)"""
+    wait_for_model()
+    if max_tokens is None:
+        max_tokens = max_new_tokens_for(text)
     
-    # Decode response
-    response = tokenizer.decode(
-        output[0, input_ids["input_ids"].shape[1]:], 
-        skip_special_tokens=True
-    )
+    tone = tone if tone in TONE_PROMPTS else "neutral"
+    conversation = tone_conversation(text, tone)
+    
+    prompt_tokens = len(tokenizer.apply_chat_template(conversation, add_generation_prompt=True))
+    if prompt_tokens + max_tokens > MAX_CONTEXT_TOKENS:
+        raise ValueError(
+            f"Text is too long ({prompt_tokens} prompt tokens + {max_tokens} output tokens, "
+            f"limit {MAX_CONTEXT_TOKENS}). Please split it into shorter passages."
+        )
+    return conversation, tone, max_tokens
+
+def rewrite_tone(text, tone, max_tokens=None):
+    """Rewrite text in specified tone optimized for audio"""
+    conversation, tone, max_tokens = prepare_rewrite(text, tone, max_tokens)
+    
+    # Generate response (batched with any concurrent requests)
+    response = batcher.generate(conversation, max_tokens, tone)
     
     # Apply audio-friendly formatting
     formatted_response = audio_friendly_formatting(response)
     
     return formatted_response
 
+def stream_rewrite_tone(text, tone, max_tokens=None):
+    """Rewrite text like rewrite_tone, yielding the reply so far as tokens are generated
+
+    The partial replies are as generated; the last one is audio-formatted like rewrite_tone's result.
+    Generation stops early if the caller stops iterating (e.g. the client disconnects or cancels).
+    """
+    conversation, tone, max_tokens = prepare_rewrite(text, tone, max_tokens)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    # Batched with the other queued requests; the streamer is fed this request's row
+    request = batcher.submit(conversation, max_tokens, tone, streamer)
+    try:
+        response = ""
+        for piece in streamer:
+            response += piece
+            yield response
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        yield audio_friendly_formatting(request.response)
+    finally:
+        request.stop.set()
+
 def process_text(input_text, selected_tone):
     """Main processing function"""
     if not input_text.strip():
-        return "Please enter some text to rewrite."
+        raise gr.Error("Please enter some text to rewrite.")
     
     try:
         rewritten_text = rewrite_tone(input_text, selected_tone)
         return rewritten_text
     except Exception as e:
-        return f"Error processing text: {str(e)}"
+        # Raised rather than returned so API clients see a failed job, not a rewrite
+        raise gr.Error(f"Error processing text: {str(e)}")
+
+def process_text_stream(input_text, selected_tone):
+    """Streaming version of process_text: yields the rewritten text so far while it is generated"""
+    if not input_text.strip():
+        raise gr.Error("Please enter some text to rewrite.")
+    
+    try:
+        yield from stream_rewrite_tone(input_text, selected_tone)
+    except Exception as e:
+        # Raised rather than yielded so API clients see a failed job, not a rewrite
+        raise gr.Error(f"Error processing text: {str(e)}")
 
 # Create Gradio interface
 with gr.Blocks(title="Tone Rewriter for Audio") as iface:
     gr.Markdown("# 🎯 Tone Rewriter for Audio Conversion")
     gr.Markdown("Transform your text into different tones optimized for text-to-speech conversion using IBM Granite 3.2-2B-Instruct")
+    model_status = gr.Markdown(status_text())
     
     with gr.Row():
         with gr.Column():
@@ -154,11 +456,33 @@ with gr.Blocks(title="Tone Rewriter for Audio") as iface:
         fn=process_text
     )
     
+    # The button streams the rewrite as it is generated (/process_text_stream); /process_text
+    # returns it once finished. Both let concurrent requests reach the batcher instead of
+    # queueing one at a time
     rewrite_btn.click(
+        fn=process_text_stream,
+        inputs=[input_text, tone_selector],
+        outputs=output_text,
+        api_name="process_text_stream",
+        concurrency_limit=MAX_BATCH_SIZE,
+        concurrency_id="rewrite"
+    )
+    gr.Button(visible=False).click(
         fn=process_text,
         inputs=[input_text, tone_selector],
-        outputs=output_text
+        outputs=output_text,
+        api_name="process_text",
+        concurrency_limit=MAX_BATCH_SIZE,
+        concurrency_id="rewrite"
     )
+    
+    # Readiness (non-blocking) and warmup (waits for the model) endpoints: /ready and /warmup
+    readiness_json = gr.JSON(visible=False)
+    gr.Button(visible=False).click(fn=readiness, inputs=None, outputs=readiness_json, api_name="ready")
+    gr.Button(visible=False).click(fn=warmup, inputs=None, outputs=readiness_json, api_name="warmup")
+    iface.load(fn=status_text, inputs=None, outputs=model_status)
 
 if __name__ == "__main__":
+    # Load in the background while the server starts instead of before it
+    start_model_loading()
     iface.launch()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Granite Space benchmarks
+
+cold-start: seconds until the UI could serve requests and until the model is
+ready, for the previous eager load at import time and for the background load
+(first from the Hub files, then from the local weight cache), each in a fresh
+process, with the process's peak RSS
+
+precision: CPU tokens per second, peak RSS and output drift against float32
+for each GRANITE_CPU_PRECISION mode, using greedy decoding on a fixed prompt set
+
+ttft: median time to the first generated token for short inputs, prefilling the
+whole prompt versus resuming from the tone's precomputed prompt-prefix cache
+"""
+
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Previous behaviour: the model is loaded before Gradio can build and launch the UI
+EAGER = """
+import json, resource, time
+start = time.perf_counter()
+import gradio, torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+model = AutoModelForCausalLM.from_pretrained(
+    "ibm-granite/granite-3.2-2b-instruct",
+    device_map="auto",
+    torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
+)
+tokenizer = AutoTokenizer.from_pretrained("ibm-granite/granite-3.2-2b-instruct")
+elapsed = time.perf_counter() - start
+print(json.dumps({"ui_s": elapsed, "ready_s": elapsed,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+# Current behaviour: importing the app builds the UI; the model loads in the background
+BACKGROUND = """
+import json, resource, time
+start = time.perf_counter()
+import app
+ui = time.perf_counter() - start
+app.start_model_loading()
+app.model_ready.wait()
+print(json.dumps({"ui_s": ui, "ready_s": time.perf_counter() - start, "timings": app.load_timings,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+# Greedy generation on the fixed prompt set; prints outputs and timing as JSON
+PRECISION = """
+import json, resource, sys, time, torch
+import app
+app.wait_for_model()
+prompts = json.loads(sys.argv[1])
+max_new_tokens = int(sys.argv[2])
+outputs, generated, elapsed = [], 0, 0.0
+for text in prompts:
+    conversation = [
+        {"role": "system", "content": "You are an expert text rewriter. Rewrite the text in a clear, neutral tone."},
+        {"role": "user", "content": f"Please rewrite this text: {text}"},
+    ]
+    inputs = app.tokenizer.apply_chat_template(conversation, return_tensors="pt", add_generation_prompt=True,
+                                               return_dict=True).to(app.device)
+    start = time.perf_counter()
+    with torch.no_grad():
+        output = app.model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                    pad_token_id=app.tokenizer.pad_token_id)
+    elapsed += time.perf_counter() - start
+    reply = output[0, inputs["input_ids"].shape[1]:]
+    generated += len(reply)
+    outputs.append(app.tokenizer.decode(reply, skip_special_tokens=True))
+print(json.dumps({"outputs": outputs, "tokens_per_s": generated / elapsed, "load": app.load_timings,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+# Time to first token (a one-token generation) with and without the prompt-prefix cache
+TTFT = """
+import json, statistics, sys, time
+import app
+app.wait_for_model()
+texts = json.loads(sys.argv[1])
+repeats = int(sys.argv[2])
+result = {"prefix_tokens": len(app.prefix_caches["neutral"][0]), "prompt_tokens": []}
+for text in texts:
+    ids = app.generation_inputs(app.tone_conversation(text, "neutral"))["input_ids"]
+    result["prompt_tokens"].append(ids.shape[1])
+for label, tone in (("full_prefill_ms", None), ("cached_prefix_ms", "neutral")):
+    times = []
+    for text in texts:
+        conversation = app.tone_conversation(text, "neutral")
+        app.generate_one(conversation, 1, tone)  # not timed
+        for _ in range(repeats):
+            start = time.perf_counter()
+            app.generate_one(conversation, 1, tone)
+            times.append(time.perf_counter() - start)
+    result[label] = statistics.median(times) * 1000
+print(json.dumps(result))
+"""
+
+PROMPTS = [
+    "The company announced its quarterly results yesterday. Sales increased by fifteen percent compared to last year.",
+    "The old house stood at the end of the street. Nobody had lived there for years.",
+    "Every challenge is an opportunity to grow. You have the strength to overcome any obstacle.",
+    "The train left the station at dawn, carrying letters, tools and a single passenger who never gave a name.",
+    "Water the seedlings twice a week and keep them near a bright window until the first true leaves appear.",
+]
+
+
+def run_child(code: str, env: dict, *args) -> dict:
+    """Run code in a fresh interpreter and return the JSON it prints last"""
+    result = subprocess.run([sys.executable, "-c", code, *args], cwd=HERE, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(label: str, result: dict):
+    print(f"   {label:<28}: UI after {result['ui_s']:7.2f}s, model ready after {result['ready_s']:7.2f}s, "
+          f"peak RSS {result['peak_rss_mb']:7.0f} MB")
+
+
+def bench_cold_start(cache_dir: str):
+    env = dict(os.environ)
+    env.pop("GRANITE_WEIGHTS_CACHE", None)
+    print("🧊 Cold start (fresh process each)")
+    report("eager load (before)", run_child(EAGER, env))
+    report("background load", run_child(BACKGROUND, env))
+
+    env["GRANITE_WEIGHTS_CACHE"] = cache_dir
+    run_child(BACKGROUND, env)  # first run writes the cache
+    report("background + weight cache", run_child(BACKGROUND, env))
+
+
+def bench_precision(modes, max_new_tokens: int):
+    env = dict(os.environ)
+    env["CUDA_VISIBLE_DEVICES"] = ""  # CPU modes only
+    env.pop("GRANITE_WEIGHTS_CACHE", None)
+    print(f"🧮 CPU precision ({len(PROMPTS)} prompts, greedy, {max_new_tokens} new tokens max)")
+    baseline = None
+    for mode in modes:
+        env["GRANITE_CPU_PRECISION"] = mode
+        result = run_child(PRECISION, env, json.dumps(PROMPTS), str(max_new_tokens))
+        if baseline is None and mode == "float32":
+            baseline = result["outputs"]
+        drift = ""
+        if baseline is not None:
+            similarity = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(baseline, result["outputs"])]
+            identical = sum(a == b for a, b in zip(baseline, result["outputs"]))
+            drift = (f", {identical}/{len(PROMPTS)} identical to float32, "
+                     f"mean similarity {sum(similarity) / len(similarity):.3f}")
+        print(f"   {mode:<9}: {result['tokens_per_s']:6.2f} tokens/s, peak RSS {result['peak_rss_mb']:7.0f} MB, "
+              f"loaded in {result['load'].get('ready_s')}s{drift}")
+
+
+def bench_ttft(repeats: int):
+    print(f"⏱️ Time to first token ({len(PROMPTS)} short inputs, median of {repeats} runs each)")
+    result = run_child(TTFT, dict(os.environ), json.dumps(PROMPTS), str(repeats))
+    tokens = result["prompt_tokens"]
+    print(f"   prompt tokens {min(tokens)}-{max(tokens)}, of which {result['prefix_tokens']} are the cached prefix")
+    print(f"   full prefill    : {result['full_prefill_ms']:8.1f} ms")
+    print(f"   cached prefix   : {result['cached_prefix_ms']:8.1f} ms "
+          f"({result['full_prefill_ms'] / result['cached_prefix_ms']:.2f}x faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    cold = sub.add_parser("cold-start", help="time the UI and model start-up")
+    cold.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "granite-weights"))
+    precision = sub.add_parser("precision", help="compare CPU precision modes")
+    precision.add_argument("--modes", nargs="+", default=["float32", "bfloat16", "int8"],
+                           help="float32 first, to measure drift against it")
+    precision.add_argument("--max-new-tokens", type=int, default=64)
+    ttft = sub.add_parser("ttft", help="time to first token with and without the prompt-prefix cache")
+    ttft.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "cold-start":
+        bench_cold_start(args.cache_dir)
+    elif args.command == "precision":
+        bench_precision(args.modes, args.max_new_tokens)
+    elif args.command == "ttft":
+        bench_ttft(args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Tone prompts and output formatting of the Granite rewriter
+
+Shared by the Space (app.py) and EchoVerse's in-process backend
+(services/local_granite_llm.py) so both rewrite alike. Kept free of
+heavy imports so the app can import it without loading a model.
+"""
+import re
+
+# System prompt for each tone. Everything the chat template renders before the user's text is
+# the same on every request, so app.py computes its key/value cache once after loading and each
+# request only prefills its own text
+TONE_PROMPTS = {
+    "neutral": """You are an expert text rewriter. Rewrite the following text in a clear, neutral, and professional tone. 
+        Make it suitable for audio narration by using simple sentence structures, avoiding complex punctuation, 
+        and ensuring smooth flow. Keep the same meaning but make it sound natural when spoken aloud.""",
+    
+    "suspenseful": """You are an expert text rewriter. Rewrite the following text in a suspenseful, mysterious tone 
+        that builds tension and intrigue. Use shorter sentences for dramatic effect, create anticipation, 
+        and add elements that will sound engaging when narrated as audio. Make listeners want to know what happens next.""",
+    
+    "inspiring": """You are an expert text rewriter. Rewrite the following text in an inspiring, motivational tone 
+        that uplifts and energizes the reader. Use positive language, powerful imagery, and rhythmic phrases 
+        that will sound compelling when spoken aloud. Make it emotionally resonant and encouraging."""
+}
+
+def tone_conversation(text, tone):
+    """Chat messages asking for text to be rewritten in tone (neutral if the tone is unknown)"""
+    return [
+        {"role": "system", "content": TONE_PROMPTS.get(tone, TONE_PROMPTS["neutral"])},
+        {"role": "user", "content": f"Please rewrite this text: {text}"}
+    ]
+
+def audio_friendly_formatting(text):
+    """Format text to be more audio-friendly for TTS conversion"""
+    # Remove excessive punctuation
+    text = re.sub(r'[.]{2,}', '...', text)
+    
+    # Ensure proper spacing after punctuation
+    text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
+    
+    # Convert numbers to words for better TTS pronunciation
+    numbers = {'1': 'one', '2': 'two', '3': 'three', '4': 'four', '5': 'five', 
+              '6': 'six', '7': 'seven', '8': 'eight', '9': 'nine', '0': 'zero'}
+    for num, word in numbers.items():
+        text = text.replace(num, word)
+    
+    # Add pauses for better audio pacing
+    text = re.sub(r'([,;:])', r'\1 ', text)
+    
+    # Ensure sentences end with proper punctuation
+    sentences = text.split('. ')
+    formatted_sentences = []
+    for sentence in sentences:
+        if sentence and not sentence.endswith(('.', '!', '?')):
+            sentence += '.'
+        formatted_sentences.append(sentence)
+    
+    return '. '.join(formatted_sentences)
@@ -3,11 +3,27 @@ import io
 import base64
 from services.watson_tts import WatsonTTSService
 from services.hf_llm import HuggingFaceLLMService
+from services.watsonx_llm import WatsonxLLMService
+from services.local_granite_llm import LocalGraniteLLMService
+from services.segments import SegmentTrack
+from services.spool import sweep_spool
+from services.timing_index import TimingIndex
+from services.audio_utils import audio_duration, audio_extension, audio_mime, mime_for_path, transcode_to_mp3
+from services.frame_index import FrameIndex
+from services.text_chunking import text_to_sentences
+from services.http_transport import get_transport
 from config import Config
 import json
 import os
 from datetime import datetime
 import shutil
+import time
+import uuid
+
+# Stored audio format (see Config.AUDIO_FORMAT); MP3 copies are produced on demand
+AUDIO_EXT = audio_extension(Config.AUDIO_FORMAT)
+AUDIO_MIME = audio_mime(Config.AUDIO_FORMAT)
+AUDIO_EXTENSIONS = (AUDIO_EXT, 'ogg', 'mp3', 'webm', 'wav', 'flac')
 
 # Background image helpers
 
@@ -230,16 +246,291 @@ def _init_theme():
 
 
 # Initialize services
+def create_llm_service():
+    """Rewrite service for the configured backend (Config.LLM_BACKEND)"""
+    if Config.LLM_BACKEND == 'local':
+        return LocalGraniteLLMService()
+    if Config.LLM_BACKEND == 'watsonx':
+        return WatsonxLLMService()
+    return HuggingFaceLLMService()
+
+
 @st.cache_resource
 def initialize_services():
     """Initialize Watson services"""
     tts_service = WatsonTTSService()
-    llm_service = HuggingFaceLLMService()
+    llm_service = create_llm_service()
     return tts_service, llm_service
 
 
-def save_to_library(name, description, original_text, rewritten_text, tone, voice):
-    """Save audio project to library"""
+_last_spool_sweep = 0.0
+
+
+def audio_spool_path() -> str:
+    """Path of the spool file holding this session's generated audio"""
+    global _last_spool_sweep
+    if 'audio_spool_id' not in st.session_state:
+        st.session_state.audio_spool_id = uuid.uuid4().hex
+        # Sessions that ended long ago leave their audio behind; clear it out now and then
+        if time.time() - _last_spool_sweep >= Config.AUDIO_SPOOL_SWEEP_INTERVAL:
+            _last_spool_sweep = time.time()
+            sweep_spool(Config.AUDIO_SPOOL_DIR, Config.AUDIO_SPOOL_TTL)
+    os.makedirs(Config.AUDIO_SPOOL_DIR, exist_ok=True)
+    return os.path.join(Config.AUDIO_SPOOL_DIR, f"{st.session_state.audio_spool_id}.{AUDIO_EXT}")
+
+
+def write_audio_stream(chunks, path: str, on_progress=None) -> int:
+    """Write an iterable of audio byte chunks to path as they arrive.
+
+    The file is written under a temporary name and moved into place once
+    complete, so readers never see a partial file. Returns bytes written.
+    """
+    tmp_path = f"{path}.part"
+    written = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+                if on_progress:
+                    on_progress(written)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+def generate_audio_to_spool(tts_service, text: str, voice: str) -> str:
+    """Stream synthesized audio into the session spool file and return its path.
+
+    Audio is rendered through the session's SegmentTrack, so after an edit to
+    the text only the changed sentences are re-synthesized.
+    """
+    path = audio_spool_path()
+    # Any MP3 prepared for the previous audio is stale now
+    mp3_path = mp3_sibling(path)
+    if mp3_path != path and os.path.exists(mp3_path):
+        os.remove(mp3_path)
+    track = st.session_state.get('segment_track')
+    if track is None:
+        track = SegmentTrack(os.path.join(Config.AUDIO_SPOOL_DIR, f"{st.session_state.audio_spool_id}_segments"))
+        st.session_state.segment_track = track
+    status = st.empty()
+
+    def _progress(written):
+        status.caption(f"Received {written / 1024:.0f} KB of audio…")
+
+    write_audio_stream(track.render(tts_service, text, voice), path, on_progress=_progress)
+    status.caption(
+        f"Synthesized {track.last_synthesized} segment(s), reused {track.last_reused} unchanged segment(s)."
+    )
+    return path
+
+
+def rewrite_with_preview(llm_service, text: str, tone: str, spinner_text: str = "Rewriting text...") -> str:
+    """Rewrite text, showing progress and the rewrite as it is generated when the service supports it"""
+    if getattr(llm_service, 'submit_rewrite', None) is not None:
+        return _rewrite_as_job(llm_service, text, tone, spinner_text)
+
+    stream = getattr(llm_service, 'rewrite_text_stream', None)
+    if stream is None:
+        with st.spinner(spinner_text):
+            return llm_service.rewrite_text(text, tone)
+
+    preview = st.empty()
+    preview.caption(spinner_text)
+    parts = []
+    try:
+        for piece in stream(text, tone):
+            parts.append(piece)
+            preview.markdown("".join(parts) + " ▌")
+    except Exception as e:
+        # The stream broke off mid-rewrite: keep the original rather than a truncated rewrite
+        st.error(f"Rewrite failed part-way: {e}")
+        return text
+    finally:
+        preview.empty()
+    return "".join(parts).strip()
+
+
+def _describe_job_status(status: dict, spinner_text: str) -> str:
+    chunks = f" ({status['chunks_done']}/{status['chunks']} passages)" if status['chunks'] > 1 else ""
+    if status['state'] == 'queued' and status['queue_position'] is not None:
+        position = f"{status['queue_position'] + 1}"
+        if status['queue_size']:
+            position += f" of {status['queue_size']}"
+        eta = f", about {status['eta']:.0f}s" if status['eta'] else ""
+        return f"⏳ Waiting in the Space queue: position {position}{eta}{chunks}"
+    if status['state'] == 'queued':
+        return f"⏳ Queued{chunks}"
+    return f"{spinner_text}{chunks}"
+
+
+def _rewrite_as_job(llm_service, text: str, tone: str, spinner_text: str) -> str:
+    """Run a rewrite as a cancellable Space job, showing queue position and partial output while it runs"""
+    # A rewrite started by an earlier run of the script is no longer needed
+    previous = st.session_state.pop('rewrite_job', None)
+    if previous is not None:
+        previous.cancel()
+
+    try:
+        job = llm_service.submit_rewrite(text, tone)
+    except Exception as e:
+        st.error(f"Hugging Face Space call failed: {e}")
+        return text
+    st.session_state.rewrite_job = job
+
+    status_line = st.empty()
+    preview = st.empty()
+    cancel_slot = st.empty()
+    # The click reruns the script, which stops this loop; the callback cancels the job first
+    cancel_slot.button("✖️ Cancel Rewrite", key="cancel_rewrite_btn", on_click=job.cancel)
+    try:
+        while not job.done():
+            status_line.caption(_describe_job_status(job.status(), spinner_text))
+            partial = job.partial()
+            if partial:
+                preview.markdown(partial + " ▌")
+            time.sleep(0.5)
+        return job.result()
+    except Exception as e:
+        job.cancel()
+        st.error(f"Hugging Face Space call failed: {e}")
+        return text
+    finally:
+        status_line.empty()
+        preview.empty()
+        cancel_slot.empty()
+        st.session_state.pop('rewrite_job', None)
+
+
+def render_voice_comparison(tts_service, text: str):
+    """Offer rendering the text in every supported voice at once and show the clips side by side"""
+    if st.button("🎧 Compare All Voices", key="compare_voices_btn"):
+        if tts_service.is_service_available():
+            with st.spinner("Rendering all voices..."):
+                try:
+                    clips = tts_service.synthesize_all_voices(text)
+                    paths = {}
+                    for voice, audio in clips.items():
+                        path = f"{os.path.splitext(audio_spool_path())[0]}_{voice}.{AUDIO_EXT}"
+                        write_audio_stream([audio], path)
+                        paths[voice] = path
+                    # Drop clips of the previous comparison that were not overwritten, and stale MP3 copies
+                    previous = st.session_state.get('voice_comparison') or {}
+                    stale = [p for p in previous.values() if p not in paths.values()]
+                    stale += [mp3_sibling(p) for p in list(previous.values()) + list(paths.values())
+                              if mp3_sibling(p) not in paths.values()]
+                    for stale_path in stale:
+                        if os.path.exists(stale_path):
+                            os.remove(stale_path)
+                    st.session_state.voice_comparison = paths
+                except Exception as e:
+                    st.error(f"Error comparing voices: {str(e)}")
+        else:
+            st.error("TTS service not available. Please check your configuration.")
+
+    paths = st.session_state.get('voice_comparison') or {}
+    if paths:
+        cols = st.columns(len(paths))
+        for col, (voice, path) in zip(cols, paths.items()):
+            with col:
+                st.markdown(f"**{voice}**")
+                if os.path.exists(path):
+                    st.audio(path, format=mime_for_path(path))
+
+
+def find_audio_file(directory: str):
+    """Return the stored audio file of a project/bookmark folder, if any"""
+    for ext in AUDIO_EXTENSIONS:
+        path = os.path.join(directory, f"audio.{ext}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def mp3_sibling(audio_path: str) -> str:
+    """Path of the MP3 copy kept next to a stored audio file"""
+    return f"{os.path.splitext(audio_path)[0]}.mp3"
+
+
+def ensure_mp3(audio_path: str) -> str:
+    """Return an MP3 version of audio_path, transcoding and caching it beside the file on first use"""
+    mp3_path = mp3_sibling(audio_path)
+    if not os.path.exists(mp3_path):
+        with open(audio_path, 'rb') as f:
+            data = transcode_to_mp3(f.read(), mime_for_path(audio_path), Config.MP3_BITRATE)
+        write_audio_stream([data], mp3_path)
+    return mp3_path
+
+
+def audio_download_controls(audio_path: str, file_stem: str, key: str):
+    """Download buttons for stored audio: the stored file, plus an MP3 copy prepared on request"""
+    ext = audio_path.rsplit('.', 1)[-1].lower()
+    if ext != 'mp3':
+        with open(audio_path, 'rb') as f:
+            st.download_button(
+                label=f"⬇️ Download {ext.upper()}",
+                data=f.read(),
+                file_name=f"{file_stem}.{ext}",
+                mime=mime_for_path(audio_path),
+                key=f"{key}_native",
+            )
+    mp3_path = mp3_sibling(audio_path)
+    if os.path.exists(mp3_path):
+        with open(mp3_path, 'rb') as f:
+            st.download_button(
+                label="⬇️ Download MP3",
+                data=f.read(),
+                file_name=f"{file_stem}.mp3",
+                mime="audio/mp3",
+                key=f"{key}_mp3",
+            )
+    elif st.button("🎵 Prepare MP3", key=f"{key}_prepare_mp3"):
+        try:
+            with st.spinner("Converting to MP3..."):
+                ensure_mp3(audio_path)
+            st.rerun()
+        except Exception as e:
+            st.error(f"MP3 conversion failed: {e}")
+
+
+def read_session_audio():
+    """Return the current session audio as bytes (or None)"""
+    audio_obj = st.session_state.get('audio_data')
+    if not audio_obj:
+        return None
+    if isinstance(audio_obj, io.BytesIO):
+        return audio_obj.getvalue()
+    if isinstance(audio_obj, str):
+        # Spooled audio file written by generate_audio_to_spool
+        with open(audio_obj, 'rb') as f:
+            return f.read()
+    return audio_obj
+
+
+def copy_session_audio(dest_path: str) -> bool:
+    """Write the current session audio to dest_path without loading spooled files into memory"""
+    audio_obj = st.session_state.get('audio_data')
+    if not audio_obj:
+        return False
+    if isinstance(audio_obj, str):
+        shutil.copyfile(audio_obj, dest_path)
+        return True
+    data = audio_obj.getvalue() if isinstance(audio_obj, io.BytesIO) else audio_obj
+    with open(dest_path, 'wb') as f:
+        f.write(data)
+    return True
+
+
+def save_to_library(name, description, original_text, rewritten_text, tone, voice, audio_stream=None):
+    """Save audio project to library.
+
+    If audio_stream (an iterable of audio byte chunks) is given it is written to
+    disk incrementally; otherwise the current session audio is saved.
+    """
     if 'library' not in st.session_state:
         st.session_state.library = []
 
@@ -265,7 +556,8 @@ def save_to_library(name, description, original_text, rewritten_text, tone, voic
     # Paths
     original_path = os.path.join(project_dir, 'original.txt')
     rewritten_path = os.path.join(project_dir, 'rewritten.txt')
-    audio_path = os.path.join(project_dir, 'audio.mp3')
+    audio_path = os.path.join(project_dir, f'audio.{AUDIO_EXT}')
+    timings_path = os.path.join(project_dir, 'timings.idx')
     meta_path = os.path.join(project_dir, 'metadata.json')
 
     # Write files
@@ -275,20 +567,20 @@ def save_to_library(name, description, original_text, rewritten_text, tone, voic
         with open(rewritten_path, 'w', encoding='utf-8') as f:
             f.write(rewritten_text or '')
         # Write audio if present
-        audio_bytes = st.session_state.get('audio_data')
-        if audio_bytes:
-            try:
-                # audio_bytes may be bytes or BytesIO
-                if isinstance(audio_bytes, io.BytesIO):
-                    data = audio_bytes.getvalue()
-                else:
-                    data = audio_bytes
-                with open(audio_path, 'wb') as f:
-                    f.write(data)
-            except Exception:
+        try:
+            if audio_stream is not None:
+                write_audio_stream(audio_stream, audio_path)
+            elif not copy_session_audio(audio_path):
                 audio_path = None
-        else:
+        except Exception:
             audio_path = None
+        # Word timings of the session audio, when it was rendered from this text
+        track = st.session_state.get('segment_track')
+        if (audio_path and audio_stream is None and track is not None and track.timing_index is not None
+                and track.text == (rewritten_text or original_text)):
+            track.timing_index.save(timings_path)
+        else:
+            timings_path = None
 
         metadata = {
             'name': name,
@@ -300,6 +592,7 @@ def save_to_library(name, description, original_text, rewritten_text, tone, voic
                 'original_text': original_path,
                 'rewritten_text': rewritten_path,
                 'audio': audio_path,
+                'timings': timings_path,
             },
         }
         with open(meta_path, 'w', encoding='utf-8') as f:
@@ -322,8 +615,9 @@ def save_to_library(name, description, original_text, rewritten_text, tone, voic
         st.error(f"Failed to save project: {e}")
 
 
-def save_bookmark_from_bytes(name: str, source_project: str, text_snippet: str, tone: str, voice: str, audio_bytes: bytes):
-    """Core helper to save a bookmark given raw audio bytes."""
+def save_bookmark_from_bytes(name: str, source_project: str, text_snippet: str, tone: str, voice: str, audio_bytes: bytes,
+                             audio_ext: str = AUDIO_EXT):
+    """Core helper to save a bookmark given raw audio bytes (stored as audio.<audio_ext>)."""
     os.makedirs(Config.BOOKMARKS_DIR, exist_ok=True)
 
     def _sanitize(text: str) -> str:
@@ -341,7 +635,7 @@ def save_bookmark_from_bytes(name: str, source_project: str, text_snippet: str,
     bdir = unique_dir
     os.makedirs(bdir, exist_ok=True)
 
-    audio_path = os.path.join(bdir, 'audio.mp3')
+    audio_path = os.path.join(bdir, f'audio.{audio_ext}')
     meta_path = os.path.join(bdir, 'metadata.json')
 
     with open(audio_path, 'wb') as f:
@@ -366,14 +660,45 @@ def save_bookmark_from_bytes(name: str, source_project: str, text_snippet: str,
     st.session_state.bookmarks.append({**metadata, 'bookmark_dir': bdir})
 
 
+def save_bookmark_at(name: str, project: dict, text_offset: int, start_time: float, text_snippet: str,
+                     end_time: float = None):
+    """Save a bookmark pointing into a library project's audio at start_time (no audio copy)."""
+    os.makedirs(Config.BOOKMARKS_DIR, exist_ok=True)
+    base_dir = os.path.join(Config.BOOKMARKS_DIR, _sanitize_folder(name))
+    suffix = 1
+    bdir = base_dir
+    while os.path.exists(bdir):
+        suffix += 1
+        bdir = f"{base_dir}_{suffix}"
+    os.makedirs(bdir, exist_ok=True)
+
+    metadata = {
+        'name': name,
+        'source_project': project.get('name') or 'Project',
+        'source_dir': os.path.basename(project.get('project_dir') or ''),
+        'text_snippet': text_snippet,
+        'tone': project.get('tone', ''),
+        'voice': project.get('voice', ''),
+        'text_offset': int(text_offset),
+        'start_time': round(float(start_time), 3),
+        'end_time': round(float(end_time), 3) if end_time is not None else None,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'paths': {
+            'audio': (project.get('paths') or {}).get('audio'),
+        }
+    }
+    with open(os.path.join(bdir, 'metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    _refresh_bookmarks_session()
+
+
 def save_bookmark(name: str, source_project: str, text_snippet: str, tone: str, voice: str):
     """Save the current session audio as a bookmark (wraps save_bookmark_from_bytes)."""
     try:
-        audio_obj = st.session_state.get('audio_data')
-        if not audio_obj:
+        audio_bytes = read_session_audio()
+        if not audio_bytes:
             st.warning("Generate audio first to save a bookmark.")
             return
-        audio_bytes = audio_obj.getvalue() if isinstance(audio_obj, io.BytesIO) else audio_obj
         save_bookmark_from_bytes(name, source_project, text_snippet, tone, voice, audio_bytes)
         st.success(f"Bookmark '{name}' saved.")
     except Exception as e:
@@ -426,18 +751,15 @@ def create_empty_bookmark(name: str, source_project: str, text_snippet: str, ton
 def attach_audio_to_bookmark(bm: dict):
     """Attach current session audio to an existing bookmark without audio."""
     try:
-        audio_obj = st.session_state.get('audio_data')
-        if not audio_obj:
+        if not st.session_state.get('audio_data'):
             st.warning("Generate audio first, then attach.")
             return
         if not bm or not bm.get('bookmark_dir'):
             st.error("Invalid bookmark selection.")
             return
-        audio_bytes = audio_obj.getvalue() if isinstance(audio_obj, io.BytesIO) else audio_obj
         bdir = bm['bookmark_dir']
-        audio_path = os.path.join(bdir, 'audio.mp3')
-        with open(audio_path, 'wb') as f:
-            f.write(audio_bytes)
+        audio_path = os.path.join(bdir, f'audio.{AUDIO_EXT}')
+        copy_session_audio(audio_path)
         # update metadata
         meta_path = os.path.join(bdir, 'metadata.json')
         try:
@@ -472,6 +794,11 @@ def load_bookmarks_from_disk():
                 with open(meta_path, 'r', encoding='utf-8') as f:
                     meta = json.load(f)
                 meta['bookmark_dir'] = bdir
+                if meta.get('source_dir') and not find_audio_file(bdir):
+                    # Bookmark points into a library project's audio
+                    paths = meta.get('paths') or {}
+                    paths['audio'] = find_audio_file(os.path.join(Config.LIBRARY_DIR, meta['source_dir']))
+                    meta['paths'] = paths
                 bookmarks.append(meta)
             except Exception:
                 continue
@@ -482,6 +809,72 @@ def load_bookmarks_from_disk():
         st.session_state.bookmarks_loaded = True
 
 
+def stored_audio_duration(audio_path: str) -> float:
+    """Duration in seconds of a stored audio file, without decoding it.
+
+    MP3 durations come from the frame index. Other formats are read once and the
+    result kept beside the file (like the index), so library renders do not
+    re-read every project's audio.
+    """
+    if audio_path.lower().endswith('.mp3'):
+        return FrameIndex.for_file(audio_path).duration
+    stat = os.stat(audio_path)
+    source = [stat.st_size, stat.st_mtime_ns]
+    sidecar = f"{audio_path}.duration"
+    try:
+        with open(sidecar, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('source') == source:
+            return float(cached['duration'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    with open(audio_path, 'rb') as f:
+        duration = audio_duration(f.read(), mime_for_path(audio_path))
+    try:
+        with open(sidecar, 'w', encoding='utf-8') as f:
+            json.dump({'source': source, 'duration': duration}, f)
+    except OSError:
+        pass
+    return duration
+
+
+def write_bookmark_clip(bm: dict, audio_path: str, clip_path: str):
+    """Cut a bookmark's time range out of the (MP3 copy of the) project audio by copying frames.
+
+    The frame index only covers MP3, so Ogg/WAV project audio is sliced from its
+    MP3 copy; ensure_mp3 transcodes it with ffmpeg on the first clip (or MP3
+    download) and keeps it beside the file for later ones.
+    """
+    mp3_path = ensure_mp3(audio_path)
+    index = FrameIndex.for_file(mp3_path)
+    with open(mp3_path, 'rb') as f:
+        clip = index.slice(f.read(), float(bm.get('start_time') or 0), bm.get('end_time'))
+    if not clip:
+        raise ValueError("The bookmarked range is outside the audio")
+    write_audio_stream([clip], clip_path)
+
+
+def bookmark_clip_controls(bm: dict, audio_path: str, key: str):
+    """Download button for just the bookmarked range as MP3, prepared on request."""
+    clip_path = os.path.join(bm['bookmark_dir'], 'clip.mp3')
+    if os.path.exists(clip_path):
+        with open(clip_path, 'rb') as f:
+            st.download_button(
+                label="⬇️ Download Clip (MP3)",
+                data=f.read(),
+                file_name=f"{_sanitize_folder(bm.get('name'))}_clip.mp3",
+                mime="audio/mp3",
+                key=f"{key}_clip",
+            )
+    elif st.button("✂️ Prepare Clip (MP3)", key=f"{key}_prepare_clip"):
+        try:
+            with st.spinner("Cutting clip..."):
+                write_bookmark_clip(bm, audio_path, clip_path)
+            st.rerun()
+        except Exception as e:
+            st.error(f"Clip preparation failed: {e}")
+
+
 def display_bookmarks():
     """Render bookmarks list with playback and download."""
     bms = st.session_state.get('bookmarks') or []
@@ -503,16 +896,10 @@ def display_bookmarks():
             audio_path = (bm.get('paths') or {}).get('audio')
             if audio_path and os.path.exists(audio_path):
                 try:
-                    with open(audio_path, 'rb') as f:
-                        audio_bytes = f.read()
-                    st.audio(audio_bytes, format='audio/mp3')
-                    st.download_button(
-                        label="⬇️ Download Bookmark MP3",
-                        data=audio_bytes,
-                        file_name=os.path.basename(audio_path),
-                        mime="audio/mp3",
-                        key=f"bm_dl_{i}"
-                    )
+                    st.audio(audio_path, format=mime_for_path(audio_path), start_time=int(bm.get('start_time') or 0))
+                    audio_download_controls(audio_path, _sanitize_folder(bm.get('name')), key=f"bm_dl_{i}")
+                    if bm.get('end_time') is not None:
+                        bookmark_clip_controls(bm, audio_path, key=f"bm_dl_{i}")
                 except Exception:
                     st.warning("Audio file could not be read.")
             else:
@@ -555,9 +942,11 @@ def load_library_from_disk():
                 # Build project record
                 paths = (meta.get('paths') or {}) if meta else {}
                 # ensure audio path reflects folder
-                ap = os.path.join(pdir, 'audio.mp3')
-                if os.path.exists(ap):
+                ap = find_audio_file(pdir)
+                if ap:
                     paths['audio'] = ap
+                tp = os.path.join(pdir, 'timings.idx')
+                paths['timings'] = tp if os.path.exists(tp) else None
                 project = {
                     'name': meta.get('name') if meta else entry,
                     'description': meta.get('description', ''),
@@ -633,8 +1022,8 @@ def _update_bookmark_paths_after_move(new_dir: str):
             meta = json.load(f)
         # update any stored paths
         paths = meta.get('paths') or {}
-        audio_path = os.path.join(new_dir, 'audio.mp3')
-        if os.path.exists(audio_path):
+        audio_path = find_audio_file(new_dir)
+        if audio_path:
             paths['audio'] = audio_path
         meta['paths'] = paths
         with open(meta_path, 'w', encoding='utf-8') as f:
@@ -687,6 +1076,7 @@ def rename_project(project: dict, new_name: str):
             unique = f"{target}_{suffix}"
         os.rename(old_dir, unique)
         _update_project_paths_after_move(unique)
+        _retarget_bookmarks(os.path.basename(old_dir), unique)
         _refresh_library_session()
         st.success("Project renamed.")
     except Exception as e:
@@ -725,6 +1115,24 @@ def _update_project_name_only(pdir: str, project: dict, new_name: str):
         st.error(f"Failed to update project name: {e}")
 
 
+def _retarget_bookmarks(old_dir_name: str, new_dir: str):
+    """Point bookmarks that reference a moved project's audio at its new folder."""
+    for bm in st.session_state.get('bookmarks') or []:
+        if bm.get('source_dir') != old_dir_name or not bm.get('bookmark_dir'):
+            continue
+        try:
+            meta_path = os.path.join(bm['bookmark_dir'], 'metadata.json')
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['source_dir'] = os.path.basename(new_dir)
+            meta['paths'] = {**(meta.get('paths') or {}), 'audio': find_audio_file(new_dir)}
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2, ensure_ascii=False)
+        except Exception:
+            continue
+    _refresh_bookmarks_session()
+
+
 def _update_project_paths_after_move(new_dir: str):
     try:
         meta_path = os.path.join(new_dir, 'metadata.json')
@@ -737,13 +1145,16 @@ def _update_project_paths_after_move(new_dir: str):
         # update canonical file paths
         op = os.path.join(new_dir, 'original.txt')
         rp = os.path.join(new_dir, 'rewritten.txt')
-        ap = os.path.join(new_dir, 'audio.mp3')
+        ap = find_audio_file(new_dir)
         if os.path.exists(op):
             paths['original_text'] = op
         if os.path.exists(rp):
             paths['rewritten_text'] = rp
-        if os.path.exists(ap):
+        if ap:
             paths['audio'] = ap
+        tp = os.path.join(new_dir, 'timings.idx')
+        if os.path.exists(tp):
+            paths['timings'] = tp
         meta['paths'] = paths
         if 'name' not in meta:
             meta['name'] = os.path.basename(new_dir)
@@ -751,6 +1162,58 @@ def _update_project_paths_after_move(new_dir: str):
             json.dump(meta, f, indent=2, ensure_ascii=False)
     except Exception:
         pass
+
+
+def load_timing_index(project: dict):
+    """Load a project's word-timing index, or None if it has none."""
+    path = (project.get('paths') or {}).get('timings')
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return TimingIndex.load(path)
+    except (OSError, ValueError):
+        return None
+
+
+def render_sentence_jump(project: dict, key: str) -> int:
+    """Sentence picker for a project with word timings; returns the playback start time (seconds)."""
+    index = load_timing_index(project)
+    text = project.get('rewritten_text') or project.get('original_text') or ''
+    if index is None or not text:
+        return 0
+    sentences = []  # (text offset, sentence)
+    pos = 0
+    for sentence in text_to_sentences(text):
+        found = text.find(sentence, pos)
+        if found < 0:
+            continue
+        sentences.append((found, sentence))
+        pos = found + len(sentence)
+    if not sentences:
+        return 0
+
+    def _label(choice):
+        offset, sentence = sentences[choice]
+        t = int(index.time_at(offset))
+        return f"[{t // 60}:{t % 60:02d}] {sentence[:80]}"
+
+    choice = st.selectbox("Jump to sentence", range(len(sentences)), format_func=_label, key=key)
+    offset, sentence = sentences[choice]
+    start_time = index.time_at(offset)
+    if choice + 1 < len(sentences):
+        end_time = index.time_at(sentences[choice + 1][0])
+    else:
+        end_time = index.duration_ms / 1000.0
+    if st.button("🔖 Bookmark this sentence", key=f"{key}_bm"):
+        try:
+            save_bookmark_at(f"{project.get('name') or 'Project'} @ {int(start_time) // 60}:{int(start_time) % 60:02d}",
+                             project, offset, start_time, sentence[:280], end_time=end_time)
+            st.success("Bookmark saved at this sentence.")
+        except Exception as e:
+            st.error(f"Failed to add bookmark: {e}")
+    return int(start_time)
+
+
 def display_library():
     """Display saved projects in library"""
     if 'library' not in st.session_state or not st.session_state.library:
@@ -779,16 +1242,11 @@ def display_library():
                 audio_path = paths.get('audio')
             if audio_path and os.path.exists(audio_path):
                 try:
-                    with open(audio_path, 'rb') as f:
-                        audio_bytes = f.read()
-                    st.audio(audio_bytes, format='audio/mp3')
-                    st.download_button(
-                        label="⬇️ Download Saved MP3",
-                        data=audio_bytes,
-                        file_name=os.path.basename(audio_path),
-                        mime="audio/mp3",
-                        key=f"dl_{i}"
-                    )
+                    duration = int(stored_audio_duration(audio_path))
+                    st.write(f"**Duration:** {duration // 60}:{duration % 60:02d}")
+                    start_time = render_sentence_jump(project, key=f"jump_{i}")
+                    st.audio(audio_path, format=mime_for_path(audio_path), start_time=start_time)
+                    audio_download_controls(audio_path, _sanitize_folder(project.get('name')), key=f"dl_{i}")
                 except Exception:
                     pass
 
@@ -812,6 +1270,7 @@ def display_library():
                             tone=project.get('tone',''),
                             voice=project.get('voice',''),
                             audio_bytes=audio_bytes,
+                            audio_ext=audio_path.rsplit('.', 1)[-1],
                         )
                         st.success("Bookmark saved from project audio.")
                     except Exception as e:
@@ -1016,10 +1475,10 @@ def create_audio_page(tts_service, llm_service):
     with col2:
         if st.button("🔄 Suggest Rewrite", type="primary"):
             if llm_service.is_service_available():
-                with st.spinner("Rewriting text with Granite..."):
-                    rewritten_text = llm_service.rewrite_text(user_text, selected_tone)
-                    st.session_state.rewritten_text = rewritten_text
-                    st.success("Text rewritten successfully!")
+                rewritten_text = rewrite_with_preview(llm_service, user_text, selected_tone,
+                                                      "Rewriting text with Granite...")
+                st.session_state.rewritten_text = rewritten_text
+                st.success("Text rewritten successfully!")
             else:
                 st.error("LLM service not available. Please check your configuration.")
 
@@ -1088,31 +1547,28 @@ def create_audio_page(tts_service, llm_service):
         if tts_service.is_service_available():
             with st.spinner("Generating audio..."):
                 try:
-                    audio_data = tts_service.synthesize_speech(
+                    st.session_state.audio_data = generate_audio_to_spool(
+                        tts_service,
                         effective_text,
                         selected_voice,
                     )
-                    st.session_state.audio_data = audio_data
                     st.success("Audio generated successfully!")
                 except Exception as e:
                     st.error(f"Error generating audio: {str(e)}")
         else:
             st.error("TTS service not available. Please check your configuration.")
 
+    render_voice_comparison(tts_service, effective_text)
+
     # Audio playback and download
     if 'audio_data' in st.session_state:
         st.markdown('<div class="section-header">🔊 Audio Playback</div>', unsafe_allow_html=True)
 
         # Audio player
-        st.audio(st.session_state.audio_data, format='audio/mp3')
-
-        # Download button
-        st.download_button(
-            label="⬇️ Download MP3",
-            data=st.session_state.audio_data,
-            file_name=f"{project_name or 'audiobook'}.mp3",
-            mime="audio/mp3",
-        )
+        st.audio(st.session_state.audio_data, format=AUDIO_MIME)
+
+        # Download buttons (MP3 is converted only when requested)
+        audio_download_controls(st.session_state.audio_data, project_name or 'audiobook', key="session_audio")
 
         # Add as Bookmark UI
         st.markdown("<div class='section-header'>🔖 Add Bookmark</div>", unsafe_allow_html=True)
@@ -1175,6 +1631,52 @@ def account_page():
     else:
         st.metric("Projects Created", 0)
 
+    st.markdown("### Audio Cache")
+    tts_service, llm_service = initialize_services()
+    cache_stats = tts_service.get_cache_stats()
+    if cache_stats:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Cache Hits", cache_stats['hits'])
+        c2.metric("Cache Misses", cache_stats['misses'])
+        c3.metric("Cache Size", f"{cache_stats['bytes'] / (1024 * 1024):.1f} / {cache_stats['max_bytes'] / (1024 * 1024):.0f} MB")
+    else:
+        st.caption("Audio cache is disabled.")
+
+    st.markdown("### Rewrite Cache")
+    rewrite_stats = llm_service.get_cache_stats()
+    if rewrite_stats:
+        r1, r2, r3 = st.columns(3)
+        r1.metric("Cache Hits", rewrite_stats['hits'])
+        r2.metric("Cache Misses", rewrite_stats['misses'])
+        r3.metric("Cached Rewrites", f"{rewrite_stats['entries']} / {rewrite_stats['max_entries']}")
+    else:
+        st.caption("Rewrite cache is disabled.")
+
+    token_stats = llm_service.get_token_stats()
+    error = token_stats['mean_abs_error']
+    st.caption(
+        f"Token counts: {'exact (local tokenizer)' if token_stats['exact'] else 'estimated'}, "
+        f"{token_stats['chars_per_token']} chars/token"
+        + (f", {error:.0%} mean error over {token_stats['samples']} requests" if error is not None else "")
+    )
+
+    hedge_stats = tts_service.get_hedge_stats()
+    if hedge_stats['enabled']:
+        st.markdown("### TTS Request Hedging")
+        h1, h2, h3 = st.columns(3)
+        h1.metric("Latency p50 / p99", f"{hedge_stats['p50'] or 0:.2f}s / {hedge_stats['p99'] or 0:.2f}s")
+        h2.metric("Hedged Requests", hedge_stats['hedges'])
+        h3.metric("Hedge Wins", hedge_stats['hedge_wins'])
+
+    host_stats = get_transport().stats()
+    if host_stats:
+        st.markdown("### Remote Services")
+        for host, stats in host_stats.items():
+            st.caption(
+                f"{host}: {stats['requests']} requests, {stats['retries']} retries, {stats['errors']} errors, "
+                f"p50 {stats['p50'] or 0:.2f}s / p99 {stats['p99'] or 0:.2f}s"
+            )
+
 
 if __name__ == "__main__":
     _configure_page()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+EchoVerse TTS Benchmark Script
+This script measures the Watson TTS clients against a local fake TTS endpoint
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from ibm_cloud_sdk_core.authenticators import NoAuthAuthenticator
+
+from config import Config
+from services.async_watson_tts import AsyncWatsonTTSService
+from services.http_transport import HttpTransport
+from services.text_chunking import chunk_text
+from services.watson_tts import WatsonTTSService
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 byte frames of ~26 ms
+FAKE_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+FAKE_ID3 = b'ID3\x04\x00\x00\x00\x00\x00\x00'
+
+
+class FakeTTSHandler(BaseHTTPRequestHandler):
+    """Answers /v1/synthesize with silent MP3 frames after a fixed delay"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real service
+    disable_nagle_algorithm = True
+    latency = 0.25
+    per_char = 0.0
+    slow_prob = 0.0
+    slow_factor = 1.0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        text = body.get('text', '')
+        delay = self.latency + self.per_char * len(text)
+        if random.random() < self.slow_prob:
+            delay *= self.slow_factor
+        time.sleep(delay)
+
+        # Roughly 15 characters per second of speech
+        frames = max(1, int(len(text) / 15 / 0.026))
+        payload = FAKE_ID3 + FAKE_FRAME * frames
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mp3')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(latency: float, per_char: float, slow_prob: float = 0.0, slow_factor: float = 1.0):
+    """Start the fake endpoint on a free local port"""
+    FakeTTSHandler.latency = latency
+    FakeTTSHandler.per_char = per_char
+    FakeTTSHandler.slow_prob = slow_prob
+    FakeTTSHandler.slow_factor = slow_factor
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTTSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def build_chapter(words: int) -> str:
+    """Build a chapter of roughly the given number of words"""
+    sentence = "The lighthouse keeper climbed the stairs again and watched the storm roll in."
+    sentences_per_paragraph = 6
+    per_sentence = len(sentence.split())
+    count = max(1, words // per_sentence)
+    paragraphs = []
+    for start in range(0, count, sentences_per_paragraph):
+        paragraphs.append(" ".join([sentence] * min(sentences_per_paragraph, count - start)))
+    return "\n\n".join(paragraphs)
+
+
+def time_call(fn, repeat: int) -> float:
+    """Return the best wall-clock time over repeat runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_chunked(url: str, text: str, workers_list, repeat: int):
+    """Compare one serial request with chunked synthesis at several concurrency levels"""
+    service = WatsonTTSService(service_url=url, authenticator=NoAuthAuthenticator())
+    service.cache = None  # measure synthesis, not the audio cache
+    service.capture_timings = False  # the stand-in server only speaks HTTP
+    chunks = len(chunk_text(text, service.chunk_max_chars))
+    print(f"📄 {len(text.split())} words, {len(text)} chars, {chunks} chunks of <= {service.chunk_max_chars} chars")
+
+    single = time_call(lambda: service.synthesize_speech(text, 'Lisa', chunked=False), repeat)
+    print(f"   single request          : {single:7.3f}s")
+
+    baseline = None
+    for workers in workers_list:
+        service.max_workers = workers
+        elapsed = time_call(lambda: service.synthesize_speech(text, 'Lisa', chunked=True), repeat)
+        baseline = baseline or elapsed
+        print(f"   chunked, {workers:2d} worker(s)    : {elapsed:7.3f}s  (x{baseline / elapsed:.2f} vs 1 worker)")
+
+
+def bench_hedging(url: str, text: str, workers: int, repeat: int):
+    """Compare chunked synthesis with and without hedged requests on a heavy-tailed endpoint"""
+    for enabled in (False, True):
+        service = WatsonTTSService(service_url=url, authenticator=NoAuthAuthenticator())
+        service.cache = None
+        service.capture_timings = False
+        service.max_workers = workers
+        service.hedge_enabled = enabled
+        # Calibrate every chunk size class (the last chunk is usually shorter) before timing
+        for _ in range(Config.TTS_HEDGE_MIN_SAMPLES):
+            service.synthesize_speech(text, 'Lisa', chunked=True)
+        elapsed = time_call(lambda: service.synthesize_speech(text, 'Lisa', chunked=True), repeat)
+        stats = service.get_hedge_stats()
+        label = "hedged  " if enabled else "unhedged"
+        print(f"   {label} ({workers} workers)  : {elapsed:7.3f}s  "
+              f"p50={stats['p50']:.3f}s p99={stats['p99']:.3f}s "
+              f"hedges={stats['hedges']} wins={stats['hedge_wins']}")
+
+
+def bench_async(url: str, text: str, chapters: int, concurrency_list, repeat: int):
+    """Compare thread-pool and asyncio clients rendering several chapters at once"""
+    texts = [f"Chapter {i + 1}.\n\n{text}" for i in range(chapters)]
+    requests_total = sum(len(chunk_text(t, Config.TTS_CHUNK_MAX_CHARS)) for t in texts)
+    print(f"📚 {chapters} chapters, {requests_total} requests in total")
+
+    for concurrency in concurrency_list:
+        threaded = WatsonTTSService(service_url=url, authenticator=NoAuthAuthenticator())
+        threaded.cache = None
+        threaded.capture_timings = False
+        threaded.max_workers = concurrency
+        chunks = [chunk for t in texts for chunk in chunk_text(t, threaded.chunk_max_chars)]
+        elapsed = time_call(lambda: list(threaded.iter_segments(chunks, 'Lisa')), repeat)
+        print(f"   threads, {concurrency:3d} in flight : {elapsed:7.3f}s  "
+              f"({requests_total / elapsed:6.1f} req/s, {concurrency} threads)")
+
+        async def _run():
+            async with AsyncWatsonTTSService(service_url=url, authenticator=NoAuthAuthenticator(),
+                                             max_concurrency=concurrency) as client:
+                client.cache = None
+                return await _time_async(lambda: client.synthesize_many(texts, 'Lisa'), repeat)
+
+        elapsed = asyncio.run(_run())
+        print(f"   asyncio, {concurrency:3d} in flight : {elapsed:7.3f}s  "
+              f"({requests_total / elapsed:6.1f} req/s, 1 thread)")
+
+
+def bench_transport(url: str, calls: int, workers_list, repeat: int):
+    """Compare a new connection per call with the shared pooled transport"""
+    endpoint = f"{url}/v1/synthesize"
+    body = {'text': 'Hello.'}
+    print(f"🔌 {calls} small requests per run")
+
+    for workers in workers_list:
+        def _run(post):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda _: post(endpoint, json=body, timeout=Config.REQUEST_TIMEOUT).content, range(calls)))
+
+        unpooled = time_call(lambda: _run(requests.post), repeat)
+        transport = HttpTransport(pool_size=workers)
+        pooled = time_call(lambda: _run(transport.post), repeat)
+        stats = transport.stats()[transport.host_of(url)]
+        transport.close()
+        print(f"   {workers:2d} worker(s): per-call {unpooled / calls * 1000:6.2f} ms -> pooled "
+              f"{pooled / calls * 1000:6.2f} ms  (x{unpooled / pooled:.2f}, p50={stats['p50'] * 1000:.2f} ms)")
+
+
+async def _time_async(make_coro, repeat: int) -> float:
+    """Return the best wall-clock time over repeat awaited runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await make_coro()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Main benchmark function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--words', type=int, default=Config.MAX_TEXT_LENGTH)
+    parser.add_argument('--latency', type=float, default=0.25, help='fixed seconds per request')
+    parser.add_argument('--per-char', type=float, default=0.0002, help='extra seconds per character')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--hedge', action='store_true', help='benchmark hedged requests instead')
+    parser.add_argument('--slow-prob', type=float, default=0.05, help='share of slow requests (with --hedge)')
+    parser.add_argument('--slow-factor', type=float, default=8.0, help='slow request multiplier (with --hedge)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='compare the thread-pool and asyncio clients on several chapters')
+    parser.add_argument('--chapters', type=int, default=8, help='chapters rendered at once (with --async)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 64],
+                        help='requests in flight (with --async)')
+    parser.add_argument('--transport', action='store_true',
+                        help='compare per-call connections with the pooled transport (use --latency 0)')
+    parser.add_argument('--calls', type=int, default=500, help='requests per run (with --transport)')
+    args = parser.parse_args()
+
+    if args.hedge:
+        server, url = start_fake_server(args.latency, args.per_char, args.slow_prob, args.slow_factor)
+    else:
+        server, url = start_fake_server(args.latency, args.per_char)
+    print("🏁 EchoVerse TTS Benchmark")
+    print("=" * 50)
+    print(f"Fake endpoint {url}: {args.latency}s + {args.per_char}s/char per request")
+    try:
+        text = build_chapter(args.words)
+        if args.hedge:
+            bench_hedging(url, text, max(args.workers), args.repeat)
+        elif args.transport:
+            bench_transport(url, args.calls, args.workers, args.repeat)
+        elif args.use_async:
+            bench_async(url, text, args.chapters, args.concurrency, args.repeat)
+        else:
+            bench_chunked(url, text, args.workers, args.repeat)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,12 +16,25 @@ class Config:
     WATSONX_API_KEY = (os.getenv('IBM_WATSONX_API_KEY') or '').strip()
     WATSONX_PROJECT_ID = (os.getenv('IBM_WATSONX_PROJECT_ID') or '').strip()
     WATSONX_URL = (os.getenv('IBM_WATSONX_URL', 'https://us-south.ml.cloud.ibm.com') or '').strip()
+    # IAM tokens are cached here and shared by every local process using the same API key
+    IAM_TOKEN_URL = (os.getenv('IBM_IAM_TOKEN_URL') or 'https://iam.cloud.ibm.com/identity/token').strip()
+    IAM_TOKEN_CACHE_DIR = os.getenv('ECHOVERSE_IAM_TOKEN_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'echoverse', 'iam')
 
     # Hugging Face
     HUGGINGFACE_TOKEN = (os.getenv('HUGGINGFACE_TOKEN') or '').strip()
     HF_SPACE_ID = (os.getenv('HF_SPACE_ID') or 'sabarnakb/GraniteEchoverse').strip()
-    HF_SPACE_API_NAME = (os.getenv('HF_SPACE_API_NAME') or '/process_text').strip()
+    # The streaming endpoint yields partial rewrites while generating and is micro-batched with
+    # other requests like '/process_text'; Spaces without it fall back to the first endpoint
+    # taking the rewrite inputs (e.g. '/process_text')
+    HF_SPACE_API_NAME = (os.getenv('HF_SPACE_API_NAME') or '/process_text_stream').strip()
+    # Version of the Space's prompts and model, part of the rewrite cache key: bump it (e.g. to the
+    # Space's commit) when the Space changes so cached rewrites from the old build are not reused
+    HF_SPACE_REVISION = os.getenv('ECHOVERSE_HF_SPACE_REVISION', '').strip()
     HF_FALLBACK_MODEL_ID = (os.getenv('HF_FALLBACK_MODEL_ID') or 'google/flan-t5-base').strip()
+    # Ping the Space every HF_KEEP_WARM_INTERVAL seconds (0 disables) so it does not sleep
+    # mid-session; pinging stops once no rewrite has been made for HF_KEEP_WARM_IDLE seconds
+    HF_KEEP_WARM_INTERVAL = float(os.getenv('ECHOVERSE_HF_KEEP_WARM_INTERVAL', '0'))
+    HF_KEEP_WARM_IDLE = float(os.getenv('ECHOVERSE_HF_KEEP_WARM_IDLE', '1800'))
 
     # Application Configuration
     MAX_TEXT_LENGTH = 2000  # Maximum words for performance requirement
@@ -31,18 +45,98 @@ class Config:
     }
     
     TONE_OPTIONS = ['Neutral', 'Suspenseful', 'Inspiring']
+
+    # Chunked LLM rewriting: texts over LLM_CHUNK_TOKENS are split by paragraph and the
+    # chunks rewritten by up to LLM_MAX_WORKERS concurrent requests, each seeing the tail
+    # (LLM_CHUNK_OVERLAP_CHARS) of the previous chunk for continuity. The limit covers every
+    # document in flight: rewrite_many() documents share it rather than multiplying it
+    LLM_CHUNK_TOKENS = int(os.getenv('ECHOVERSE_LLM_CHUNK_TOKENS', '400'))
+    LLM_CHUNK_OVERLAP_CHARS = int(os.getenv('ECHOVERSE_LLM_CHUNK_OVERLAP_CHARS', '200'))
+    LLM_MAX_WORKERS = int(os.getenv('ECHOVERSE_LLM_WORKERS', '4'))
+    # Documents rewritten concurrently by rewrite_many()
+    LLM_BATCH_WORKERS = int(os.getenv('ECHOVERSE_LLM_BATCH_WORKERS', '4'))
+
+    # Token budgeting: counts are exact when LLM_TOKENIZER loads from local files, otherwise
+    # estimated at LLM_CHARS_PER_TOKEN (calibrated from the counts the API reports). Each
+    # request generates up to LLM_OUTPUT_RATIO x its input tokens + LLM_OUTPUT_MARGIN, within
+    # [LLM_MIN_NEW_TOKENS, LLM_MAX_NEW_TOKENS]; prompts that cannot fit LLM_CONTEXT_TOKENS
+    # together with their output are split (or rejected when chunking is off)
+    LLM_TOKENIZER = (os.getenv('ECHOVERSE_LLM_TOKENIZER') or '').strip()
+    LLM_CHARS_PER_TOKEN = float(os.getenv('ECHOVERSE_LLM_CHARS_PER_TOKEN', '4'))
+    LLM_CONTEXT_TOKENS = int(os.getenv('ECHOVERSE_LLM_CONTEXT_TOKENS', '8192'))
+    LLM_OUTPUT_RATIO = float(os.getenv('ECHOVERSE_LLM_OUTPUT_RATIO', '1.5'))
+    LLM_OUTPUT_MARGIN = int(os.getenv('ECHOVERSE_LLM_OUTPUT_MARGIN', '32'))
+    LLM_MIN_NEW_TOKENS = int(os.getenv('ECHOVERSE_LLM_MIN_NEW_TOKENS', '50'))
+    LLM_MAX_NEW_TOKENS = int(os.getenv('ECHOVERSE_LLM_MAX_NEW_TOKENS', '1024'))
+    # Longest text sent to the Hugging Face Space in one call; longer texts are split
+    HF_MAX_INPUT_TOKENS = int(os.getenv('ECHOVERSE_HF_MAX_INPUT_TOKENS', '1500'))
+
+    # Rewrite backend: 'hf-space' (remote Granite Space), 'watsonx' (IBM Watsonx Granite, streamed
+    # token by token) or 'local' (in-process Granite model)
+    LLM_BACKEND = (os.getenv('ECHOVERSE_LLM_BACKEND') or 'hf-space').strip().lower()
+    LOCAL_LLM_MODEL_ID = (os.getenv('ECHOVERSE_LOCAL_LLM_MODEL_ID') or 'ibm-granite/granite-3.2-2b-instruct').strip()
+    LOCAL_LLM_DEVICE = (os.getenv('ECHOVERSE_LOCAL_LLM_DEVICE') or '').strip()  # default: cuda if available
+    LOCAL_LLM_MAX_INPUT_TOKENS = int(os.getenv('ECHOVERSE_LOCAL_LLM_MAX_INPUT_TOKENS', '1500'))
     
     # Audio Configuration
-    AUDIO_FORMAT = 'audio/mp3'
-    SAMPLE_RATE = 22050
+    # Format synthesized and stored in the library; MP3 is produced on demand for downloads
+    # Long texts are joined from several requests, which needs Ogg Opus, MP3 or WAV
+    AUDIO_FORMAT = (os.getenv('ECHOVERSE_AUDIO_FORMAT') or 'audio/ogg;codecs=opus').strip()
+    SAMPLE_RATE = int(os.getenv('ECHOVERSE_SAMPLE_RATE', '22050'))
+    MP3_BITRATE = (os.getenv('ECHOVERSE_MP3_BITRATE') or '64k').strip()
+
+    # Chunked TTS Configuration
+    # Long texts are split on sentence/paragraph boundaries into chunks of at most
+    # TTS_CHUNK_MAX_CHARS characters and synthesized by up to TTS_MAX_WORKERS threads
+    TTS_CHUNK_MAX_CHARS = int(os.getenv('ECHOVERSE_TTS_CHUNK_CHARS', '1500'))
+    TTS_MAX_WORKERS = int(os.getenv('ECHOVERSE_TTS_WORKERS', '4'))
+    # Requests kept in flight by the asyncio client (AsyncWatsonTTSService)
+    TTS_ASYNC_CONCURRENCY = int(os.getenv('ECHOVERSE_TTS_ASYNC_CONCURRENCY', '32'))
+    # Edited sentences are re-synthesized in groups of at most this many characters; first
+    # renders and unchanged text use TTS_CHUNK_MAX_CHARS groups
+    TTS_SEGMENT_MAX_CHARS = int(os.getenv('ECHOVERSE_TTS_SEGMENT_CHARS', '400'))
+    # Capture Watson word timings (WebSocket synthesis, outside the pooled HTTP transport and its
+    # retries); timings are estimated when off or unavailable
+    TTS_WORD_TIMINGS = os.getenv('ECHOVERSE_TTS_WORD_TIMINGS', '0').strip().lower() in ('1', 'true', 'yes')
+
+    # Hedged TTS requests: once TTS_HEDGE_MIN_SAMPLES latencies are known, a chunk still
+    # running after the TTS_HEDGE_PERCENTILE latency gets one duplicate request
+    TTS_HEDGE_ENABLED = os.getenv('ECHOVERSE_TTS_HEDGE', '0').strip().lower() in ('1', 'true', 'yes')
+    TTS_HEDGE_PERCENTILE = float(os.getenv('ECHOVERSE_TTS_HEDGE_PERCENTILE', '95'))
+    TTS_HEDGE_MIN_SAMPLES = int(os.getenv('ECHOVERSE_TTS_HEDGE_MIN_SAMPLES', '20'))
+    TTS_LATENCY_WINDOW = int(os.getenv('ECHOVERSE_TTS_LATENCY_WINDOW', '200'))
+
+    # Audio Cache Configuration
+    # Synthesized audio is cached on disk, keyed by text, voice, format and service URL
+    AUDIO_CACHE_ENABLED = os.getenv('ECHOVERSE_AUDIO_CACHE', '1').strip().lower() not in ('0', 'false', 'no')
+    AUDIO_CACHE_DIR = os.getenv('ECHOVERSE_AUDIO_CACHE_DIR') or os.path.join(os.path.dirname(__file__), 'audio_cache')
+    AUDIO_CACHE_MAX_BYTES = int(os.getenv('ECHOVERSE_AUDIO_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+    # Rewrite Cache Configuration
+    # Finished LLM rewrites are cached in SQLite, keyed by backend, model, prompt template,
+    # decoding parameters and text; entries expire after REWRITE_CACHE_TTL seconds
+    REWRITE_CACHE_ENABLED = os.getenv('ECHOVERSE_REWRITE_CACHE', '1').strip().lower() not in ('0', 'false', 'no')
+    REWRITE_CACHE_PATH = os.getenv('ECHOVERSE_REWRITE_CACHE_PATH') or os.path.join(os.path.dirname(__file__), 'rewrite_cache.sqlite3')
+    REWRITE_CACHE_TTL = float(os.getenv('ECHOVERSE_REWRITE_CACHE_TTL', str(7 * 24 * 3600)))
+    REWRITE_CACHE_MAX_ENTRIES = int(os.getenv('ECHOVERSE_REWRITE_CACHE_MAX_ENTRIES', '5000'))
 
     # Network/Retry Configuration
     REQUEST_TIMEOUT = float(os.getenv('ECHOVERSE_REQUEST_TIMEOUT', '15'))  # seconds
     REQUEST_RETRIES = int(os.getenv('ECHOVERSE_REQUEST_RETRIES', '3'))
     RETRY_BACKOFF = float(os.getenv('ECHOVERSE_RETRY_BACKOFF', '0.75'))  # seconds
+    # Long generations may stream for minutes; this bounds the wait between received bytes
+    LLM_READ_TIMEOUT = float(os.getenv('ECHOVERSE_LLM_READ_TIMEOUT', '120'))  # seconds
+    # Keep-alive connections pooled per remote host
+    HTTP_POOL_SIZE = int(os.getenv('ECHOVERSE_HTTP_POOL_SIZE', '32'))
 
     # Local Library Configuration
     # Default directory where projects (text + audio) are stored locally
     LIBRARY_DIR = os.getenv('ECHOVERSE_LIBRARY_DIR') or os.path.join(os.path.dirname(__file__), 'library')
     # Default directory where audio bookmarks are stored locally
     BOOKMARKS_DIR = os.getenv('ECHOVERSE_BOOKMARKS_DIR') or os.path.join(os.path.dirname(__file__), 'bookmarks')
+    # Directory where freshly generated audio is spooled before it is saved
+    AUDIO_SPOOL_DIR = os.getenv('ECHOVERSE_AUDIO_SPOOL_DIR') or os.path.join(tempfile.gettempdir(), 'echoverse')
+    # Spooled audio of sessions idle for AUDIO_SPOOL_TTL seconds is deleted, checked at most
+    # every AUDIO_SPOOL_SWEEP_INTERVAL seconds when a session starts spooling
+    AUDIO_SPOOL_TTL = float(os.getenv('ECHOVERSE_AUDIO_SPOOL_TTL', str(24 * 3600)))
+    AUDIO_SPOOL_SWEEP_INTERVAL = float(os.getenv('ECHOVERSE_AUDIO_SPOOL_SWEEP_INTERVAL', '600'))
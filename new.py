@@ -2,7 +2,6 @@ import streamlit as st
 import io
 import base64
 from services.watson_tts import WatsonTTSService
-from services.hf_llm import HuggingFaceLLMService
 from config import Config
 import json
 import os
@@ -16,7 +15,14 @@ from app_restored import (
     attach_audio_to_bookmark as attach_audio_to_bookmark_impl,
     load_bookmarks_from_disk as load_bookmarks_from_disk_impl,
     load_library_from_disk as load_library_from_disk_impl,
+    generate_audio_to_spool,
+    render_voice_comparison,
+    rewrite_with_preview,
+    create_llm_service,
+    audio_download_controls,
+    AUDIO_MIME,
 )
+from services.audio_utils import mime_for_path
 
 
 # Enhanced Modern UI Components
@@ -441,7 +447,7 @@ if st.session_state.theme == 'dark':
 def initialize_services():
     """Initialize Watson services"""
     tts_service = WatsonTTSService()
-    llm_service = HuggingFaceLLMService()
+    llm_service = create_llm_service()
     return tts_service, llm_service
 
 # Functional wrappers delegating to app_restored implementations
@@ -670,11 +676,11 @@ def create_audio_page_modern(tts_service, llm_service):
         with col2:
             if st.button("🔄 Suggest Rewrite", type="primary", use_container_width=True):
                 if llm_service.is_service_available():
-                    with st.spinner("Rewriting text with AI..."):
-                        rewritten_text = llm_service.rewrite_text(user_text, selected_tone)
-                        st.session_state.rewritten_text = rewritten_text
-                        st.success("Text rewritten successfully!")
-                        st.session_state.creation_step = 3
+                    rewritten_text = rewrite_with_preview(llm_service, user_text, selected_tone,
+                                                          "Rewriting text with AI...")
+                    st.session_state.rewritten_text = rewritten_text
+                    st.success("Text rewritten successfully!")
+                    st.session_state.creation_step = 3
                 else:
                     st.error("LLM service not available. Check Hugging Face settings.")
        
@@ -708,8 +714,7 @@ def create_audio_page_modern(tts_service, llm_service):
                 if tts_service.is_service_available():
                     with st.spinner("🎧 Generating your audiobook..."):
                         try:
-                            audio_bytes = tts_service.synthesize_speech(effective_text, selected_voice)
-                            st.session_state.audio_data = audio_bytes
+                            st.session_state.audio_data = generate_audio_to_spool(tts_service, effective_text, selected_voice)
                             st.session_state.audio_generated = True
                             st.session_state.creation_step = 4
                             st.success("Audio generated successfully!")
@@ -717,11 +722,13 @@ def create_audio_page_modern(tts_service, llm_service):
                             st.error(f"Error generating audio: {e}")
                 else:
                     st.error("TTS service not available. Check IBM Watson TTS config.")
+
+        render_voice_comparison(tts_service, st.session_state.get('rewritten_text', user_text))
    
     # Step 5: Preview & Save
     if 'audio_data' in st.session_state:
         st.markdown('<div class="section-title">🎵 Audio Preview</div>', unsafe_allow_html=True)
-        st.audio(st.session_state.audio_data, format='audio/mp3')
+        st.audio(st.session_state.audio_data, format=AUDIO_MIME)
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("💾 Save to Library", type="primary", use_container_width=True):
@@ -743,12 +750,7 @@ def create_audio_page_modern(tts_service, llm_service):
                     voice=selected_voice,
                 )
         with col3:
-            st.download_button(
-                label="⬇️ Download MP3",
-                data=st.session_state.audio_data,
-                file_name=f"{(project_name or 'audiobook').strip()}.mp3",
-                mime="audio/mp3",
-            )
+            audio_download_controls(st.session_state.audio_data, (project_name or 'audiobook').strip(), key="session_audio")
     else:
         # allow empty bookmark creation
         st.markdown("### 🔖 Create Bookmark (no audio yet)")
@@ -825,17 +827,13 @@ def library_page_modern():
                         ap = (item.get('paths') or {}).get('audio')
                         if ap and os.path.exists(ap):
                             if st.button("▶️ Play", key=f"play_{i}", use_container_width=True):
-                                with open(ap, 'rb') as f:
-                                    ab = f.read()
-                                st.audio(ab, format='audio/mp3')
+                                st.audio(ap, format=mime_for_path(ap))
                     with col2:
                         st.empty()
                     with col3:
                         ap = (item.get('paths') or {}).get('audio')
                         if ap and os.path.exists(ap):
-                            with open(ap, 'rb') as f:
-                                ab = f.read()
-                            st.download_button("⬇️ Download MP3", ab, os.path.basename(ap), mime="audio/mp3", key=f"dl_grid_{i}")
+                            audio_download_controls(ap, item.get('name') or f'project_{i+1}', key=f"dl_grid_{i}")
         else:
             # List view
             for i, item in enumerate(library_items):
@@ -851,9 +849,7 @@ def library_page_modern():
                         ap = (item.get('paths') or {}).get('audio')
                         if ap and os.path.exists(ap):
                             if st.button("▶️ Play Audio", key=f"play_list_{i}"):
-                                with open(ap, 'rb') as f:
-                                    ab = f.read()
-                                st.audio(ab, format='audio/mp3')
+                                st.audio(ap, format=mime_for_path(ap))
                        
                         col_a, col_b = st.columns(2)
                         with col_a:
@@ -861,9 +857,7 @@ def library_page_modern():
                                 pass
                         with col_b:
                             if ap and os.path.exists(ap):
-                                with open(ap, 'rb') as f:
-                                    ab = f.read()
-                                st.download_button("⬇️ Download", ab, os.path.basename(ap), mime="audio/mp3", key=f"dl_list_{i}")
+                                audio_download_controls(ap, item.get('name') or f'project_{i+1}', key=f"dl_list_{i}")
 
 def bookmarks_page_modern():
     """Modern bookmarks page"""
@@ -934,9 +928,7 @@ def bookmarks_page_modern():
                 ap = (bookmark.get('paths') or {}).get('audio')
                 if ap and os.path.exists(ap):
                     if st.button("▶️ Play", key=f"bookmark_play_{i}"):
-                        with open(ap, 'rb') as f:
-                            ab = f.read()
-                        st.audio(ab, format='audio/mp3')
+                        st.audio(ap, format=mime_for_path(ap))
             with col2:
                 if st.button("📤 Share", key=f"bookmark_share_{i}"):
                     st.info("Share link copied!")
@@ -3,7 +3,7 @@ import os
 from datetime import datetime
 from config import Config
 from services.watson_tts import WatsonTTSService
-from services.hf_llm import HuggingFaceLLMService
+from services.http_transport import get_transport
 from app_restored import (
     save_to_library,
     save_bookmark,
@@ -12,7 +12,14 @@ from app_restored import (
     attach_audio_to_bookmark,
     load_bookmarks_from_disk,
     load_library_from_disk,
+    generate_audio_to_spool,
+    render_voice_comparison,
+    rewrite_with_preview,
+    create_llm_service,
+    audio_download_controls,
+    AUDIO_MIME,
 )
+from services.audio_utils import mime_for_path
 
 # -------- Modern UI from new.py (trimmed and adapted) --------
 
@@ -46,7 +53,7 @@ def header():
 @st.cache_resource
 def initialize_services():
     tts_service = WatsonTTSService()
-    llm_service = HuggingFaceLLMService()
+    llm_service = create_llm_service()
     return tts_service, llm_service
 
 
@@ -88,10 +95,10 @@ def page_create(tts_service, llm_service):
     with c2:
         if st.button("🔄 Suggest Rewrite", type="primary"):
             if llm_service.is_service_available():
-                with st.spinner("Rewriting text with AI…"):
-                    rewritten_text = llm_service.rewrite_text(user_text, selected_tone)
-                    st.session_state.rewritten_text = rewritten_text
-                    st.success("Text rewritten successfully!")
+                rewritten_text = rewrite_with_preview(llm_service, user_text, selected_tone,
+                                                      "Rewriting text with AI…")
+                st.session_state.rewritten_text = rewritten_text
+                st.success("Text rewritten successfully!")
             else:
                 st.error("LLM service not available. Check your Hugging Face settings.")
 
@@ -129,23 +136,19 @@ def page_create(tts_service, llm_service):
         if tts_service.is_service_available():
             with st.spinner("Generating audio…"):
                 try:
-                    audio_bytes = tts_service.synthesize_speech(effective_text, selected_voice)
-                    st.session_state.audio_data = audio_bytes
+                    st.session_state.audio_data = generate_audio_to_spool(tts_service, effective_text, selected_voice)
                     st.success("Audio generated!")
                 except Exception as e:
                     st.error(f"TTS error: {e}")
         else:
             st.error("TTS service not available. Check IBM Watson TTS config.")
 
+    render_voice_comparison(tts_service, effective_text)
+
     # Playback / download / bookmark
     if 'audio_data' in st.session_state:
-        st.audio(st.session_state.audio_data, format='audio/mp3')
-        st.download_button(
-            label="⬇️ Download MP3",
-            data=st.session_state.audio_data,
-            file_name=f"{project_name or 'audiobook'}.mp3",
-            mime="audio/mp3",
-        )
+        st.audio(st.session_state.audio_data, format=AUDIO_MIME)
+        audio_download_controls(st.session_state.audio_data, project_name or 'audiobook', key="session_audio")
         st.markdown("### 🔖 Add Bookmark")
         bc1, bc2 = st.columns([2,1])
         with bc1:
@@ -198,10 +201,8 @@ def page_library():
             # audio
             ap = (p.get('paths') or {}).get('audio')
             if ap and os.path.exists(ap):
-                with open(ap, 'rb') as f:
-                    ab = f.read()
-                st.audio(ab, format='audio/mp3')
-                st.download_button("⬇️ Download MP3", ab, os.path.basename(ap), mime="audio/mp3", key=f"dl_{i}")
+                st.audio(ap, format=mime_for_path(ap))
+                audio_download_controls(ap, p.get('name') or 'project', key=f"dl_{i}")
                 # Add to bookmarks from project audio
                 st.markdown("#### Add to Bookmarks")
                 c1, c2 = st.columns([2,1])
@@ -220,6 +221,7 @@ def page_library():
                                 tone=p.get('tone',''),
                                 voice=p.get('voice',''),
                                 audio_bytes=audio_bytes,
+                                audio_ext=ap.rsplit('.', 1)[-1],
                             )
                             st.success("Bookmark saved from project audio.")
                         except Exception as e:
@@ -242,10 +244,8 @@ def page_bookmarks():
             st.text_area("Snippet", bm.get('text_snippet') or '', height=100, key=f"bm_snip_{i}")
             ap = (bm.get('paths') or {}).get('audio')
             if ap and os.path.exists(ap):
-                with open(ap, 'rb') as f:
-                    ab = f.read()
-                st.audio(ab, format='audio/mp3')
-                st.download_button("⬇️ Download Bookmark MP3", ab, os.path.basename(ap), mime="audio/mp3", key=f"bm_dl_{i}")
+                st.audio(ap, format=mime_for_path(ap))
+                audio_download_controls(ap, bm.get('name') or 'bookmark', key=f"bm_dl_{i}")
             else:
                 st.caption("No audio attached yet.")
                 if 'audio_data' in st.session_state:
@@ -260,6 +260,11 @@ def page_settings(tts_service, llm_service):
     st.write("Rewriter Connected:", llm_service.is_service_available())
     st.write("Library Dir:", Config.LIBRARY_DIR)
     st.write("Bookmarks Dir:", Config.BOOKMARKS_DIR)
+    st.write("Audio Cache:", tts_service.get_cache_stats() or "disabled")
+    st.write("TTS Hedging:", tts_service.get_hedge_stats())
+    st.write("Rewrite Cache:", llm_service.get_cache_stats() or "disabled")
+    st.write("Token Estimates:", llm_service.get_token_stats())
+    st.write("Remote Services:", get_transport().stats())
 
 
 # -------- App --------
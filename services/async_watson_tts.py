@@ -0,0 +1,240 @@
+import asyncio
+import random
+import time
+from typing import List, Optional
+from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
+from config import Config
+from services.audio_cache import AudioCache
+from services.audio_utils import accept_with_rate, join_audio
+from services.hedging import LatencyTracker
+from services.text_chunking import chunk_text
+import streamlit as st
+
+try:
+    # Optional: only needed for the asyncio client
+    import aiohttp
+except Exception:  # pragma: no cover
+    aiohttp = None
+
+# Authorization headers are re-read from the authenticator at most this often (seconds)
+_AUTH_REFRESH_SECONDS = 60
+# Like the pooled transport, synthesize POSTs are repeated only when Watson refused them
+_RETRY_STATUSES = (429, 503)
+
+
+class AsyncWatsonTTSService:
+    """Asyncio IBM Watson Text-to-Speech client
+
+    Same synthesize_speech contract as WatsonTTSService, but requests are
+    coroutines on one event loop instead of threads: a semaphore bounds how many
+    are in flight and all of them share one pooled HTTP session, so a batch job
+    can keep dozens of chapters rendering at once.
+    """
+
+    def __init__(self, service_url: Optional[str] = None, authenticator=None, cache: Optional[AudioCache] = None,
+                 accept: Optional[str] = None, max_concurrency: Optional[int] = None):
+        self.service_url = (service_url or Config.WATSON_TTS_URL).rstrip('/')
+        self.authenticator = authenticator
+        self.accept = accept or accept_with_rate(Config.AUDIO_FORMAT, Config.SAMPLE_RATE)
+        self.chunk_max_chars = Config.TTS_CHUNK_MAX_CHARS
+        self.max_concurrency = max_concurrency or Config.TTS_ASYNC_CONCURRENCY
+        self.cache = cache
+        self.latency = LatencyTracker(Config.TTS_LATENCY_WINDOW)
+        self._session = None
+        self._semaphore = None
+        self._loop = None
+        self._auth_headers = None
+        self._auth_expires = 0.0
+        self._auth_lock = None
+        self._initialize_service()
+        self._initialize_cache()
+
+    def _initialize_service(self):
+        """Set up authentication; the HTTP session is created on first use inside the event loop"""
+        try:
+            if aiohttp is None:
+                raise ImportError("aiohttp is required for the async TTS client")
+            if self.authenticator is None:
+                if not Config.WATSON_TTS_API_KEY:
+                    raise ValueError("Watson TTS API key not found in configuration")
+                self.authenticator = IAMAuthenticator(Config.WATSON_TTS_API_KEY)
+        except Exception as e:
+            st.error(f"Failed to initialize async Watson TTS service: {str(e)}")
+            self.authenticator = None
+
+    def _initialize_cache(self):
+        """Attach the on-disk audio cache unless disabled or unusable"""
+        if self.cache is not None or not Config.AUDIO_CACHE_ENABLED:
+            return
+        try:
+            self.cache = AudioCache()
+        except Exception as e:
+            st.warning(f"Audio cache disabled: {str(e)}")
+            self.cache = None
+
+    async def synthesize_speech(self, text: str, voice: str = 'Lisa', chunked: Optional[bool] = None) -> bytes:
+        """
+        Convert text to speech using Watson TTS
+
+        Args:
+            text (str): Text to convert to speech
+            voice (str): Voice to use for synthesis
+            chunked (bool): Split the text into chunks synthesized concurrently.
+                Defaults to chunking only texts longer than one chunk.
+
+        Returns:
+            bytes: Audio data in the configured output format
+        """
+        if not self.is_service_available():
+            raise Exception("Watson TTS service not initialized")
+
+        try:
+            voice_id = Config.SUPPORTED_VOICES.get(voice, Config.SUPPORTED_VOICES['Lisa'])
+
+            chunks = chunk_text(text, self.chunk_max_chars) if chunked is not False else []
+            if len(chunks) <= 1:
+                return await self._synthesize_chunk(text, voice_id)
+
+            segments = await asyncio.gather(*(self._synthesize_chunk(chunk, voice_id) for chunk in chunks))
+            return join_audio(segments, self.accept)
+
+        except Exception as e:
+            st.error(f"Error synthesizing speech: {str(e)}")
+            raise
+
+    async def synthesize_many(self, texts: List[str], voice: str = 'Lisa') -> List[bytes]:
+        """
+        Synthesize several texts (e.g. chapters) concurrently
+
+        Every chunk of every text shares the same concurrency limit.
+
+        Args:
+            texts (list): Texts to convert to speech
+            voice (str): Voice to use for synthesis
+
+        Returns:
+            list: Audio data of each text, in input order
+        """
+        return list(await asyncio.gather(*(self.synthesize_speech(text, voice) for text in texts)))
+
+    async def _synthesize_chunk(self, text: str, voice_id: str) -> bytes:
+        """Synthesize a single request worth of text, served from the cache when possible"""
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(text, voice_id, self.accept, self.service_url)
+            # Disk I/O runs in a thread so it never blocks the other requests on the loop
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+
+        audio = await self._request_chunk(text, voice_id)
+
+        if key is not None:
+            await asyncio.to_thread(self.cache.put, key, audio)
+        return audio
+
+    async def _request_chunk(self, text: str, voice_id: str) -> bytes:
+        """
+        Send one synthesize request and record its latency
+
+        Connection failures and refusals (429/503) are retried with jittered
+        exponential backoff, honouring Retry-After, up to Config.REQUEST_RETRIES times.
+        """
+        session = await self._get_session()
+        for attempt in range(Config.REQUEST_RETRIES + 1):
+            headers = {'Accept': self.accept, **(await self._get_auth_headers())}
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    async with session.post(
+                        f"{self.service_url}/v1/synthesize",
+                        params={'voice': voice_id},
+                        json={'text': text},
+                        headers=headers,
+                    ) as response:
+                        audio = await response.read()
+                        if response.status == 200:
+                            self.latency.record(time.perf_counter() - start)
+                            return audio
+                        detail = audio[:200].decode('utf-8', 'replace')
+                        error = Exception(f"Watson TTS request failed ({response.status}): {detail}")
+                        if response.status not in _RETRY_STATUSES:
+                            raise error
+                        retry_after = response.headers.get('Retry-After')
+            except aiohttp.ClientConnectorError as e:
+                # Only failures to connect: a request that was sent may already be synthesizing
+                error = e
+            if attempt == Config.REQUEST_RETRIES:
+                raise error
+            await asyncio.sleep(self._retry_delay(attempt, retry_after))
+
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds before the next attempt: the server's Retry-After, else jittered exponential backoff"""
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            return Config.RETRY_BACKOFF * (2 ** attempt) + random.uniform(0, Config.RETRY_BACKOFF)
+
+    async def _get_auth_headers(self) -> dict:
+        """Authorization headers; token requests run in a thread so they never block the loop"""
+        async with self._auth_lock:
+            if self._auth_headers is None or time.monotonic() >= self._auth_expires:
+                req = {'headers': {}}
+                await asyncio.to_thread(self.authenticator.authenticate, req)
+                self._auth_headers = req['headers']
+                self._auth_expires = time.monotonic() + _AUTH_REFRESH_SECONDS
+            return self._auth_headers
+
+    async def _get_session(self):
+        """Pooled session, semaphore and auth lock bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._loop is not loop:
+            await self._close_stale_session()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                # Same bounds as the pooled transport: connecting and each wait for data, not the whole synthesis
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=Config.REQUEST_TIMEOUT,
+                                              sock_read=Config.REQUEST_TIMEOUT),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._auth_lock = asyncio.Lock()
+            self._loop = loop
+        return self._session
+
+    async def _close_stale_session(self):
+        """Close the session left behind by an earlier event loop (e.g. a previous asyncio.run)"""
+        session, loop = self._session, self._loop
+        self._session = None
+        if loop is not None and loop.is_running():
+            # Still serving another thread: close it there
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            return
+        try:
+            await session.close()
+        except RuntimeError:
+            # Its loop is closed; the connections cannot be shut down cleanly any more
+            pass
+
+    async def aclose(self):
+        """Close the pooled HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    def get_available_voices(self) -> list:
+        """Get list of available voices"""
+        return list(Config.SUPPORTED_VOICES.keys())
+
+    def is_service_available(self) -> bool:
+        """Check if the service is properly initialized"""
+        return self.authenticator is not None
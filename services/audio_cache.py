@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+from config import Config
+
+
+class AudioCache:
+    """Content-addressed on-disk cache for synthesized audio
+
+    Entries are keyed by a hash of the normalized text, voice, accept format and
+    service URL. The cache holds at most max_bytes of audio and evicts the least
+    recently used entries first; recency survives restarts via file mtimes.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir or Config.AUDIO_CACHE_DIR
+        self.max_bytes = Config.AUDIO_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._total_bytes = 0
+        self._load()
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, accept: str, service_url: str) -> str:
+        """Build the cache key for a synthesis request"""
+        normalized = " ".join(unicodedata.normalize('NFC', text or '').split())
+        digest = hashlib.sha256()
+        for part in (normalized, voice_id or '', accept or '', (service_url or '').rstrip('/')):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.bin")
+
+    def _load(self):
+        """Index existing entries, oldest access first"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        found = []
+        for root, _dirs, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.bin'):
+                    continue
+                try:
+                    info = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((info.st_mtime, name[:-4], info.st_size))
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached audio for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                # Written by another process sharing the directory
+                self._entries[key] = len(data)
+                self._total_bytes += len(data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store audio under key and evict old entries beyond the byte budget"""
+        if not data or len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def put_meta(self, key: str, meta: dict):
+        """Store a small JSON sidecar (e.g. word timings) next to an entry"""
+        try:
+            os.makedirs(os.path.dirname(self._path(key)), exist_ok=True)
+            with open(self._meta_path(key), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+
+    def get_meta(self, key: str) -> Optional[dict]:
+        """Return the JSON sidecar of an entry, or None"""
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remove_files(self, key: str):
+        for path in (self._path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict_locked(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            self._remove_files(key)
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove_files(key)
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,447 @@
+import io
+from typing import Iterable, Iterator, Optional, Tuple
+
+try:
+    # Optional: only needed to transcode stored audio to MP3
+    from pydub import AudioSegment
+except Exception:  # pragma: no cover
+    AudioSegment = None
+
+# MPEG audio Layer III lookup tables (kbps / Hz), indexed by header fields
+_BITRATES_V1_L3 = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0)
+_BITRATES_V2_L3 = (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0)
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),   # MPEG-2.5
+}
+_VBR_TAGS = (b'Xing', b'Info', b'VBRI')
+
+
+def _id3v2_size(data: bytes, pos: int = 0) -> int:
+    """Return the total size of an ID3v2 tag at pos, or 0 if none"""
+    if data[pos:pos + 3] != b'ID3' or len(data) < pos + 10:
+        return 0
+    size = 0
+    for b in data[pos + 6:pos + 10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if data[pos + 5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def parse_frame_header(data: bytes, pos: int) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse an MPEG Layer III frame header
+
+    Args:
+        data (bytes): MP3 data
+        pos (int): Offset of the candidate header
+
+    Returns:
+        tuple: (frame_length, sample_rate, samples_per_frame) or None if not a valid header
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2 = data[pos + 1], data[pos + 2]
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_idx = b2 >> 4
+    rate_idx = (b2 >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    sample_rate = _SAMPLE_RATES[version][rate_idx]
+    padding = (b2 >> 1) & 0x01
+    if version == 3:
+        bitrate = _BITRATES_V1_L3[bitrate_idx] * 1000
+        return 144 * bitrate // sample_rate + padding, sample_rate, 1152
+    bitrate = _BITRATES_V2_L3[bitrate_idx] * 1000
+    return 72 * bitrate // sample_rate + padding, sample_rate, 576
+
+
+def strip_mp3_metadata(data: bytes) -> bytes:
+    """
+    Remove ID3 tags and the Xing/Info/VBRI header frame from an MP3 stream
+
+    What remains is a bare sequence of audio frames that can be concatenated
+    with other bare streams into one continuous file.
+    """
+    start = _id3v2_size(data)
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+
+    header = parse_frame_header(data, start)
+    if header is not None:
+        frame_len = header[0]
+        if any(tag in data[start + 4:start + frame_len] for tag in _VBR_TAGS):
+            start += frame_len
+    return data[start:end]
+
+
+def mp3_duration(data: bytes) -> float:
+    """Duration in seconds of an MP3 stream, by walking its frame headers"""
+    pos = _id3v2_size(data)
+    seconds = 0.0
+    first = True
+    while pos + 4 <= len(data):
+        header = parse_frame_header(data, pos)
+        if header is None:
+            # Resynchronize on the next frame sync
+            pos = data.find(b'\xff', pos + 1)
+            if pos < 0:
+                break
+            continue
+        frame_len, sample_rate, samples = header
+        # The Xing/Info/VBRI header frame carries no audio
+        if not (first and any(tag in data[pos + 4:pos + frame_len] for tag in _VBR_TAGS)):
+            seconds += samples / sample_rate
+        first = False
+        pos += frame_len
+    return seconds
+
+
+def join_mp3(segments: Iterable[bytes]) -> bytes:
+    """Concatenate MP3 segments into a single stream without per-segment headers"""
+    return b''.join(strip_mp3_metadata(segment) for segment in segments if segment)
+
+
+# ---- Container formats ----
+
+_EXTENSIONS = {
+    'audio/mp3': 'mp3',
+    'audio/mpeg': 'mp3',
+    'audio/ogg': 'ogg',
+    'audio/webm': 'webm',
+    'audio/wav': 'wav',
+    'audio/flac': 'flac',
+}
+_MIME_BY_EXTENSION = {
+    'mp3': 'audio/mp3',
+    'ogg': 'audio/ogg',
+    'webm': 'audio/webm',
+    'wav': 'audio/wav',
+    'flac': 'audio/flac',
+}
+# Sample rates Opus can encode at
+_OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def audio_mime(accept: str) -> str:
+    """Base MIME type of an accept string, e.g. 'audio/ogg;codecs=opus' -> 'audio/ogg'"""
+    return (accept or '').split(';', 1)[0].strip().lower()
+
+
+def audio_extension(accept: str) -> str:
+    """File extension for an accept string"""
+    return _EXTENSIONS.get(audio_mime(accept), 'bin')
+
+
+def mime_for_path(path: str) -> str:
+    """MIME type for a stored audio file, by extension"""
+    return _MIME_BY_EXTENSION.get(path.rsplit('.', 1)[-1].lower(), 'audio/mp3')
+
+
+def accept_with_rate(accept: str, sample_rate: Optional[int]) -> str:
+    """Add a rate parameter to an accept string when the codec supports that rate"""
+    if not sample_rate or 'rate=' in accept:
+        return accept
+    if 'opus' in accept and sample_rate not in _OPUS_RATES:
+        return accept
+    return f"{accept};rate={sample_rate}"
+
+
+# Ogg page CRC: polynomial 0x04C11DB7, no reflection, zero initial value
+_OGG_CRC_TABLE = []
+for _i in range(256):
+    _r = _i << 24
+    for _ in range(8):
+        _r = ((_r << 1) ^ 0x04C11DB7) if _r & 0x80000000 else (_r << 1)
+    _OGG_CRC_TABLE.append(_r & 0xFFFFFFFF)
+
+
+def _ogg_crc(page: bytes) -> int:
+    crc = 0
+    for b in page:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _OGG_CRC_TABLE[((crc >> 24) & 0xFF) ^ b]
+    return crc
+
+
+def _ogg_pages(data: bytes) -> Iterator[Tuple[int, int, int, bytes, bytes]]:
+    """Yield (header_type, granule, serial, lacing, body) for each page of an Ogg stream"""
+    pos = 0
+    while pos + 27 <= len(data) and data[pos:pos + 4] == b'OggS':
+        segments = data[pos + 26]
+        body_start = pos + 27 + segments
+        lacing = data[pos + 27:body_start]
+        body_end = body_start + sum(lacing)
+        yield (data[pos + 5], int.from_bytes(data[pos + 6:pos + 14], 'little', signed=True),
+               int.from_bytes(data[pos + 14:pos + 18], 'little'), lacing, data[body_start:body_end])
+        pos = body_end
+
+
+def _ogg_page(header_type: int, granule: int, serial: int, sequence: int, lacing: bytes, body: bytes) -> bytes:
+    """Build one Ogg page, CRC included"""
+    page = bytearray(b'OggS\x00')
+    page.append(header_type)
+    page += granule.to_bytes(8, 'little', signed=True)
+    page += serial.to_bytes(4, 'little') + sequence.to_bytes(4, 'little') + b'\x00\x00\x00\x00'
+    page.append(len(lacing))
+    page += lacing + body
+    page[22:26] = _ogg_crc(bytes(page)).to_bytes(4, 'little')
+    return bytes(page)
+
+
+def opus_packet_samples(packet: bytes) -> int:
+    """Samples (at 48 kHz) decoded from one Opus packet, from its TOC byte (RFC 6716, 3.1)"""
+    if not packet:
+        return 0
+    config = packet[0] >> 3
+    if config < 12:  # SILK: 10/20/40/60 ms
+        frame = (480, 960, 1920, 2880)[config % 4]
+    elif config < 16:  # Hybrid: 10/20 ms
+        frame = (480, 960)[config % 2]
+    else:  # CELT: 2.5/5/10/20 ms
+        frame = (120, 240, 480, 960)[config % 4]
+    code = packet[0] & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = (packet[1] & 0x3F) if len(packet) > 1 else 0
+    return frame * frames
+
+
+def _riff_chunks(data: bytes) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield (chunk id, body offset, body size) for each chunk of a RIFF/WAVE file"""
+    pos = 12
+    while pos + 8 <= len(data):
+        size = int.from_bytes(data[pos + 4:pos + 8], 'little')
+        yield data[pos:pos + 4], pos + 8, size
+        if size == 0xFFFFFFFF:  # streamed: the data runs to the end
+            break
+        pos += 8 + size + (size & 1)
+
+
+def _wav_parts(data: bytes) -> Tuple[bytes, bytes]:
+    """Split a WAV file into its fmt chunk body and its PCM data"""
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("Not a WAV file")
+    fmt = None
+    for chunk_id, start, size in _riff_chunks(data):
+        if chunk_id == b'fmt ':
+            fmt = data[start:start + size]
+        elif chunk_id == b'data' and fmt is not None:
+            return fmt, data[start:] if size == 0xFFFFFFFF else data[start:start + size]
+    raise ValueError("WAV file without fmt/data chunks")
+
+
+def _wav_header(fmt: bytes, data_size: int) -> bytes:
+    riff_size = 0xFFFFFFFF if data_size == 0xFFFFFFFF else 4 + 8 + len(fmt) + 8 + data_size
+    return (b'RIFF' + riff_size.to_bytes(4, 'little') + b'WAVE'
+            + b'fmt ' + len(fmt).to_bytes(4, 'little') + fmt
+            + b'data' + data_size.to_bytes(4, 'little'))
+
+
+def can_join(accept: str) -> bool:
+    """Whether segments in this format can be joined into one stream by AudioJoiner"""
+    extension = audio_extension(accept)
+    if extension == 'ogg':
+        # Watson's audio/ogg is Opus unless Vorbis is asked for
+        return 'vorbis' not in (accept or '').lower()
+    return extension in ('mp3', 'wav')
+
+
+class AudioJoiner:
+    """Joins consecutive audio segments of one format into a single stream, piece by piece
+
+    Long texts are synthesized as many requests; their audio has to play, seek
+    and report its duration as one file:
+
+    - MP3 segments lose their ID3/Xing headers and their frames are concatenated
+    - Ogg Opus segments become one logical stream: one serial number, the
+      OpusHead/OpusTags headers of the first segment only, consecutive page
+      sequence numbers and cumulative granule positions. The last page is held
+      back until the next segment (or finish()) so only the true end carries the
+      end-of-stream flag and the final segment's end trimming
+    - WAV segments share the first header; their PCM data is concatenated. The
+      header's sizes are unknown while streaming and say so (0xFFFFFFFF);
+      join_audio() writes the exact sizes
+
+    Other formats (FLAC, WebM, Ogg Vorbis) cannot be joined: a second segment
+    raises ValueError.
+
+    Attributes:
+        duration (float): Seconds of audio joined so far, on the joined stream's timeline
+    """
+
+    def __init__(self, accept: str):
+        self.accept = accept
+        self.extension = audio_extension(accept)
+        self.duration = 0.0
+        self.segments = 0
+        # Ogg Opus state
+        self._serial = None
+        self._sequence = 0
+        self._samples = 0  # samples of every audio packet so far, at 48 kHz
+        self._pre_skip = 0
+        self._held = None  # last page: (header_type, granule, lacing, body, trimmed end granule or None)
+        # WAV state
+        self._wav_fmt = None
+        self._wav_bytes = 0
+
+    def add(self, data: bytes) -> bytes:
+        """Add the next segment; returns the bytes to append to the joined stream"""
+        if not data:
+            return b''
+        if self.segments and not can_join(self.accept):
+            raise ValueError(f"{self.accept} audio cannot be joined from several segments; "
+                             "use audio/ogg;codecs=opus, audio/mp3 or audio/wav")
+        self.segments += 1
+        if self.extension == 'mp3':
+            self.duration += mp3_duration(data)
+            return strip_mp3_metadata(data)
+        if self.extension == 'ogg':
+            return self._add_ogg(data)
+        if self.extension == 'wav':
+            return self._add_wav(data)
+        self.duration += audio_duration(data, self.accept)
+        return data
+
+    def finish(self) -> bytes:
+        """Bytes ending the joined stream (the held-back last Ogg page)"""
+        if self._held is None:
+            return b''
+        header_type, granule, lacing, body, end_granule = self._held
+        self._held = None
+        # The true end: flag it and keep the last segment's end trimming
+        return self._page(header_type | 0x04, granule if end_granule is None else end_granule, lacing, body)
+
+    def _page(self, header_type: int, granule: int, lacing: bytes, body: bytes) -> bytes:
+        page = _ogg_page(header_type, granule, self._serial, self._sequence, lacing, body)
+        self._sequence += 1
+        return page
+
+    def _add_ogg(self, data: bytes) -> bytes:
+        out = bytearray()
+        first = self._serial is None
+        offset = self._samples  # where this segment starts on the joined timeline
+        headers = 0  # header packets seen (OpusHead, OpusTags)
+        packet = bytearray()
+        for header_type, granule, serial, lacing, body in _ogg_pages(data):
+            if first and self._serial is None:
+                self._serial = serial
+            if headers == 0 and not body.startswith(b'OpusHead'):
+                raise ValueError("Only Ogg Opus segments can be joined")
+            # Audio data starts on a fresh page after the two header packets
+            header_page = headers < 2
+            audio_packets = 0
+            pos = 0
+            for size in lacing:
+                packet += body[pos:pos + size]
+                pos += size
+                if size < 255:  # packet complete
+                    if headers < 2:
+                        if headers == 0 and first:
+                            self._pre_skip = int.from_bytes(packet[10:12], 'little')
+                        headers += 1
+                    else:
+                        self._samples += opus_packet_samples(bytes(packet))
+                        audio_packets += 1
+                    packet = bytearray()
+            if header_page:
+                # Only the first segment's headers are kept
+                if first:
+                    out += self._page(header_type & 0x03, 0, lacing, body)
+                continue
+            if self._held is not None:
+                held_type, held_granule, held_lacing, held_body, _end = self._held
+                out += self._page(held_type, held_granule, held_lacing, held_body)
+            # Pages where no packet ends carry granule -1
+            page_granule = self._samples if audio_packets else -1
+            end_granule = offset + granule if granule >= 0 else None
+            self._held = (header_type & 0x01, page_granule, lacing, body, end_granule)
+        self.duration = max(0, self._samples - self._pre_skip) / 48000
+        return bytes(out)
+
+    def _add_wav(self, data: bytes) -> bytes:
+        fmt, pcm = _wav_parts(data)
+        if self._wav_fmt is None:
+            self._wav_fmt = fmt
+            header = _wav_header(fmt, 0xFFFFFFFF)
+        elif fmt != self._wav_fmt:
+            raise ValueError("WAV segments with different formats cannot be joined")
+        else:
+            header = b''
+        self._wav_bytes += len(pcm)
+        self.duration = self._wav_bytes / max(1, int.from_bytes(fmt[8:12], 'little'))
+        return header + pcm
+
+
+def ogg_duration(data: bytes) -> float:
+    """Duration in seconds of an Ogg Opus/Vorbis stream, summed over chained links"""
+    seconds = 0.0
+    rate = 48000
+    pre_skip = 0
+    last_granule = 0
+    pos = 0
+    while pos + 27 <= len(data) and data[pos:pos + 4] == b'OggS':
+        header_type = data[pos + 5]
+        granule = int.from_bytes(data[pos + 6:pos + 14], 'little', signed=True)
+        segments = data[pos + 26]
+        body_start = pos + 27 + segments
+        page_len = 27 + segments + sum(data[pos + 27:body_start])
+        if header_type & 0x02:
+            # Beginning of a link: close the previous one and read the codec header
+            seconds += max(0, last_granule - pre_skip) / rate
+            last_granule = 0
+            body = data[body_start:body_start + 19]
+            if body.startswith(b'OpusHead'):
+                rate = 48000
+                pre_skip = int.from_bytes(body[10:12], 'little')
+            elif body[1:7] == b'vorbis':
+                rate = int.from_bytes(body[12:16], 'little') or 48000
+                pre_skip = 0
+        if granule >= 0:
+            last_granule = granule
+        pos += page_len
+    return seconds + max(0, last_granule - pre_skip) / rate
+
+
+def audio_duration(data: bytes, accept: str) -> float:
+    """Duration in seconds of audio in the given format (0.0 if unknown)"""
+    extension = audio_extension(accept)
+    if extension == 'mp3':
+        return mp3_duration(data)
+    if extension == 'ogg':
+        return ogg_duration(data)
+    if extension == 'wav':
+        try:
+            fmt, pcm = _wav_parts(data)
+        except ValueError:
+            return 0.0
+        return len(pcm) / max(1, int.from_bytes(fmt[8:12], 'little'))
+    return 0.0
+
+
+def join_audio(segments: Iterable[bytes], accept: str) -> bytes:
+    """Join segments of the given format into a single stream (see AudioJoiner)"""
+    joiner = AudioJoiner(accept)
+    data = b''.join(joiner.add(segment) for segment in segments) + joiner.finish()
+    if joiner.extension == 'wav' and data:
+        # Every segment is in hand, so the sizes can be exact
+        fmt, pcm = _wav_parts(data)
+        data = _wav_header(fmt, len(pcm)) + pcm
+    return data
+
+
+def transcode_to_mp3(data: bytes, source_accept: str, bitrate: str = '64k') -> bytes:
+    """Transcode audio to MP3 with pydub/ffmpeg"""
+    if audio_extension(source_accept) == 'mp3':
+        return data
+    if AudioSegment is None:
+        raise RuntimeError("pydub is required to convert audio to MP3")
+    segment = AudioSegment.from_file(io.BytesIO(data), format=audio_extension(source_accept))
+    out = io.BytesIO()
+    segment.export(out, format='mp3', bitrate=bitrate)
+    return out.getvalue()
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+
+def map_isolated(fn: Callable, items: Sequence, max_workers: int,
+                 on_progress: Optional[Callable] = None) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Apply fn to every item on a bounded thread pool, isolating failures per item
+
+    Args:
+        fn: Callable taking one item
+        items (list): Inputs
+        max_workers (int): Maximum concurrent calls
+        on_progress: Called as on_progress(done, total, index, error) from the calling
+            thread each time an item finishes (error is None on success)
+
+    Returns:
+        list: (result, error) pairs in input order; result is None when error is set
+    """
+    results: List[Tuple[Any, Optional[Exception]]] = [(None, None)] * len(items)
+    if not items:
+        return results
+    workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as pool:
+        futures = {pool.submit(fn, item): index for index, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            error = future.exception()
+            results[index] = (None, error) if error is not None else (future.result(), None)
+            if on_progress is not None:
+                on_progress(done, len(items), index, error)
+    return results
@@ -0,0 +1,194 @@
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Optional
+from services.audio_utils import _VBR_TAGS, _id3v2_size, parse_frame_header
+
+_MAGIC = b'EVFI'
+_VERSION = 1
+_HEADER = '<BIIIQQ'  # version, sample rate, samples per frame, frame count, source size, source mtime (ns)
+
+
+def _main_data_begin(data: bytes, pos: int) -> int:
+    """Bytes of the bit reservoir (previous frames' data) the frame at pos starts with"""
+    b1 = data[pos + 1]
+    start = pos + 4 + (0 if b1 & 0x01 else 2)  # skip the CRC when present
+    if start + 2 > len(data):
+        return 0
+    if (b1 >> 3) & 0x03 == 3:
+        return ((data[start] << 1) | (data[start + 1] >> 7)) & 0x1FF  # MPEG-1: 9 bits
+    return data[start]  # MPEG-2/2.5: 8 bits
+
+
+def _side_info_size(data: bytes, pos: int) -> int:
+    """Header, CRC and side information bytes that precede a frame's main data"""
+    b1, b3 = data[pos + 1], data[pos + 3]
+    mono = (b3 >> 6) == 3
+    if (b1 >> 3) & 0x03 == 3:
+        side = 17 if mono else 32
+    else:
+        side = 9 if mono else 17
+    return 4 + (0 if b1 & 0x01 else 2) + side
+
+
+class FrameIndex:
+    """Byte offset of every audio frame of an MP3 file
+
+    Built by scanning frame headers only (no decoding) and saved beside the
+    file, it gives exact durations, O(log n) time-to-byte lookups and slicing
+    of a time range into a standalone MP3 by copying whole frames.
+    """
+
+    def __init__(self, sample_rate: int = 0, samples_per_frame: int = 0, offsets: Optional[array] = None,
+                 source_size: int = 0, source_mtime_ns: int = 0):
+        self.sample_rate = sample_rate
+        self.samples_per_frame = samples_per_frame
+        # offsets[i] is where frame i starts; offsets[-1] is the end of the last frame
+        self.offsets = offsets if offsets is not None else array('I')
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+
+    def __len__(self) -> int:
+        return max(0, len(self.offsets) - 1)
+
+    @property
+    def frame_seconds(self) -> float:
+        return self.samples_per_frame / self.sample_rate if self.sample_rate else 0.0
+
+    @property
+    def duration(self) -> float:
+        """Exact duration in seconds (whole frames)"""
+        return len(self) * self.frame_seconds
+
+    @classmethod
+    def build(cls, data: bytes) -> 'FrameIndex':
+        """Scan the frame headers of an MP3 stream"""
+        index = cls()
+        pos = _id3v2_size(data)
+        end = len(data)
+        if end - pos >= 128 and data[end - 128:end - 125] == b'TAG':
+            end -= 128
+
+        first = True
+        last_end = None
+        while pos + 4 <= end:
+            header = parse_frame_header(data, pos)
+            if header is None or pos + header[0] > end:
+                # Resynchronize on the next frame sync
+                pos = data.find(b'\xff', pos + 1, end)
+                if pos < 0:
+                    break
+                continue
+            frame_len, sample_rate, samples = header
+            # The Xing/Info/VBRI header frame carries no audio
+            if not (first and any(tag in data[pos + 4:pos + frame_len] for tag in _VBR_TAGS)):
+                if not index.sample_rate:
+                    index.sample_rate, index.samples_per_frame = sample_rate, samples
+                if (sample_rate, samples) == (index.sample_rate, index.samples_per_frame):
+                    index.offsets.append(pos)
+                    last_end = pos + frame_len
+            first = False
+            pos += frame_len
+        if last_end is not None:
+            index.offsets.append(last_end)
+        return index
+
+    def frame_at(self, seconds: float) -> int:
+        """Index of the frame playing at the given time"""
+        if not len(self):
+            return 0
+        frame = int(max(0.0, seconds) / self.frame_seconds) if self.frame_seconds else 0
+        return min(frame, len(self) - 1)
+
+    def byte_at(self, seconds: float) -> int:
+        """Byte offset of the frame playing at the given time"""
+        return self.offsets[self.frame_at(seconds)] if len(self) else 0
+
+    def time_at_byte(self, offset: int) -> float:
+        """Start time of the frame containing a byte offset"""
+        frame = max(0, min(bisect_right(self.offsets, offset) - 1, len(self) - 1))
+        return frame * self.frame_seconds
+
+    def slice(self, data: bytes, start: float, end: Optional[float] = None) -> bytes:
+        """
+        Copy the frames covering [start, end) seconds into a standalone MP3
+
+        Frames whose bit reservoir the first frame depends on are included too,
+        so the slice decodes cleanly from its first frame.
+
+        Args:
+            data (bytes): The MP3 file this index was built from
+            start (float): Start time in seconds
+            end (float): End time in seconds (default: end of file)
+
+        Returns:
+            bytes: MP3 data
+        """
+        if not len(self):
+            return b''
+        first = self.frame_at(start)
+        last = len(self) if end is None else min(len(self), self.frame_at(end) + 1)
+        if last <= first:
+            return b''
+
+        # Walk back until the preceding frames hold the reservoir bytes the first frame needs
+        needed = _main_data_begin(data, self.offsets[first])
+        while needed > 0 and first > 0:
+            first -= 1
+            frame_start = self.offsets[first]
+            needed -= (self.offsets[first + 1] - frame_start) - _side_info_size(data, frame_start)
+        return bytes(data[self.offsets[first]:self.offsets[last]])
+
+    def to_bytes(self) -> bytes:
+        offsets = array('I', self.offsets)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        header = _MAGIC + struct.pack(_HEADER, _VERSION, self.sample_rate, self.samples_per_frame,
+                                      len(offsets), self.source_size, self.source_mtime_ns)
+        return header + offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'FrameIndex':
+        if data[:4] != _MAGIC:
+            raise ValueError("Not a frame index")
+        version, sample_rate, samples, count, size, mtime_ns = struct.unpack_from(_HEADER, data, 4)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported frame index version {version}")
+        start = 4 + struct.calcsize(_HEADER)
+        offsets = array('I')
+        offsets.frombytes(data[start:start + 4 * count])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        return cls(sample_rate, samples, offsets, size, mtime_ns)
+
+    @staticmethod
+    def path_for(mp3_path: str) -> str:
+        """Where the index of an MP3 file is stored"""
+        return f"{mp3_path}.frames"
+
+    @classmethod
+    def for_file(cls, mp3_path: str) -> 'FrameIndex':
+        """Load the index stored beside an MP3 file, (re)building it when missing or stale"""
+        stat = os.stat(mp3_path)
+        index_path = cls.path_for(mp3_path)
+        try:
+            with open(index_path, 'rb') as f:
+                index = cls.from_bytes(f.read())
+            if (index.source_size, index.source_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                return index
+        except (OSError, ValueError, struct.error):
+            pass
+
+        with open(mp3_path, 'rb') as f:
+            index = cls.build(f.read())
+        index.source_size, index.source_mtime_ns = stat.st_size, stat.st_mtime_ns
+        try:
+            tmp_path = f"{index_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(index.to_bytes())
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass
+        return index
@@ -0,0 +1,73 @@
+import math
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Optional
+
+
+class LatencyTracker:
+    """Rolling window of recent request latencies (seconds)"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None when empty"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(1, math.ceil(pct / 100.0 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+
+def size_class(size: int) -> int:
+    """Power-of-two size bucket (<= 256, <= 512, <= 1024, ...) for comparing latencies of similar requests"""
+    return max(0, (max(1, size) - 1).bit_length() - 8)
+
+
+def hedged_call(executor, fn, args, delay: float, on_hedge=None, on_hedge_win=None):
+    """
+    Run fn(*args) on executor, issuing one duplicate if it is still running after delay
+
+    Args:
+        executor: Executor the primary and duplicate requests run on
+        fn: Callable to run
+        args (tuple): Positional arguments for fn
+        delay (float): Seconds to wait for the primary before hedging
+        on_hedge: Called when the duplicate is issued
+        on_hedge_win: Called when the duplicate finishes first
+
+    Returns:
+        The first successful result; raises if both attempts fail
+    """
+    primary = executor.submit(fn, *args)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    if on_hedge:
+        on_hedge()
+    backup = executor.submit(fn, *args)
+    pending = [primary, backup]
+    error = None
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            if future.exception() is None:
+                # The loser keeps running in the background; its result is ignored
+                if future is backup and on_hedge_win:
+                    on_hedge_win()
+                return future.result()
+            error = future.exception()
+    raise error
@@ -1,6 +1,15 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+from urllib.parse import urljoin
 from config import Config
+from services.batch import map_isolated
+from services.http_transport import get_transport
+from services.rewrite_cache import RewriteCache
+from services.text_chunking import chunk_paragraphs
+from services.token_budget import TokenEstimator
 import streamlit as st
-from typing import Optional
+from typing import List, Optional
 
 try:
     # Optional: used when calling a Space endpoint
@@ -9,19 +18,55 @@ except Exception:  # pragma: no cover
     Client = None
 
 
+_TONE_MAP = {
+    'Neutral': 'neutral',
+    'Suspenseful': 'suspenseful',
+    'Inspiring': 'inspiring',
+}
+
+# Older Space builds return failures (e.g. "The model is still loading") as ordinary text
+_SPACE_ERROR_PREFIX = "Error processing text:"
+# Seconds between checks while a chunk waits for a slot shared with other documents
+_SLOT_WAIT = 0.2
+
+
 class HuggingFaceLLMService:
     """Hugging Face integration for tone-based text rewriting.
 
     Uses a Hugging Face Space endpoint via gradio_client (no direct HTTP model calls).
     """
 
-    def __init__(self, model_id: Optional[str] = None, space_id: Optional[str] = None, space_api_name: Optional[str] = None):
+    def __init__(self, model_id: Optional[str] = None, space_id: Optional[str] = None, space_api_name: Optional[str] = None,
+                 cache: Optional[RewriteCache] = None):
         # Space config (from user's message)
-        # Example Space: "sabarnakb/GraniteEchoverse" with api_name "/process_text"
+        # Example Space: "sabarnakb/GraniteEchoverse" with api_name "/process_text_stream" (or "/process_text")
         self.space_id = space_id or Config.HF_SPACE_ID
         self.space_api_name = space_api_name or Config.HF_SPACE_API_NAME
 
         self.token = Config.HUGGINGFACE_TOKEN
+        self.cache = cache
+        self.token_estimator = TokenEstimator()
+        self._initialize_cache()
+        if self.is_service_available():
+            self._keep_warm()
+
+    def _initialize_cache(self):
+        """Attach the persistent rewrite cache unless disabled or unusable"""
+        if self.cache is not None or not Config.REWRITE_CACHE_ENABLED:
+            return
+        try:
+            self.cache = RewriteCache()
+        except Exception as e:
+            st.warning(f"Rewrite cache disabled: {str(e)}")
+            self.cache = None
+
+    def get_cache_stats(self) -> dict:
+        """Get rewrite cache hit/miss counters (empty if caching is disabled)"""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def get_token_stats(self) -> dict:
+        """Get the token estimator's calibration (the Space does not report actual counts)"""
+        return self.token_estimator.stats()
 
     def is_service_available(self) -> bool:
         return bool(self.token and self.space_id and Client is not None)
@@ -51,101 +96,505 @@ class HuggingFaceLLMService:
             raise Exception("Hugging Face token not configured")
 
         try:
-            if Client is not None and self.space_id:
-                tone_map = {
-                    'Neutral': 'neutral',
-                    'Suspenseful': 'suspenseful',
-                    'Inspiring': 'inspiring',
-                }
-                mapped_tone = tone_map.get(tone, 'neutral')
-                client = Client(self.space_id, hf_token=self.token)
-                # Simple cold-start retry
-                for attempt in range(2):
-                    try:
-                        result = client.predict(
-                            input_text=text,
-                            selected_tone=mapped_tone,
-                            api_name=self.space_api_name,
-                        )
-                        # Normalize result to string
-                        if isinstance(result, str):
-                            if result.strip():
-                                return result.strip()
-                        elif isinstance(result, (list, tuple)) and result:
-                            # Some Spaces return a list of outputs; find first string-like
-                            for item in result:
-                                if isinstance(item, str) and item.strip():
-                                    return item.strip()
-                        elif isinstance(result, dict):
-                            # Try common keys
-                            for key in ("text", "generated_text", "data", "output"):
-                                val = result.get(key)
-                                if isinstance(val, str) and val.strip():
-                                    return val.strip()
-                        # If format not recognized, break to fallback
-                        break
-                    except Exception:
-                        if attempt == 0:
-                            # retry once (Space may be waking up)
-                            continue
-                        # Attempt to dynamically resolve endpoint and call again
-                        try:
-                            info = client.view_api()
-                            # Try named endpoint mapping first
-                            api_name = None
-                            fn_index = None
-                            if isinstance(info, dict):
-                                # gradio_client >=0.10 style
-                                named = (info.get('named_endpoints') or {})
-                                if named:
-                                    # pick any with two params matching names
-                                    for name, meta in named.items():
-                                        params = [p.get('name','').lower() for p in (meta.get('parameters') or [])]
-                                        if 'input_text' in params and 'selected_tone' in params:
-                                            api_name = name
-                                            break
-                                    if not api_name:
-                                        # fallback to provided api_name if exists in named
-                                        if self.space_api_name in named:
-                                            api_name = self.space_api_name
-                                # If no named endpoints, try function indices
-                                if not api_name:
-                                    apis = info.get('endpoints') or []
-                                    for ep in apis:
-                                        params = [p.get('name','').lower() for p in (ep.get('parameters') or [])]
-                                        if 'input_text' in params and 'selected_tone' in params:
-                                            fn_index = ep.get('fn_index')
-                                            break
-                            # Try calling with resolved api
-                            if api_name:
-                                result = client.predict(
-                                    input_text=text,
-                                    selected_tone=mapped_tone,
-                                    api_name=api_name,
-                                )
-                            elif fn_index is not None:
-                                result = client.predict(
-                                    input_text=text,
-                                    selected_tone=mapped_tone,
-                                    fn_index=fn_index,
-                                )
-                            else:
-                                raise RuntimeError("Could not resolve Space endpoint parameters")
-                            # Normalize as before
-                            if isinstance(result, str) and result.strip():
-                                return result.strip()
-                            if isinstance(result, (list, tuple)):
-                                for item in result:
-                                    if isinstance(item, str) and item.strip():
-                                        return item.strip()
-                            if isinstance(result, dict):
-                                for key in ("text", "generated_text", "data", "output"):
-                                    val = result.get(key)
-                                    if isinstance(val, str) and val.strip():
-                                        return val.strip()
-                        except Exception:
-                            # give up, report error below
-                            pass
+            return self._rewrite(text, tone)
         except Exception as e:
             st.error(f"Hugging Face Space call failed: {e}")
             return text
+
+    def rewrite_many(self, texts: List[str], tone: str = 'Neutral', max_workers: Optional[int] = None,
+                     on_progress=None) -> List[str]:
+        """
+        Rewrite several documents concurrently
+
+        Args:
+            texts (list): Documents to rewrite
+            tone (str): Tone to apply to every document
+            max_workers (int): Maximum documents in flight (default: Config.LLM_BATCH_WORKERS)
+            on_progress: Called as on_progress(done, total, index, error) after each document
+
+        Returns:
+            list: Rewritten documents in input order; a document whose rewrite failed is returned unchanged
+
+        The documents' chunk jobs share LLM_MAX_WORKERS slots, so no more jobs are queued on the Space
+        at a time however many documents are rewritten at once.
+        """
+        if not self.is_service_available():
+            raise Exception("Hugging Face token not configured")
+
+        slots = threading.BoundedSemaphore(max(1, Config.LLM_MAX_WORKERS))
+        results = map_isolated(
+            lambda text: self._rewrite(text, tone, slots),
+            texts,
+            max_workers or Config.LLM_BATCH_WORKERS,
+            on_progress,
+        )
+        return [text if error is not None else output for text, (output, error) in zip(texts, results)]
+
+    def _rewrite(self, text: str, tone: str, slots: Optional[threading.Semaphore] = None) -> str:
+        """Rewrite one document, served from the cache when possible; raises on failure"""
+        return self.submit_rewrite(text, tone, slots).result()
+
+    def submit_rewrite(self, text: str, tone: str = 'Neutral', slots: Optional[threading.Semaphore] = None) -> 'RewriteJob':
+        """
+        Start rewriting text on the Space without waiting for it
+
+        Args:
+            text (str): Original text to rewrite
+            tone (str): Tone to apply ('Neutral', 'Suspenseful', 'Inspiring')
+            slots (Semaphore): Limit on chunk jobs in flight shared with other rewrites, if any
+
+        Returns:
+            RewriteJob: Handle exposing queue position, status, partial output, the result and cancellation
+        """
+        if not self.is_service_available():
+            raise Exception("Hugging Face token not configured")
+
+        # Texts over the Space's input budget are split by paragraph and rewritten as concurrent jobs
+        chunks = chunk_paragraphs(text, self.token_estimator.chars_for(Config.HF_MAX_INPUT_TOKENS)) or [(text, '')]
+        key = None
+        if self.cache is not None:
+            params = {'tone': _TONE_MAP.get(tone, 'neutral')}
+            if len(chunks) > 1:
+                params['max_input_tokens'] = Config.HF_MAX_INPUT_TOKENS
+            # Decoding happens inside the Space, so the Space and endpoint stand in for model and parameters
+            key = self.cache.make_key(
+                'hf-space',
+                f"{self.space_id}{self.space_api_name}",
+                # The prompts live on the Space, so its declared revision stands in for a template fingerprint
+                Config.HF_SPACE_REVISION,
+                params,
+                text,
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                return RewriteJob.completed(cached)
+
+        self._keep_warm()
+        on_result = (lambda output: self.cache.put(key, output)) if key is not None else None
+        return RewriteJob(self._space(), chunks, _TONE_MAP.get(tone, 'neutral'), Config.LLM_MAX_WORKERS, on_result,
+                          slots)
+
+    def _space(self) -> '_SpaceClient':
+        return get_space_client(self.space_id, self.token, self.space_api_name)
+
+    def _keep_warm(self):
+        """(Re)start the keep-warm pinger when enabled; it stops by itself once the Space sits idle"""
+        if Config.HF_KEEP_WARM_INTERVAL > 0:
+            self._space().keep_warm(Config.HF_KEEP_WARM_INTERVAL, Config.HF_KEEP_WARM_IDLE)
+
+
+class RewriteJob:
+    """A rewrite running on the Space as gradio jobs, one per chunk of the document
+
+    At most max_in_flight chunk jobs are queued on the Space at a time; the
+    next chunks are submitted as earlier ones finish, whenever the job is
+    polled or waited on. A failed chunk is resubmitted once after re-reading
+    the Space's API schema, which covers both a cold start and a changed
+    endpoint. Jobs given the same slots semaphore (rewrite_many) also share
+    one limit on chunks in flight; each unfinished chunk holds a slot, and a
+    job that fails cancels its remaining chunks to hand theirs back.
+    """
+
+    def __init__(self, space: Optional['_SpaceClient'], chunks: list, tone: str, max_in_flight: int = 1,
+                 on_result=None, slots: Optional[threading.Semaphore] = None):
+        self._space = space
+        self._chunks = chunks  # [(chunk, separator)]
+        self._tone = tone
+        self._max_in_flight = max(1, max_in_flight)
+        self._on_result = on_result
+        self._slots = slots
+        self._jobs = [None] * len(chunks)
+        self._retried = [False] * len(chunks)
+        self._holding = [False] * len(chunks)
+        self._result = None
+        self._cancelled = False
+        self._failed = False
+        self._lock = threading.RLock()
+        self._fill()
+
+    @classmethod
+    def completed(cls, output: str) -> 'RewriteJob':
+        """A job that is already finished, e.g. served from the cache"""
+        job = cls(None, [], '')
+        job._result = output
+        return job
+
+    def _fill(self):
+        """Resubmit failed chunks once and submit pending ones while fewer than max_in_flight are unfinished"""
+        with self._lock:
+            self._release_finished()
+            if self._cancelled or self._failed or self._result is not None:
+                return
+            for i, job in enumerate(self._jobs):
+                if job is not None and job.done() and not self._retried[i] and _job_output(job) is None:
+                    if not self._take_slot(i):
+                        break
+                    self._retried[i] = True
+                    try:
+                        self._space.refresh_endpoint()
+                    except Exception:
+                        pass
+                    self._submit(i)
+            in_flight = sum(1 for job in self._jobs if job is not None and not job.done())
+            for i, job in enumerate(self._jobs):
+                if in_flight >= self._max_in_flight:
+                    break
+                if job is None:
+                    if not self._take_slot(i):
+                        break
+                    self._submit(i)
+                    in_flight += 1
+
+    def _take_slot(self, i: int) -> bool:
+        """Reserve a shared slot for chunk i; False when every slot is taken"""
+        if self._slots is not None:
+            if not self._slots.acquire(blocking=False):
+                return False
+            self._holding[i] = True
+        return True
+
+    def _release_finished(self):
+        """Hand back the shared slots of finished chunks"""
+        for i, job in enumerate(self._jobs):
+            if self._holding[i] and (job is None or job.done()):
+                self._holding[i] = False
+                self._slots.release()
+
+    def _submit(self, i: int):
+        """Queue chunk i on the Space; a chunk that cannot even be submitted fails for good"""
+        try:
+            self._jobs[i] = self._space.submit(self._chunks[i][0], self._tone)
+        except Exception as e:
+            # e.g. the Space became unreachable mid-job: result() raises this instead of polling crashing
+            self._jobs[i] = _FailedJob(e)
+            self._retried[i] = True
+
+    def done(self) -> bool:
+        """True once every chunk has finished (or failed for good), or the job was cancelled"""
+        self._fill()
+        with self._lock:
+            if self._result is not None or self._cancelled or self._failed:
+                return True
+            return all(
+                job is not None and job.done() and (self._retried[i] or _job_output(job) is not None)
+                for i, job in enumerate(self._jobs)
+            )
+
+    def result(self) -> str:
+        """Wait for every chunk and return the stitched rewrite; raises if a chunk fails or the job is cancelled"""
+        if self._result is not None:
+            return self._result
+        try:
+            output = self._wait()
+        except CancelledError:
+            raise
+        except Exception:
+            self._abandon()
+            raise
+        with self._lock:
+            self._result = output
+            self._release_finished()
+        if self._on_result:
+            self._on_result(output)
+        return output
+
+    def _wait(self) -> str:
+        """Wait for the chunks in order and stitch their outputs"""
+        parts = []
+        for i, (_chunk, separator) in enumerate(self._chunks):
+            while True:
+                self._fill()
+                with self._lock:
+                    if self._cancelled:
+                        raise CancelledError()
+                    job, retried = self._jobs[i], self._retried[i]
+                if job is None or (job.done() and not retried and _job_output(job) is None):
+                    # Waiting for a shared slot to (re)submit this chunk
+                    time.sleep(_SLOT_WAIT)
+                    continue
+                try:
+                    raw = job.result()
+                    if _is_space_error(raw):
+                        raise RuntimeError(raw.strip())
+                    output = _normalize_result(raw)
+                except CancelledError:
+                    raise
+                except Exception:
+                    if retried:
+                        raise
+                    continue  # _fill resubmits it
+                if output:
+                    break
+                if retried:
+                    raise RuntimeError("Unrecognized response from the Space")
+            parts.append(f"{separator}{output}")
+        return "".join(parts)
+
+    def status(self) -> dict:
+        """
+        Progress of the job
+
+        Returns:
+            dict: state ('queued', 'running', 'finished', 'failed' or 'cancelled'), queue_position
+                (best queue rank among this job's chunks, or None), queue_size, eta (seconds, or None),
+                chunks and chunks_done
+        """
+        self._fill()
+        with self._lock:
+            jobs, retried = list(self._jobs), list(self._retried)
+            cancelled, finished = self._cancelled, self._result is not None
+        chunks_done = 0
+        failed = False
+        ranks, sizes, etas, codes = [], [], [], set()
+        for job, was_retried in zip(jobs, retried):
+            if job is None:
+                continue
+            if job.done():
+                if _job_output(job) is not None:
+                    chunks_done += 1
+                elif was_retried:
+                    failed = True
+                continue
+            update = job.status()
+            codes.add(getattr(update.code, 'value', str(update.code)))
+            if update.rank is not None:
+                ranks.append(update.rank)
+            if update.queue_size is not None:
+                sizes.append(update.queue_size)
+            if update.eta is not None:
+                etas.append(update.eta)
+
+        if cancelled:
+            state = 'cancelled'
+        elif finished or (jobs and chunks_done == len(jobs)):
+            state = 'finished'
+        elif failed:
+            state = 'failed'
+        elif codes & {'SENDING_DATA', 'PROCESSING', 'ITERATING', 'PROGRESS'}:
+            state = 'running'
+        else:
+            state = 'queued'
+        return {
+            'state': state,
+            'queue_position': min(ranks) if ranks else None,
+            'queue_size': max(sizes) if sizes else None,
+            'eta': max(etas) if etas else None,
+            'chunks': len(self._chunks) or 1,
+            'chunks_done': (len(self._chunks) or 1) if finished else chunks_done,
+        }
+
+    def partial(self) -> str:
+        """Rewritten text available so far: finished chunks in order, then the partial output of the next one
+
+        Partial output of a running chunk comes from streaming endpoints, which yield the rewrite as it is generated
+        """
+        if self._result is not None:
+            return self._result
+        with self._lock:
+            jobs = list(self._jobs)
+        parts = []
+        for (_chunk, separator), job in zip(self._chunks, jobs):
+            if job is None:
+                break
+            outputs = job.outputs()
+            output = _normalize_result(outputs[-1]) if outputs else None
+            if output:
+                parts.append(f"{separator}{output}")
+            if not output or not job.done():
+                break
+        return "".join(parts).strip()
+
+    def _abandon(self):
+        """After a chunk failed for good: stop the other chunks, handing their shared slots to other documents"""
+        with self._lock:
+            self._failed = True
+            jobs = list(self._jobs)
+        for job in jobs:
+            if job is not None and not job.done():
+                job.cancel()
+        with self._lock:
+            self._release_finished()
+
+    def cancel(self) -> bool:
+        """Cancel every unfinished chunk; queued chunks are removed from the Space queue"""
+        with self._lock:
+            if self._result is not None:
+                return False
+            self._cancelled = True
+            jobs = list(self._jobs)
+        for job in jobs:
+            if job is not None and not job.done():
+                job.cancel()
+        with self._lock:
+            self._release_finished()
+        return True
+
+
+class _FailedJob:
+    """Stands in for a gradio Job that could not be submitted"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+    def done(self) -> bool:
+        return True
+
+    def result(self, timeout=None):
+        raise self.error
+
+    def outputs(self) -> list:
+        return []
+
+    def cancel(self) -> bool:
+        return False
+
+
+def _job_output(job) -> Optional[str]:
+    """Text of a finished gradio job, or None if it failed, was cancelled or returned nothing usable"""
+    try:
+        return _normalize_result(job.result(timeout=0))
+    except Exception:
+        return None
+
+
+class _SpaceClient:
+    """gradio Client of one Space and its resolved rewrite endpoint, shared by all service instances
+
+    The client (and the Space config it fetched on creation) is reused for
+    every call. The endpoint is only re-resolved from the Space's API schema
+    after a failed job, and kept unless the schema points elsewhere. An
+    optional daemon thread pings the Space while it is in use so it does not
+    go to sleep between rewrites.
+    """
+
+    def __init__(self, space_id: str, token: str, api_name: str):
+        self.space_id = space_id
+        self.token = token
+        self.api_name = api_name
+        self.fn_index = None
+        self.last_used = time.time()
+        self._client = None
+        self._lock = threading.Lock()
+        self._pinger = None
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = Client(self.space_id, hf_token=self.token, verbose=False)
+            return self._client
+
+    def submit(self, text: str, tone: str):
+        """Queue a rewrite on the Space; returns the gradio Job"""
+        client = self.client()
+        with self._lock:
+            endpoint = {'api_name': self.api_name} if self.api_name else {'fn_index': self.fn_index}
+        self.last_used = time.time()
+        try:
+            return client.submit(input_text=text, selected_tone=tone, **endpoint)
+        except ValueError:
+            # The Space has no such endpoint (e.g. an older build without streaming): use the one it has
+            if not self.refresh_endpoint():
+                raise
+            return self.submit(text, tone)
+
+    def refresh_endpoint(self) -> bool:
+        """Re-read the Space's API schema; returns True when the rewrite endpoint changed"""
+        try:
+            info = self.client().view_api(print_info=False, return_format='dict')
+        except Exception:
+            # The cached config no longer matches the Space (e.g. it was rebuilt): reconnect
+            with self._lock:
+                self._client = None
+            info = self.client().view_api(print_info=False, return_format='dict')
+        api_name, fn_index = _find_endpoint(info, self.api_name)
+        if not api_name and fn_index is None:
+            raise RuntimeError("Could not resolve Space endpoint parameters")
+        with self._lock:
+            changed = (api_name, fn_index) != (self.api_name, self.fn_index)
+            self.api_name, self.fn_index = api_name, fn_index
+        return changed
+
+    def keep_warm(self, interval: float, idle: float):
+        """Ping the Space every interval seconds until it has gone unused for idle seconds"""
+        with self._lock:
+            if self._pinger is not None and self._pinger.is_alive():
+                return
+            self._pinger = threading.Thread(target=self._ping_loop, args=(interval, idle),
+                                            name='hf-space-keep-warm', daemon=True)
+            self._pinger.start()
+
+    def _ping_loop(self, interval: float, idle: float):
+        while time.time() - self.last_used < idle:
+            time.sleep(interval)
+            try:
+                # Any request to the Space resets its sleep timer; the config endpoint is cheap
+                headers = {'Authorization': f"Bearer {self.token}"} if self.token else {}
+                get_transport().get(urljoin(self.client().src, 'config'), headers=headers).close()
+            except Exception:
+                pass
+
+
+_spaces = {}
+_spaces_lock = threading.Lock()
+
+
+def get_space_client(space_id: str, token: str, api_name: str) -> _SpaceClient:
+    """Return the process-wide client of a Space"""
+    key = (space_id, token, api_name)
+    with _spaces_lock:
+        space = _spaces.get(key)
+        if space is None:
+            space = _SpaceClient(space_id, token, api_name)
+            _spaces[key] = space
+        return space
+
+
+def _find_endpoint(info, preferred: Optional[str]):
+    """Find the endpoint taking input_text and selected_tone in a view_api() dict; returns (api_name, fn_index)"""
+    if not isinstance(info, dict):
+        return None, None
+
+    def _takes_rewrite_inputs(meta) -> bool:
+        params = [
+            (p.get('parameter_name') or p.get('name') or p.get('label') or '').lower()
+            for p in (meta.get('parameters') or [])
+        ]
+        return 'input_text' in params and 'selected_tone' in params
+
+    named = info.get('named_endpoints') or {}
+    if preferred in named and _takes_rewrite_inputs(named[preferred]):
+        return preferred, None
+    for name, meta in named.items():
+        if _takes_rewrite_inputs(meta):
+            return name, None
+    if preferred in named:
+        return preferred, None
+    for fn_index, meta in (info.get('unnamed_endpoints') or {}).items():
+        if _takes_rewrite_inputs(meta):
+            return None, int(fn_index)
+    return None, None
+
+
+def _is_space_error(result) -> bool:
+    """True for the error message older Space builds return in place of a rewrite"""
+    return isinstance(result, str) and result.lstrip().startswith(_SPACE_ERROR_PREFIX)
+
+
+def _normalize_result(result) -> Optional[str]:
+    """Extract the generated text from a Space result, or None if the format is not recognized or is an error"""
+    if _is_space_error(result):
+        return None
+    if isinstance(result, str):
+        return result.strip() or None
+    if isinstance(result, (list, tuple)):
+        # Some Spaces return a list of outputs; find first string-like
+        for item in result:
+            if isinstance(item, str) and item.strip():
+                return item.strip()
+    if isinstance(result, dict):
+        # Try common keys
+        for key in ("text", "generated_text", "data", "output"):
+            val = result.get(key)
+            if isinstance(val, str) and val.strip():
+                return val.strip()
+    return None
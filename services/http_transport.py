@@ -0,0 +1,180 @@
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+from services.hedging import LatencyTracker
+
+# Responses worth retrying: throttling and transient gateway/server failures
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Of those, the ones where the server turned the request away without doing the work
+_REFUSED_STATUSES = (429, 503)
+
+
+class _RetryPolicy(Retry):
+    """Retry that repeats non-idempotent calls only when they were refused
+
+    A 500/502/504 after a generation POST may come from a server that already
+    ran (and billed) the generation, so only idempotent methods retry those.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if not self._is_method_retryable(method):
+            return bool(self.total) and status_code in _REFUSED_STATUSES
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _retry_policy(retries: int, backoff: float) -> Retry:
+    """Exponential backoff with jitter on connection failures and retryable statuses
+
+    Read timeouts are not retried: the server may still be generating, and a
+    second request would pay for the same work twice. For the same reason POST
+    requests are retried on throttling (429/503) only.
+    """
+    options = dict(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        status_forcelist=_RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,  # POST: see _RetryPolicy
+        backoff_factor=backoff,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        return _RetryPolicy(backoff_jitter=backoff, **options)
+    except TypeError:  # pragma: no cover - urllib3 < 2 has no jitter
+        return _RetryPolicy(**options)
+
+
+class HostStats:
+    """Request counters and latency window of one host"""
+
+    def __init__(self, window: int = 200):
+        self.latency = LatencyTracker(window)
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, retries: int, failed: bool):
+        self.latency.record(seconds)
+        with self._lock:
+            self.requests += 1
+            self.retries += retries
+            self.errors += int(failed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            requests_, retries, errors = self.requests, self.retries, self.errors
+        return {
+            'requests': requests_,
+            'retries': retries,
+            'errors': errors,
+            'p50': self.latency.percentile(50),
+            'p99': self.latency.percentile(99),
+        }
+
+
+class _PooledAdapter(HTTPAdapter):
+    """Keep-alive connection pool that applies the default timeout and records latency"""
+
+    def __init__(self, stats: HostStats, timeout, **kwargs):
+        self.stats = stats
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+        except Exception:
+            self.stats.record(time.perf_counter() - start, 0, True)
+            raise
+        # Time to response headers, including any retries urllib3 made
+        history = getattr(getattr(response.raw, 'retries', None), 'history', None) or ()
+        self.stats.record(time.perf_counter() - start, len(history), response.status_code >= 500)
+        return response
+
+
+class HttpTransport:
+    """Pooled HTTP sessions shared by the remote services
+
+    One requests.Session per host keeps TLS connections alive across calls,
+    with a pool sized for the concurrent requests the app makes. Every request
+    gets the configured default timeout, jittered exponential retries on
+    connection failures and retryable statuses, and per-host latency metrics.
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, timeout: Optional[float] = None,
+                 retries: Optional[int] = None, backoff: Optional[float] = None):
+        self.pool_size = pool_size or Config.HTTP_POOL_SIZE
+        self.timeout = Config.REQUEST_TIMEOUT if timeout is None else timeout
+        self.retries = Config.REQUEST_RETRIES if retries is None else retries
+        self.backoff = Config.RETRY_BACKOFF if backoff is None else backoff
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session(self, url: str) -> requests.Session:
+        """The pooled session for the host of url"""
+        host = self.host_of(url)
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                stats = self._stats.setdefault(host, HostStats())
+                adapter = _PooledAdapter(
+                    stats,
+                    self.timeout,
+                    pool_connections=1,
+                    pool_maxsize=self.pool_size,
+                    max_retries=_retry_policy(self.retries, self.backoff),
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = session
+            return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.session(url).request(method, url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def stats(self) -> dict:
+        """Per-host request counts, retries, errors and latency percentiles"""
+        with self._lock:
+            hosts = dict(self._stats)
+        return {host: stats.snapshot() for host, stats in hosts.items()}
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Return the process-wide transport"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = HttpTransport()
+        return _transport
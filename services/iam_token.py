@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from config import Config
+from services.http_transport import get_transport
+
+try:
+    # POSIX advisory file locks; other platforms share the cache without a lock
+    import fcntl
+except Exception:  # pragma: no cover
+    fcntl = None
+
+# Tokens are refreshed in the background once this share of their lifetime has passed
+_REFRESH_FRACTION = 0.8
+# A token this close to expiry is never handed out
+_EXPIRY_SKEW = 60
+_MAX_RETRY_DELAY = 60.0
+
+
+class IAMTokenError(Exception):
+    """Raised when IBM Cloud IAM does not issue a token"""
+
+
+class IAMTokenManager:
+    """IBM Cloud IAM access token for one API key, shared by threads and local processes
+
+    The token and its expiry live in memory and in a small JSON file guarded
+    by a file lock, so a new process (or replica on the same host) reuses the
+    token another one fetched instead of paying an IAM round-trip. A daemon
+    thread refreshes the token before it expires; only one process performs a
+    given refresh, the others pick the result up from the file.
+    """
+
+    def __init__(self, api_key: str, token_url: Optional[str] = None, cache_dir: Optional[str] = None):
+        self.api_key = api_key
+        self.token_url = token_url or Config.IAM_TOKEN_URL
+        self.cache_dir = cache_dir or Config.IAM_TOKEN_CACHE_DIR
+        name = hashlib.sha256(f"{self.token_url}\x00{api_key}".encode('utf-8')).hexdigest()[:32]
+        self._path = os.path.join(self.cache_dir, f"{name}.json")
+        self._lock_path = os.path.join(self.cache_dir, f"{name}.lock")
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.refreshes = 0  # tokens fetched from IAM by this process
+
+    def get_token(self) -> str:
+        """Return a valid access token, fetching one only when no cached token is usable"""
+        with self._lock:
+            if not self._is_valid():
+                self._load_or_refresh()
+            token = self._token
+        self._ensure_refresher()
+        return token
+
+    def invalidate(self, token: Optional[str] = None):
+        """Drop a token the server rejected (e.g. on HTTP 401) so the next call fetches a new one"""
+        with self._lock:
+            if token is not None and token != self._token:
+                return  # already replaced
+            self._token, self._expires_at, self._refresh_at = None, 0.0, 0.0
+            with self._file_lock():
+                cached = self._read_cache()
+                if cached and (token is None or cached.get('access_token') == token):
+                    try:
+                        os.remove(self._path)
+                    except OSError:
+                        pass
+
+    def stop(self):
+        """Stop the background refresher"""
+        self._stop.set()
+        self._wake.set()
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at - _EXPIRY_SKEW
+
+    def _load_or_refresh(self, force: bool = False):
+        """Adopt the shared cached token, or fetch a new one while holding the file lock"""
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        with self._file_lock():
+            cached = self._read_cache()
+            if cached and time.time() < cached['expiration'] - _EXPIRY_SKEW:
+                # Another process may already have refreshed it
+                if not force or time.time() < cached['refresh_at']:
+                    self._adopt(cached)
+                    return
+            token_data = self._request_token()
+            self._adopt(token_data)
+            self._write_cache(token_data)
+
+    def _request_token(self) -> dict:
+        response = get_transport().post(
+            self.token_url,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data={
+                "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
+                "apikey": self.api_key,
+            },
+            timeout=Config.REQUEST_TIMEOUT,
+        )
+        if response.status_code != 200:
+            try:
+                details = response.json()
+            except Exception:
+                details = response.text
+            raise IAMTokenError(f"HTTP {response.status_code} - {details}")
+
+        data = response.json()
+        now = time.time()
+        expires_in = float(data.get('expires_in') or 3600)
+        expiration = float(data.get('expiration') or now + expires_in)
+        self.refreshes += 1
+        return {
+            'access_token': data['access_token'],
+            'expiration': expiration,
+            'refresh_at': now + _REFRESH_FRACTION * (expiration - now),
+        }
+
+    def _adopt(self, token_data: dict):
+        with self._lock:
+            self._token = token_data['access_token']
+            self._expires_at = token_data['expiration']
+            self._refresh_at = token_data['refresh_at']
+        self._wake.set()
+
+    def _read_cache(self) -> Optional[dict]:
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('access_token') and data.get('expiration') and data.get('refresh_at'):
+                return data
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _write_cache(self, token_data: dict):
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(token_data, f)
+            os.replace(tmp_path, self._path)
+        except OSError:
+            pass
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process using this cache file"""
+        fd = None
+        if fcntl is not None:
+            try:
+                fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            except OSError:
+                fd = None
+        if fd is None:
+            yield
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _ensure_refresher(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._refresh_loop, name='iam-token-refresh', daemon=True)
+                self._thread.start()
+
+    def _refresh_loop(self):
+        """Refresh the token once refresh_at passes, backing off while IAM fails"""
+        failures = 0
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._lock:
+                refresh_at = self._refresh_at
+            delay = max(0.0, refresh_at - time.time()) if refresh_at else None
+            if delay is None or delay > 0:
+                self._wake.wait(delay)
+                continue
+            try:
+                # Callers keep getting the current token while this runs
+                self._load_or_refresh(force=True)
+                failures = 0
+            except Exception:
+                failures += 1
+                with self._lock:
+                    # Keep serving the current token; try again shortly
+                    self._refresh_at = time.time() + min(_MAX_RETRY_DELAY, Config.RETRY_BACKOFF * (2 ** failures))
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(api_key: str, token_url: Optional[str] = None) -> IAMTokenManager:
+    """Return the process-wide token manager for an API key"""
+    key = (api_key, token_url or Config.IAM_TOKEN_URL)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = IAMTokenManager(api_key, token_url)
+            _managers[key] = manager
+        return manager
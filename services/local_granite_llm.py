@@ -0,0 +1,166 @@
+import threading
+from config import Config
+from IBM_GraniteHF.prompts import audio_friendly_formatting, tone_conversation
+from services.batch import map_isolated
+from services.rewrite_cache import RewriteCache
+from services.text_chunking import chunk_paragraphs
+from services.token_budget import TokenEstimator
+import streamlit as st
+from typing import List, Optional
+
+try:
+    # Optional: only needed when rewriting in-process
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+except Exception:  # pragma: no cover
+    torch = None
+    AutoModelForCausalLM = AutoTokenizer = None
+
+
+# Same decoding as the Granite Space (IBM_GraniteHF/app.py); the prompts are shared with it
+_GENERATION = {'temperature': 0.7, 'do_sample': True}
+
+
+class LocalGraniteLLMService:
+    """In-process Granite rewriting with the same interface as HuggingFaceLLMService
+
+    The model is loaded on the first rewrite (not at start-up) and shared by
+    every instance in the process; generations run one at a time, since they
+    already use every CPU core.
+    """
+
+    _model = None
+    _tokenizer = None
+    _token_estimator = None
+    _device = None
+    _load_lock = threading.Lock()
+    _generate_lock = threading.Lock()
+
+    def __init__(self, model_id: Optional[str] = None, cache: Optional[RewriteCache] = None):
+        self.model_id = model_id or Config.LOCAL_LLM_MODEL_ID
+        self.cache = cache
+        self._initialize_cache()
+
+    def _initialize_cache(self):
+        """Attach the persistent rewrite cache unless disabled or unusable"""
+        if self.cache is not None or not Config.REWRITE_CACHE_ENABLED:
+            return
+        try:
+            self.cache = RewriteCache()
+        except Exception as e:
+            st.warning(f"Rewrite cache disabled: {str(e)}")
+            self.cache = None
+
+    def get_cache_stats(self) -> dict:
+        """Get rewrite cache hit/miss counters (empty if caching is disabled)"""
+        return self.cache.stats() if self.cache is not None else {}
+
+    def get_token_stats(self) -> dict:
+        """Token counts come from the model's own tokenizer, so there is nothing to calibrate"""
+        return {'exact': True, 'chars_per_token': None, 'samples': 0, 'mean_abs_error': None, 'output_ratio': None}
+
+    def is_service_available(self) -> bool:
+        return bool(self.model_id and torch is not None and AutoModelForCausalLM is not None)
+
+    def is_loaded(self) -> bool:
+        return LocalGraniteLLMService._model is not None
+
+    def _load(self):
+        """Load the model and tokenizer once per process"""
+        cls = LocalGraniteLLMService
+        with cls._load_lock:
+            if cls._model is None:
+                device = Config.LOCAL_LLM_DEVICE or ('cuda' if torch.cuda.is_available() else 'cpu')
+                tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+                model = AutoModelForCausalLM.from_pretrained(
+                    self.model_id,
+                    torch_dtype=torch.bfloat16 if device.startswith('cuda') else torch.float32,
+                )
+                cls._model, cls._tokenizer, cls._device = model.to(device).eval(), tokenizer, device
+                # Exact counts from the model's own tokenizer, budgeted like the remote backends
+                cls._token_estimator = TokenEstimator(tokenizer=tokenizer)
+            return cls._model, cls._tokenizer
+
+    def _get_tone_prompt(self, tone: str, text: str) -> str:
+        return "\n\n".join(message["content"] for message in tone_conversation(text, tone.lower()))
+
+    def rewrite_text(self, text: str, tone: str = 'Neutral') -> str:
+        if not self.is_service_available():
+            raise Exception("Local Granite model requires torch and transformers")
+
+        try:
+            return self._rewrite(text, tone)
+        except Exception as e:
+            st.error(f"Local Granite rewrite failed: {e}")
+            return text
+
+    def rewrite_many(self, texts: List[str], tone: str = 'Neutral', max_workers: Optional[int] = None,
+                     on_progress=None) -> List[str]:
+        """
+        Rewrite several documents
+
+        Args:
+            texts (list): Documents to rewrite
+            tone (str): Tone to apply to every document
+            max_workers (int): Ignored beyond 1; local generations run one at a time
+            on_progress: Called as on_progress(done, total, index, error) after each document
+
+        Returns:
+            list: Rewritten documents in input order; a document whose rewrite failed is returned unchanged
+        """
+        if not self.is_service_available():
+            raise Exception("Local Granite model requires torch and transformers")
+
+        results = map_isolated(lambda text: self._rewrite(text, tone), texts, 1, on_progress)
+        return [text if error is not None else output for text, (output, error) in zip(texts, results)]
+
+    def _rewrite(self, text: str, tone: str) -> str:
+        """Rewrite one document, served from the cache when possible; raises on failure"""
+        key = None
+        if self.cache is not None:
+            params = dict(_GENERATION, token_budget=[Config.LLM_OUTPUT_RATIO, Config.LLM_OUTPUT_MARGIN,
+                                                     Config.LLM_MIN_NEW_TOKENS, Config.LLM_MAX_NEW_TOKENS],
+                          max_input_tokens=Config.LOCAL_LLM_MAX_INPUT_TOKENS)
+            key = self.cache.make_key(
+                'local-granite',
+                self.model_id,
+                RewriteCache.template_version(lambda t: self._get_tone_prompt(tone, t)),
+                params,
+                text,
+            )
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        self._load()
+        # Long texts are rewritten chunk by chunk (by paragraph) to stay within the input budget
+        chars_per_token = len(text) / max(1, LocalGraniteLLMService._token_estimator.count(text))
+        chunks = chunk_paragraphs(text, int(Config.LOCAL_LLM_MAX_INPUT_TOKENS * chars_per_token)) or [(text, '')]
+        output = "".join(f"{separator}{self._generate(chunk, tone)}" for chunk, separator in chunks)
+
+        if key is not None:
+            self.cache.put(key, output)
+        return output
+
+    def _generate(self, text: str, tone: str) -> str:
+        """Rewrite one chunk with the local model"""
+        model, tokenizer = self._load()
+        estimator = LocalGraniteLLMService._token_estimator
+        max_new_tokens = estimator.max_new_tokens(estimator.count(text))
+
+        inputs = tokenizer.apply_chat_template(
+            tone_conversation(text, tone.lower()),
+            return_tensors="pt",
+            add_generation_prompt=True,
+            return_dict=True
+        ).to(LocalGraniteLLMService._device)
+
+        with LocalGraniteLLMService._generate_lock, torch.no_grad():
+            output = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=tokenizer.eos_token_id,
+                **_GENERATION
+            )
+        response = tokenizer.decode(output[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        return audio_friendly_formatting(response).strip()
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from config import Config
+
+# Placeholder rendered into prompt templates to fingerprint them
+_TEMPLATE_PLACEHOLDER = '\x00TEXT\x00'
+
+
+class RewriteCache:
+    """SQLite cache of finished LLM rewrites
+
+    Entries are keyed by backend, model, a fingerprint of the prompt template,
+    decoding parameters and the input text, so any change to how a rewrite is
+    produced misses the cache instead of serving stale output. Entries expire
+    after ttl seconds; beyond max_entries the least recently used are evicted.
+    The database is shared by every session and process on the host.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.path = path or Config.REWRITE_CACHE_PATH
+        self.ttl = Config.REWRITE_CACHE_TTL if ttl is None else ttl
+        self.max_entries = Config.REWRITE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rewrites ('
+                ' key TEXT PRIMARY KEY,'
+                ' output TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' used_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS rewrites_used_at ON rewrites (used_at)')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Short-lived connection, committed on success; safe to use from any thread"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def template_version(*prompts) -> str:
+        """
+        Fingerprint prompt templates
+
+        Args:
+            prompts: Callables taking the input text and returning a full prompt
+
+        Returns:
+            str: Short hash that changes whenever any template's wording changes
+        """
+        digest = hashlib.sha256()
+        for prompt in prompts:
+            digest.update(prompt(_TEMPLATE_PLACEHOLDER).encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def make_key(backend: str, model_id: str, template_version: str, params: dict, text: str) -> str:
+        """Build the cache key for a rewrite request"""
+        text_hash = hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+        parts = [backend, model_id, template_version, json.dumps(params or {}, sort_keys=True), text_hash]
+        return hashlib.sha256("\x00".join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached rewrite, or None when missing or expired"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    'SELECT output FROM rewrites WHERE key = ? AND created_at >= ?',
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE rewrites SET used_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error:
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, key: str, output: str):
+        """Store a rewrite, then drop expired and least recently used entries"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO rewrites (key, output, created_at, used_at) VALUES (?, ?, ?, ?)',
+                    (key, output, now, now),
+                )
+                conn.execute('DELETE FROM rewrites WHERE created_at < ?', (now - self.ttl,))
+                conn.execute(
+                    'DELETE FROM rewrites WHERE key IN ('
+                    ' SELECT key FROM rewrites ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,),
+                )
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        """Remove every entry"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM rewrites')
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process and the current entry count"""
+        try:
+            with self._connect() as conn:
+                entries = conn.execute('SELECT COUNT(*) FROM rewrites').fetchone()[0]
+        except sqlite3.Error:
+            entries = 0
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+        }
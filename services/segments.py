@@ -0,0 +1,180 @@
+import hashlib
+import os
+from difflib import SequenceMatcher
+from itertools import groupby
+from typing import Iterator, List, Optional, Tuple
+from config import Config
+from services.audio_utils import AudioJoiner, audio_extension
+from services.text_chunking import pack_sentences, text_to_sentences
+from services.timing_index import TimingIndex, sentence_offsets
+
+
+def group_texts(text: str, groups: List[Tuple[str, ...]], start: int = 0) -> List[str]:
+    """Text of each group of consecutive sentences as written in text, paragraph breaks included"""
+    texts = []
+    pos = start
+    for sentences in groups:
+        begin = None
+        for sentence in sentences:
+            found = text.find(sentence, pos)
+            found = found if found >= 0 else pos
+            begin = found if begin is None else begin
+            pos = found + len(sentence)
+        texts.append(text[begin:pos])
+    return texts
+
+
+class SegmentTrack:
+    """Sentence-level audio segments behind the last rendered text
+
+    Audio is synthesized in groups of consecutive sentences and each group's
+    audio is kept on disk. A first render (or one in another voice) uses groups
+    of up to chunk_chars characters, as many as a plain chunked synthesis. When
+    the text is rendered again, it is diffed sentence by sentence against the
+    previous render: groups whose sentences are unchanged are reused, and only
+    the edited regions are sent to TTS. Edited sentences go out in groups of at
+    most max_chars, so later edits nearby re-synthesize little; unchanged
+    sentences that lost their group are regrouped in chunk_chars groups.
+    Everything is then spliced back together in order.
+    """
+
+    def __init__(self, directory: str, max_chars: Optional[int] = None, chunk_chars: Optional[int] = None):
+        self.directory = directory
+        self.max_chars = max_chars or Config.TTS_SEGMENT_MAX_CHARS
+        self.chunk_chars = chunk_chars or Config.TTS_CHUNK_MAX_CHARS
+        self.render_key = None  # (voice, accept format) of the last render
+        self.groups: List[Tuple[Tuple[str, ...], str]] = []  # (sentences, audio path)
+        self.last_synthesized = 0
+        self.last_reused = 0
+        self.text = ''
+        self.timing_index: Optional[TimingIndex] = None  # text offset <-> audio time of the last render
+
+    def render(self, tts_service, text: str, voice: str) -> Iterator[bytes]:
+        """
+        Render text, re-synthesizing only what changed since the previous render
+
+        Args:
+            tts_service: WatsonTTSService used for changed segments
+            text (str): Text to render
+            voice (str): Voice to use; changing it (or the format) re-renders everything
+
+        Yields:
+            bytes: Consecutive pieces of one audio stream
+        """
+        # Segments are only reusable for the same voice and output format
+        render_key = (voice, tts_service.accept)
+        old_groups = self.groups if render_key == self.render_key else []
+        plan = self._plan(old_groups, text_to_sentences(text))
+        # Groups are spoken as written, so paragraph breaks keep their pause
+        spoken = group_texts(text, [item[0] if kind == 'reuse' else item for kind, item in plan])
+
+        dirty = [spoken[index] for index, (kind, _item) in enumerate(plan) if kind == 'new']
+        fresh = tts_service.iter_segments(dirty, voice) if dirty else iter(())
+
+        os.makedirs(self.directory, exist_ok=True)
+        new_groups = []
+        timing_index = TimingIndex()
+        joiner = AudioJoiner(tts_service.accept)
+        elapsed = 0.0
+        pos = 0
+        for index, (kind, item) in enumerate(plan):
+            if kind == 'reuse':
+                sentences, path = item
+                with open(path, 'rb') as f:
+                    audio = f.read()
+            else:
+                sentences = item
+                audio = next(fresh)
+                path = self._store(voice, tts_service.accept, sentences, audio)
+            new_groups.append((sentences, path))
+
+            piece = joiner.add(audio)
+
+            # Word timings from Watson when captured, otherwise spread over the segment duration
+            offsets = sentence_offsets(text, list(sentences), pos)
+            pos = offsets[-1] + len(sentences[-1])
+            duration = joiner.duration - elapsed
+            words = tts_service.get_word_timings(spoken[index], voice)
+            if words:
+                timing_index.add_words(text, words, start=offsets[0], time_shift=elapsed)
+            else:
+                timing_index.add_estimate(text, offsets[0], pos, elapsed, duration)
+            elapsed = joiner.duration
+
+            yield piece
+        tail = joiner.finish()
+        if tail:
+            yield tail
+
+        self.last_synthesized = len(dirty)
+        self.last_reused = len(plan) - len(dirty)
+        self.text = text
+        self.timing_index = timing_index
+        self._commit(render_key, new_groups)
+
+    def _plan(self, old_groups, new_sentences: List[str]) -> list:
+        """Build an ordered list of ('reuse', group) and ('new', sentences) steps"""
+        if not old_groups:
+            return [('new', g) for g in pack_sentences(new_sentences, self.chunk_chars)]
+        old_sentences = [s for sentences, _path in old_groups for s in sentences]
+        mapping = {}  # old sentence index -> new sentence index
+        matcher = SequenceMatcher(None, old_sentences, new_sentences, autojunk=False)
+        for tag, i1, i2, j1, _j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                for k in range(i2 - i1):
+                    mapping[i1 + k] = j1 + k
+        unchanged = set(mapping.values())
+
+        # A group is reusable when all of its sentences survive, contiguous and in order
+        reuse_at = {}
+        pos = 0
+        for sentences, path in old_groups:
+            targets = [mapping.get(i) for i in range(pos, pos + len(sentences))]
+            pos += len(sentences)
+            if None in targets or not os.path.exists(path):
+                continue
+            if targets == list(range(targets[0], targets[0] + len(sentences))):
+                reuse_at[targets[0]] = (sentences, path)
+
+        plan = []
+        run = []
+        j = 0
+        while j < len(new_sentences):
+            group = reuse_at.get(j)
+            if group is None:
+                run.append(j)
+                j += 1
+                continue
+            plan.extend(('new', g) for g in self._pack(new_sentences, run, unchanged))
+            run = []
+            plan.append(('reuse', group))
+            j += len(group[0])
+        plan.extend(('new', g) for g in self._pack(new_sentences, run, unchanged))
+        return plan
+
+    def _pack(self, sentences: List[str], run: List[int], unchanged: set) -> List[Tuple[str, ...]]:
+        """Group the sentences at the run's indexes: small groups for edited ones, chunk-sized for the rest"""
+        groups = []
+        for kept, stretch in groupby(run, key=lambda i: i in unchanged):
+            groups += pack_sentences([sentences[i] for i in stretch], self.chunk_chars if kept else self.max_chars)
+        return groups
+
+    def _store(self, voice: str, accept: str, sentences: Tuple[str, ...], audio: bytes) -> str:
+        digest = hashlib.sha256("\x00".join((voice, accept) + sentences).encode('utf-8')).hexdigest()
+        path = os.path.join(self.directory, f"{digest}.{audio_extension(accept)}")
+        with open(path, 'wb') as f:
+            f.write(audio)
+        return path
+
+    def _commit(self, render_key: tuple, groups):
+        """Adopt the new render and delete segment files it no longer uses"""
+        self.render_key = render_key
+        self.groups = groups
+        keep = {path for _sentences, path in groups}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
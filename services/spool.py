@@ -0,0 +1,69 @@
+import os
+import re
+import shutil
+import time
+from typing import Optional
+
+# Spool entries are named after the session's 32-hex-digit id: '<id>.ogg', '<id>_Lisa.ogg',
+# '<id>.mp3', '<id>_segments/' ...; anything else in the directory is left alone
+_SESSION_ENTRY = re.compile(r'^([0-9a-f]{32})(?=[._]|$)')
+
+
+def _latest_mtime(path: str) -> float:
+    """Newest modification time of a file, or of a directory and the files directly in it"""
+    latest = os.stat(path).st_mtime
+    if os.path.isdir(path):
+        for entry in os.scandir(path):
+            try:
+                latest = max(latest, entry.stat().st_mtime)
+            except OSError:
+                pass
+    return latest
+
+
+def sweep_spool(directory: str, ttl: float, now: Optional[float] = None) -> int:
+    """
+    Delete the spooled audio of sessions that have not written anything for ttl seconds
+
+    A session's files go together, judged by the newest of them, so audio a
+    session is still using is never removed from under it.
+
+    Args:
+        directory (str): Spool directory
+        ttl (float): Seconds of inactivity after which a session's files are deleted
+        now (float): Current time (default: time.time())
+
+    Returns:
+        int: Number of files and directories removed
+    """
+    now = time.time() if now is None else now
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+
+    sessions = {}  # session id -> [(path, latest mtime)]
+    for name in names:
+        match = _SESSION_ENTRY.match(name)
+        if not match:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            sessions.setdefault(match.group(1), []).append((path, _latest_mtime(path)))
+        except OSError:
+            continue
+
+    removed = 0
+    for entries in sessions.values():
+        if now - max(mtime for _path, mtime in entries) < ttl:
+            continue
+        for path, _mtime in entries:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
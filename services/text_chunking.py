@@ -0,0 +1,129 @@
+import re
+from typing import List, Tuple
+
+# Sentence boundary: whitespace after terminal punctuation, optionally followed by a closing quote/bracket
+_SENTENCE_BOUNDARY = re.compile(r'(?:(?<=[.!?…])|(?<=[.!?…]["\'”’)\]]))\s+')
+_PARAGRAPH_BOUNDARY = re.compile(r'\n\s*\n')
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split text into non-empty paragraphs (blank-line separated)"""
+    return [p.strip() for p in _PARAGRAPH_BOUNDARY.split(text or '') if p.strip()]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a paragraph into sentences on terminal punctuation"""
+    return [s.strip() for s in _SENTENCE_BOUNDARY.split(text or '') if s.strip()]
+
+
+def text_to_sentences(text: str) -> List[str]:
+    """Split text into sentences across all paragraphs"""
+    return [s for paragraph in split_paragraphs(text) for s in split_sentences(paragraph)]
+
+
+def pack_sentences(sentences: List[str], max_chars: int) -> List[Tuple[str, ...]]:
+    """Group consecutive sentences into runs of at most max_chars characters"""
+    groups = []
+    current = []
+    size = 0
+    for sentence in sentences:
+        if current and size + 1 + len(sentence) > max_chars:
+            groups.append(tuple(current))
+            current, size = [], 0
+        size += len(sentence) + (1 if current else 0)
+        current.append(sentence)
+    if current:
+        groups.append(tuple(current))
+    return groups
+
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Split a single over-long sentence on whitespace, hard-splitting words longer than max_chars"""
+    pieces = []
+    current = ''
+    for word in sentence.split():
+        while len(word) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        if not word:
+            continue
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_chars: int) -> List[str]:
+    """
+    Pack text into chunks of at most max_chars characters
+
+    Chunks never break inside a sentence unless a single sentence is longer than
+    max_chars (nor inside a word unless the word alone is), and a new chunk is
+    preferred at paragraph boundaries.
+
+    Args:
+        text (str): Text to split
+        max_chars (int): Maximum characters per chunk
+
+    Returns:
+        list: Chunks in reading order
+    """
+    chunks = []
+    for paragraph in split_paragraphs(text):
+        if len(paragraph) <= max_chars:
+            units = [paragraph]
+        else:
+            units = []
+            for sentence in split_sentences(paragraph):
+                units.extend(_split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence])
+
+        current = ''
+        for unit in units:
+            if current and len(current) + 1 + len(unit) > max_chars:
+                chunks.append(current)
+                current = unit
+            else:
+                current = f"{current} {unit}" if current else unit
+
+        # Merge a paragraph into the previous chunk when both fit
+        if current:
+            if chunks and len(chunks[-1]) + 2 + len(current) <= max_chars and len(units) == 1:
+                chunks[-1] = f"{chunks[-1]}\n\n{current}"
+            else:
+                chunks.append(current)
+    return chunks
+
+
+def chunk_paragraphs(text: str, max_chars: int) -> List[Tuple[str, str]]:
+    """
+    Pack text into chunks of at most max_chars characters, remembering how they join
+
+    Whole paragraphs are packed together where they fit; a paragraph longer than
+    max_chars is split between sentences.
+
+    Args:
+        text (str): Text to split
+        max_chars (int): Maximum characters per chunk
+
+    Returns:
+        list: (chunk, separator) pairs, where separator ('', ' ' or a blank line)
+            goes before the chunk when stitching chunks back together
+    """
+    chunks = []  # [chunk, separator]
+    open_chunk = False  # the last chunk holds whole paragraphs only and may take more
+    for paragraph in split_paragraphs(text):
+        pieces = chunk_text(paragraph, max_chars)
+        if len(pieces) == 1 and open_chunk and len(chunks[-1][0]) + 2 + len(paragraph) <= max_chars:
+            chunks[-1][0] += f"\n\n{paragraph}"
+            continue
+        for k, piece in enumerate(pieces):
+            chunks.append([piece, ' ' if k else ('\n\n' if chunks else '')])
+        open_chunk = len(pieces) == 1
+    return [(chunk, separator) for chunk, separator in chunks]
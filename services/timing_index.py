@@ -0,0 +1,119 @@
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Iterable, List, Optional, Sequence
+
+_MAGIC = b'EVTI'
+_VERSION = 1
+_WORD = re.compile(r'\S+')
+
+
+class TimingIndex:
+    """Maps text offsets to audio timestamps and back in O(log n)
+
+    Stored as two parallel, non-decreasing arrays: the character offset where
+    each word starts and the time (milliseconds) at which it is spoken.
+    """
+
+    def __init__(self, offsets: Optional[Iterable[int]] = None, times_ms: Optional[Iterable[int]] = None):
+        self.offsets = array('I', offsets or [])
+        self.times_ms = array('I', times_ms or [])
+        self.duration_ms = self.times_ms[-1] if self.times_ms else 0
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def add(self, offset: int, seconds: float):
+        """Append a word start; offsets and times must not go backwards"""
+        ms = int(round(seconds * 1000))
+        if self.offsets and (offset < self.offsets[-1] or ms < self.times_ms[-1]):
+            return
+        self.offsets.append(offset)
+        self.times_ms.append(ms)
+
+    def add_words(self, text: str, words: Sequence, start: int = 0, time_shift: float = 0.0) -> int:
+        """
+        Add Watson word timings ([word, start_s, end_s] entries) spoken from text[start:]
+
+        Returns:
+            int: Offset in text just past the last matched word
+        """
+        pos = start
+        for word, begin, end in words:
+            found = text.find(word, pos)
+            if found < 0:
+                continue
+            self.add(found, time_shift + begin)
+            pos = found + len(word)
+            self.duration_ms = max(self.duration_ms, int(round((time_shift + end) * 1000)))
+        return pos
+
+    def add_estimate(self, text: str, start: int, end: int, time_shift: float, duration: float):
+        """Spread the words of text[start:end] over duration seconds, proportionally to their length"""
+        words = list(_WORD.finditer(text, start, end))
+        total = sum(len(m.group()) + 1 for m in words) or 1
+        elapsed = 0
+        for m in words:
+            self.add(m.start(), time_shift + duration * elapsed / total)
+            elapsed += len(m.group()) + 1
+        self.duration_ms = max(self.duration_ms, int(round((time_shift + duration) * 1000)))
+
+    def time_at(self, offset: int) -> float:
+        """Audio time (seconds) at which the word containing text offset is spoken"""
+        i = bisect_right(self.offsets, offset) - 1
+        return self.times_ms[i] / 1000.0 if i >= 0 else 0.0
+
+    def offset_at(self, seconds: float) -> int:
+        """Text offset of the word being spoken at the given audio time"""
+        i = bisect_right(self.times_ms, int(seconds * 1000)) - 1
+        return self.offsets[i] if i >= 0 else 0
+
+    def to_bytes(self) -> bytes:
+        offsets, times = array('I', self.offsets), array('I', self.times_ms)
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+            times.byteswap()
+        header = _MAGIC + struct.pack('<BII', _VERSION, len(offsets), self.duration_ms)
+        return header + offsets.tobytes() + times.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TimingIndex':
+        if data[:4] != _MAGIC:
+            raise ValueError("Not a timing index")
+        version, count, duration_ms = struct.unpack_from('<BII', data, 4)
+        if version != _VERSION:
+            raise ValueError(f"Unsupported timing index version {version}")
+        start = 4 + struct.calcsize('<BII')
+        offsets, times = array('I'), array('I')
+        offsets.frombytes(data[start:start + 4 * count])
+        times.frombytes(data[start + 4 * count:start + 8 * count])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+            times.byteswap()
+        index = cls()
+        index.offsets, index.times_ms, index.duration_ms = offsets, times, duration_ms
+        return index
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'TimingIndex':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+def sentence_offsets(text: str, sentences: List[str], start: int = 0) -> List[int]:
+    """Locate each sentence in text, in order, returning its start offset"""
+    offsets = []
+    pos = start
+    for sentence in sentences:
+        found = text.find(sentence, pos)
+        if found < 0:
+            found = pos
+        offsets.append(found)
+        pos = found + len(sentence)
+    return offsets
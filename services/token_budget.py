@@ -0,0 +1,112 @@
+import math
+import threading
+from collections import deque
+from typing import Optional
+from config import Config
+
+try:
+    # Optional: exact counts when a tokenizer is available locally
+    from transformers import AutoTokenizer
+except Exception:  # pragma: no cover
+    AutoTokenizer = None
+
+# Weight of each new observation in the running chars-per-token calibration
+_CALIBRATION_WEIGHT = 0.2
+
+
+class TokenEstimator:
+    """Token counts for budgeting LLM requests
+
+    Counts are exact when a tokenizer for the model can be loaded from local
+    files (Config.LLM_TOKENIZER); otherwise they are estimated from a
+    characters-per-token ratio that is calibrated from the token counts the
+    API reports back. Estimated and actual counts are kept for tuning.
+    """
+
+    def __init__(self, tokenizer_name: Optional[str] = None, chars_per_token: Optional[float] = None,
+                 window: int = 200, tokenizer=None):
+        self.tokenizer_name = tokenizer_name if tokenizer_name is not None else Config.LLM_TOKENIZER
+        self.chars_per_token = chars_per_token or Config.LLM_CHARS_PER_TOKEN
+        # An already loaded tokenizer (e.g. of an in-process model) is used as is
+        self._tokenizer = tokenizer
+        self._tokenizer_loaded = tokenizer is not None
+        self._samples = deque(maxlen=window)  # (estimated, actual) input tokens
+        self._output_ratios = deque(maxlen=window)  # generated tokens / text tokens
+        self._lock = threading.Lock()
+
+    @property
+    def exact(self) -> bool:
+        return self._get_tokenizer() is not None
+
+    def _get_tokenizer(self):
+        with self._lock:
+            if not self._tokenizer_loaded:
+                self._tokenizer_loaded = True
+                if AutoTokenizer is not None and self.tokenizer_name:
+                    try:
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name, local_files_only=True)
+                    except Exception:
+                        self._tokenizer = None
+            return self._tokenizer
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text (exact or estimated)"""
+        tokenizer = self._get_tokenizer()
+        if tokenizer is not None:
+            return len(tokenizer.encode(text or '', add_special_tokens=False))
+        return math.ceil(len(text or '') / self.chars_per_token)
+
+    def chars_for(self, tokens: int) -> int:
+        """Characters of text that fit in a number of tokens"""
+        return max(1, int(tokens * self.chars_per_token))
+
+    def max_new_tokens(self, text_tokens: int) -> int:
+        """Generation budget for rewriting a text of text_tokens tokens"""
+        wanted = math.ceil(text_tokens * Config.LLM_OUTPUT_RATIO) + Config.LLM_OUTPUT_MARGIN
+        return max(Config.LLM_MIN_NEW_TOKENS, min(Config.LLM_MAX_NEW_TOKENS, wanted))
+
+    def max_input_tokens(self, overhead: int, context: Optional[int] = None) -> int:
+        """Longest text whose prompt (text + overhead tokens) and generation budget fit the context"""
+        available = (context or Config.LLM_CONTEXT_TOKENS) - overhead
+        proportional = (available - Config.LLM_OUTPUT_MARGIN) / (1 + Config.LLM_OUTPUT_RATIO)
+        capped = available - Config.LLM_MAX_NEW_TOKENS
+        return max(1, int(max(proportional, capped)))
+
+    def min_new_tokens(self, text_tokens: int) -> int:
+        """Floor on generated tokens; never forces more than half the input length"""
+        return max(1, min(Config.LLM_MIN_NEW_TOKENS, text_tokens // 2))
+
+    def record(self, prompt: str, estimated: int, actual: Optional[int], text_tokens: Optional[int] = None,
+               generated: Optional[int] = None):
+        """
+        Record the token counts the API reported for a request
+
+        Args:
+            prompt (str): Prompt that was sent
+            estimated (int): Estimated prompt tokens
+            actual (int): Prompt tokens reported by the API
+            text_tokens (int): Estimated tokens of the text being rewritten
+            generated (int): Tokens the API generated
+        """
+        with self._lock:
+            if actual:
+                self._samples.append((estimated, actual))
+                if self._tokenizer is None:
+                    observed = len(prompt) / actual
+                    self.chars_per_token += _CALIBRATION_WEIGHT * (observed - self.chars_per_token)
+            if generated is not None and text_tokens:
+                self._output_ratios.append(generated / text_tokens)
+
+    def stats(self) -> dict:
+        """Estimated vs actual token counts of recent requests"""
+        with self._lock:
+            samples = list(self._samples)
+            ratios = list(self._output_ratios)
+        errors = [abs(estimated - actual) / actual for estimated, actual in samples if actual]
+        return {
+            'exact': self._tokenizer is not None,
+            'chars_per_token': round(self.chars_per_token, 3),
+            'samples': len(samples),
+            'mean_abs_error': sum(errors) / len(errors) if errors else None,
+            'output_ratio': sum(ratios) / len(ratios) if ratios else None,
+        }
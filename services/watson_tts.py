@@ -1,42 +1,118 @@
 import io
 import base64
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+import websocket
 from ibm_watson import TextToSpeechV1
+from ibm_watson.websocket import SynthesizeCallback
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
 from config import Config
+from services.audio_cache import AudioCache
+from services.audio_utils import accept_with_rate, can_join, join_audio
+from services.hedging import LatencyTracker, hedged_call, size_class
+from services.http_transport import get_transport
+from services.segments import group_texts
+from services.text_chunking import chunk_text, pack_sentences, text_to_sentences
 import streamlit as st
 
+logger = logging.getLogger(__name__)
+
+# Recently captured word timings kept in memory (in addition to the audio cache)
+_WORD_TIMINGS_MEMORY = 512
+
+
+class _TimingCallback(SynthesizeCallback):
+    """Collects audio and word timings from a WebSocket synthesis"""
+
+    def __init__(self):
+        super().__init__()
+        self.audio = bytearray()
+        self.words = []
+        self.error = None
+
+    def on_audio_stream(self, audio_stream):
+        self.audio.extend(audio_stream)
+
+    def on_timing_information(self, timing_information):
+        self.words.extend(timing_information.get('words') or [])
+
+    def on_error(self, error):
+        self.error = error
+
+
 class WatsonTTSService:
     """IBM Watson Text-to-Speech service integration"""
     
-    def __init__(self):
-        self.authenticator = None
+    def __init__(self, service_url: Optional[str] = None, authenticator=None, cache: Optional[AudioCache] = None,
+                 accept: Optional[str] = None):
+        self.service_url = service_url or Config.WATSON_TTS_URL
+        self.authenticator = authenticator
         self.text_to_speech = None
+        # Output format, e.g. 'audio/ogg;codecs=opus' or 'audio/mp3;rate=22050'
+        self.accept = accept or accept_with_rate(Config.AUDIO_FORMAT, Config.SAMPLE_RATE)
+        self.chunk_max_chars = Config.TTS_CHUNK_MAX_CHARS
+        self.max_workers = Config.TTS_MAX_WORKERS
+        self.cache = cache
+        self.capture_timings = Config.TTS_WORD_TIMINGS
+        self._word_timings = OrderedDict()  # (text, voice_id, accept) -> [[word, start, end], ...]
+        self.hedge_enabled = Config.TTS_HEDGE_ENABLED
+        self.hedge_percentile = Config.TTS_HEDGE_PERCENTILE
+        self.latency = LatencyTracker(Config.TTS_LATENCY_WINDOW)
+        # Latency grows with text length, so hedge delays come from requests of a similar size
+        self._class_latency = {}  # size_class(chars) -> LatencyTracker
+        self.hedges_issued = 0
+        self.hedge_wins = 0
+        self._hedge_pool = None
+        self._stats_lock = threading.Lock()
         self._initialize_service()
+        self._initialize_cache()
     
     def _initialize_service(self):
         """Initialize Watson TTS service"""
         try:
-            if not Config.WATSON_TTS_API_KEY:
-                raise ValueError("Watson TTS API key not found in configuration")
-            
-            self.authenticator = IAMAuthenticator(Config.WATSON_TTS_API_KEY)
+            if self.authenticator is None:
+                if not Config.WATSON_TTS_API_KEY:
+                    raise ValueError("Watson TTS API key not found in configuration")
+                self.authenticator = IAMAuthenticator(Config.WATSON_TTS_API_KEY)
+
             self.text_to_speech = TextToSpeechV1(authenticator=self.authenticator)
-            self.text_to_speech.set_service_url(Config.WATSON_TTS_URL)
+            self.text_to_speech.set_service_url(self.service_url)
+            # Share keep-alive connections, retries and latency metrics with the other services
+            self.text_to_speech.set_http_client(get_transport().session(self.service_url))
+            if self.capture_timings:
+                # The WebSocket client has no per-call timeout; bound connects and reads of every socket it opens
+                websocket.setdefaulttimeout(Config.REQUEST_TIMEOUT)
             
         except Exception as e:
             st.error(f"Failed to initialize Watson TTS service: {str(e)}")
             self.text_to_speech = None
     
-    def synthesize_speech(self, text: str, voice: str = 'Lisa') -> bytes:
+    def _initialize_cache(self):
+        """Attach the on-disk audio cache unless disabled or unusable"""
+        if self.cache is not None or not Config.AUDIO_CACHE_ENABLED:
+            return
+        try:
+            self.cache = AudioCache()
+        except Exception as e:
+            st.warning(f"Audio cache disabled: {str(e)}")
+            self.cache = None
+    
+    def synthesize_speech(self, text: str, voice: str = 'Lisa', chunked: Optional[bool] = None) -> bytes:
         """
         Convert text to speech using Watson TTS
         
         Args:
             text (str): Text to convert to speech
             voice (str): Voice to use for synthesis
+            chunked (bool): Split the text into chunks synthesized in parallel.
+                Defaults to chunking only texts longer than one chunk.
             
         Returns:
-            bytes: Audio data in MP3 format
+            bytes: Audio data in the configured output format
         """
         if not self.text_to_speech:
             raise Exception("Watson TTS service not initialized")
@@ -44,25 +120,263 @@ class WatsonTTSService:
         try:
             # Get voice ID from configuration
             voice_id = Config.SUPPORTED_VOICES.get(voice, Config.SUPPORTED_VOICES['Lisa'])
+
+            chunks = chunk_text(text, self.chunk_max_chars) if chunked is not False else []
+            if len(chunks) <= 1:
+                return self._synthesize_chunk(text, voice_id)
+            self._check_joinable()
+
+            # Chunks come back in order; join them into one stream
+            return join_audio(self._synthesize_chunks(chunks, voice_id), self.accept)
             
-            # Synthesize speech
-            response = self.text_to_speech.synthesize(
-                text=text,
-                voice=voice_id,
-                accept='audio/mp3'
-            ).get_result()
+        except Exception as e:
+            st.error(f"Error synthesizing speech: {str(e)}")
+            raise
+
+    def iter_segments(self, texts: List[str], voice: str = 'Lisa') -> Iterator[bytes]:
+        """
+        Synthesize several texts in parallel, yielding each one's audio in order
+        
+        Args:
+            texts (list): Texts to synthesize as separate requests
+            voice (str): Voice to use for synthesis
             
-            # Return audio content
-            return response.content
+        Yields:
+            bytes: Audio of each text, in input order
+        """
+        if not self.text_to_speech:
+            raise Exception("Watson TTS service not initialized")
+        
+        try:
+            voice_id = Config.SUPPORTED_VOICES.get(voice, Config.SUPPORTED_VOICES['Lisa'])
+            yield from self._iter_chunks(texts, voice_id)
+        except Exception as e:
+            st.error(f"Error synthesizing speech: {str(e)}")
+            raise
+
+    def synthesize_all_voices(self, text: str, voices: Optional[List[str]] = None) -> dict:
+        """
+        Synthesize the same text in several voices concurrently
+        
+        All voices share one bounded pool, and the text is split into the same
+        sentence groups as a first incremental render so cached segments are reused.
+        
+        Args:
+            text (str): Text to convert to speech
+            voices (list): Voice names (default: all supported voices)
             
+        Returns:
+            dict: Voice name -> audio bytes
+        """
+        if not self.text_to_speech:
+            raise Exception("Watson TTS service not initialized")
+        
+        try:
+            voices = voices or self.get_available_voices()
+            # The groups of a first SegmentTrack render, so the chosen voice's clip is cached for it
+            groups = group_texts(text, pack_sentences(text_to_sentences(text), Config.TTS_CHUNK_MAX_CHARS)) or [text]
+            if len(groups) > 1:
+                self._check_joinable()
+            jobs = [
+                (group, Config.SUPPORTED_VOICES.get(voice, Config.SUPPORTED_VOICES['Lisa']))
+                for voice in voices
+                for group in groups
+            ]
+            audio = list(self._iter_jobs(jobs))
+            n = len(groups)
+            return {voice: join_audio(audio[i * n:(i + 1) * n], self.accept) for i, voice in enumerate(voices)}
         except Exception as e:
             st.error(f"Error synthesizing speech: {str(e)}")
             raise
+
+    def _synthesize_chunk(self, text: str, voice_id: str) -> bytes:
+        """Synthesize a single request worth of text, served from the cache when possible"""
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(text, voice_id, self.accept, self.service_url)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        audio = self._fetch_chunk(text, voice_id)
+
+        if key is not None:
+            self.cache.put(key, audio)
+        return audio
+
+    def _request_chunk(self, text: str, voice_id: str) -> bytes:
+        """Send one synthesize request and record its latency"""
+        start = time.perf_counter()
+        audio = self._request_chunk_with_timings(text, voice_id) if self.capture_timings else None
+        if audio is None:
+            response = self.text_to_speech.synthesize(
+                text=text,
+                voice=voice_id,
+                accept=self.accept
+            ).get_result()
+            audio = response.content
+        self._record_latency(len(text), time.perf_counter() - start)
+        return audio
+
+    def _request_chunk_with_timings(self, text: str, voice_id: str) -> Optional[bytes]:
+        """
+        Synthesize over the WebSocket API to capture word timings; None if that fails
+
+        The first failure turns timings off for this service, so later chunks go
+        straight to the HTTP API instead of paying for a failed WebSocket each time.
+        """
+        callback = _TimingCallback()
+        try:
+            self.text_to_speech.synthesize_using_websocket(
+                text,
+                callback,
+                accept=self.accept,
+                voice=voice_id,
+                timings=['words'],
+            )
+        except Exception as e:
+            callback.error = callback.error or e
+        if callback.error or not callback.audio:
+            self.capture_timings = False
+            logger.warning("Word timings disabled, WebSocket synthesis failed: %s", callback.error or "no audio")
+            return None
+
+        with self._stats_lock:
+            self._word_timings[(text, voice_id, self.accept)] = callback.words
+            while len(self._word_timings) > _WORD_TIMINGS_MEMORY:
+                self._word_timings.popitem(last=False)
+        if self.cache is not None:
+            key = self.cache.make_key(text, voice_id, self.accept, self.service_url)
+            self.cache.put_meta(key, {'words': callback.words})
+        return bytes(callback.audio)
+
+    def get_word_timings(self, text: str, voice: str = 'Lisa') -> Optional[list]:
+        """
+        Get Watson word timings captured when text was synthesized
+        
+        Returns:
+            list: [word, start_seconds, end_seconds] entries, or None if not captured
+        """
+        voice_id = Config.SUPPORTED_VOICES.get(voice, Config.SUPPORTED_VOICES['Lisa'])
+        with self._stats_lock:
+            words = self._word_timings.get((text, voice_id, self.accept))
+        if words is None and self.cache is not None:
+            meta = self.cache.get_meta(self.cache.make_key(text, voice_id, self.accept, self.service_url))
+            words = (meta or {}).get('words')
+        return words or None
+
+    def _fetch_chunk(self, text: str, voice_id: str) -> bytes:
+        """Request a chunk, hedging with a duplicate request when it runs long"""
+        delay = self._hedge_delay(len(text))
+        if delay is None:
+            return self._request_chunk(text, voice_id)
+        return hedged_call(
+            self._get_hedge_pool(),
+            self._request_chunk,
+            (text, voice_id),
+            delay,
+            on_hedge=self._count_hedge,
+            on_hedge_win=self._count_hedge_win,
+        )
+
+    def _record_latency(self, chars: int, seconds: float):
+        self.latency.record(seconds)
+        with self._stats_lock:
+            tracker = self._class_latency.get(size_class(chars))
+            if tracker is None:
+                tracker = self._class_latency[size_class(chars)] = LatencyTracker(Config.TTS_LATENCY_WINDOW)
+        tracker.record(seconds)
+
+    def _hedge_delay(self, chars: int) -> Optional[float]:
+        """Latency after which a chunk of this many characters is hedged, or None while hedging is off
+        or requests of its size class are not yet calibrated"""
+        if not self.hedge_enabled:
+            return None
+        with self._stats_lock:
+            tracker = self._class_latency.get(size_class(chars))
+        if tracker is None or len(tracker) < Config.TTS_HEDGE_MIN_SAMPLES:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        # Primary and duplicate requests of every chunk worker run here
+        with self._stats_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=2 * max(1, self.max_workers),
+                    thread_name_prefix='watson-tts-hedge',
+                )
+            return self._hedge_pool
+
+    def _count_hedge(self):
+        with self._stats_lock:
+            self.hedges_issued += 1
+
+    def _count_hedge_win(self):
+        with self._stats_lock:
+            self.hedge_wins += 1
+
+    def _synthesize_chunks(self, chunks: List[str], voice_id: str) -> List[bytes]:
+        """Synthesize chunks on a bounded thread pool, preserving order"""
+        return list(self._iter_chunks(chunks, voice_id))
+
+    def _iter_chunks(self, chunks: List[str], voice_id: str) -> Iterator[bytes]:
+        """Yield synthesized chunks of one voice in order"""
+        return self._iter_jobs([(chunk, voice_id) for chunk in chunks])
+
+    def _iter_jobs(self, jobs: List[tuple]) -> Iterator[bytes]:
+        """
+        Yield synthesized (text, voice_id) jobs in order from a bounded thread pool
+
+        At most twice the worker count is in flight or waiting to be consumed,
+        so memory stays bounded when the consumer is slower than synthesis.
+        """
+        workers = max(1, min(self.max_workers, len(jobs)))
+        window = 2 * workers
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='watson-tts') as pool:
+            try:
+                for text, voice_id in jobs:
+                    if len(pending) >= window:
+                        yield pending.popleft().result()
+                    pending.append(pool.submit(self._synthesize_chunk, text, voice_id))
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # Consumer stopped early or a chunk failed: drop queued work
+                for future in pending:
+                    future.cancel()
+    
+    def _check_joinable(self):
+        """Fail before synthesizing when several segments could not be joined in the output format"""
+        if not can_join(self.accept):
+            raise ValueError(f"{self.accept} audio cannot be joined from several segments; "
+                             "use audio/ogg;codecs=opus, audio/mp3 or audio/wav for long texts")
     
     def get_available_voices(self) -> list:
         """Get list of available voices"""
         return list(Config.SUPPORTED_VOICES.keys())
     
+    def get_cache_stats(self) -> dict:
+        """Get audio cache hit/miss counters (empty if caching is disabled)"""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def get_hedge_stats(self) -> dict:
+        """Get latency percentiles and hedging counters for chunked synthesis"""
+        with self._stats_lock:
+            hedges, wins = self.hedges_issued, self.hedge_wins
+            classes = sorted(self._class_latency)
+        return {
+            'enabled': self.hedge_enabled,
+            'samples': len(self.latency),
+            'p50': self.latency.percentile(50),
+            'p99': self.latency.percentile(99),
+            # Hedge delay per size class, keyed by the class's largest request in characters
+            'hedge_delays': {256 << c: self._hedge_delay(256 << c) for c in classes},
+            'hedges': hedges,
+            'hedge_wins': wins,
+        }
+    
     def is_service_available(self) -> bool:
         """Check if the service is properly initialized"""
         return self.text_to_speech is not None
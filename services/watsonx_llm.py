@@ -1,53 +1,87 @@
 import requests
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
 from config import Config
+from services.batch import map_isolated
+from services.http_transport import get_transport
+from services.iam_token import get_token_manager
+from services.rewrite_cache import RewriteCache
+from services.text_chunking import chunk_paragraphs, split_sentences
+from services.token_budget import TokenEstimator
 import streamlit as st
 
+
+class PartialRewriteError(Exception):
+    """Some chunks of a document could not be rewritten; output keeps their original wording"""
+    
+    def __init__(self, output: str, failed: int, total: int):
+        super().__init__(f"{failed} of {total} passages could not be rewritten and were kept as written.")
+        self.output = output
+        self.failed = failed
+        self.total = total
+
+
 class WatsonxLLMService:
     """IBM Watsonx Granite LLM service integration"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[RewriteCache] = None):
         self.api_key = Config.WATSONX_API_KEY
         self.project_id = Config.WATSONX_PROJECT_ID
         self.base_url = Config.WATSONX_URL
         self.access_token = None
+        self.token_manager = get_token_manager(self.api_key) if self.api_key else None
+        self.cache = cache
+        self.token_estimator = TokenEstimator()
+        self.transport = get_transport()
+        # Generation requests in flight, shared by every document and chunk being rewritten
+        self._request_slots = threading.BoundedSemaphore(max(1, Config.LLM_MAX_WORKERS))
         self._get_access_token()
+        self._initialize_cache()
+    
+    def _initialize_cache(self):
+        """Attach the persistent rewrite cache unless disabled or unusable"""
+        if self.cache is not None or not Config.REWRITE_CACHE_ENABLED:
+            return
+        try:
+            self.cache = RewriteCache()
+        except Exception as e:
+            st.warning(f"Rewrite cache disabled: {str(e)}")
+            self.cache = None
     
     def _get_access_token(self):
-        """Get access token for Watsonx API"""
+        """Get access token for Watsonx API (shared, cached and refreshed by the token manager)"""
         try:
             if not self.api_key:
                 raise ValueError("Watsonx API key not found in configuration")
 
-            token_url = "https://iam.cloud.ibm.com/identity/token"
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
-            data = {
-                "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
-                "apikey": self.api_key
-            }
-
-            response = requests.post(token_url, headers=headers, data=data, timeout=15)
-            # If unauthorized or other error, try to surface the reason
-            try:
-                response.raise_for_status()
-            except Exception:
-                details = None
-                try:
-                    details = response.json()
-                except Exception:
-                    details = response.text
-                st.error(f"Failed to get Watsonx access token: HTTP {response.status_code} - {details}")
-                self.access_token = None
-                return
-
-            token_data = response.json()
-            self.access_token = token_data.get("access_token")
+            self.access_token = self.token_manager.get_token()
 
         except Exception as e:
             st.error(f"Failed to get Watsonx access token: {str(e)}")
             self.access_token = None
+        return self.access_token
+    
+    def _post(self, url: str, payload: dict, stream: bool = False) -> requests.Response:
+        """POST to Watsonx with a current token, retrying once with a fresh token on HTTP 401"""
+        for attempt in range(2):
+            token = self.token_manager.get_token()
+            headers = {
+                "Accept": "text/event-stream" if stream else "application/json",
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {token}"
+            }
+            response = self.transport.post(url, headers=headers, json=payload, stream=stream,
+                                           timeout=(Config.REQUEST_TIMEOUT, Config.LLM_READ_TIMEOUT))
+            if response.status_code != 401 or attempt:
+                break
+            response.close()
+            # Token revoked or expired early: drop it everywhere and fetch a new one
+            self.token_manager.invalidate(token)
+        self.access_token = token
+        response.raise_for_status()
+        return response
     
     def _get_tone_prompt(self, tone: str, text: str) -> str:
         """Generate appropriate prompt based on selected tone"""
@@ -80,13 +114,24 @@ class WatsonxLLMService:
         
         return tone_prompts.get(tone, tone_prompts['Neutral'])
     
-    def rewrite_text(self, text: str, tone: str = 'Neutral') -> str:
+    def _get_chunk_prompt(self, tone: str, text: str, context: str = '') -> str:
+        """Tone prompt for one chunk of a longer text, with the preceding passage as context"""
+        prompt = self._get_tone_prompt(tone, text)
+        if not context:
+            return prompt
+        return (f"Preceding passage, for continuity only (do not rewrite or repeat it): {context}\n\n"
+                f"{prompt}")
+    
+    def rewrite_text(self, text: str, tone: str = 'Neutral', chunked: Optional[bool] = None) -> str:
         """
         Rewrite text using Watsonx Granite LLM with specified tone
         
         Args:
             text (str): Original text to rewrite
             tone (str): Tone to apply ('Neutral', 'Suspenseful', 'Inspiring')
+            chunked (bool): Split the text by paragraph and rewrite the chunks concurrently.
+                Defaults to chunking only texts over the chunk token budget; with False,
+                texts too long for the model context are rejected without calling the API.
             
         Returns:
             str: Rewritten text in specified tone
@@ -95,49 +140,297 @@ class WatsonxLLMService:
             raise Exception("Watsonx service not properly initialized")
         
         try:
-            # Prepare the prompt
-            prompt = self._get_tone_prompt(tone, text)
-            
-            # API endpoint for text generation (current path format)
-            url = f"{self.base_url}/ml/v1/text/generation?version=2023-05-29"
-            
-            headers = {
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.access_token}"
-            }
+            return self._rewrite(text, tone, chunked)
+        
+        except PartialRewriteError as e:
+            st.warning(str(e))
+            return e.output
+                
+        except Exception as e:
+            st.error(f"Error rewriting text with Watsonx: {str(e)}")
+            # Return original text as fallback
+            return text
+    
+    def rewrite_many(self, texts: List[str], tone: str = 'Neutral', max_workers: Optional[int] = None,
+                     on_progress=None) -> List[str]:
+        """
+        Rewrite several documents concurrently
+        
+        Args:
+            texts (list): Documents to rewrite
+            tone (str): Tone to apply to every document
+            max_workers (int): Maximum documents in flight (default: Config.LLM_BATCH_WORKERS)
+            on_progress: Called as on_progress(done, total, index, error) after each document
             
-            # Request payload
-            payload = {
-                "input": prompt,
-                "parameters": {
-                    "decoding_method": "greedy",
-                    "max_new_tokens": 500,
-                    "min_new_tokens": 50,
-                    "stop_sequences": [],
-                    "repetition_penalty": 1.1
-                },
-                "model_id": "ibm/granite-13b-chat-v2",
-                "project_id": self.project_id
-            }
+        Returns:
+            list: Rewritten documents in input order. A document whose rewrite failed is returned unchanged;
+                one rewritten only in part is reported to on_progress as a PartialRewriteError and keeps
+                the original wording of the failed passages
+        
+        Documents and their chunks share the service's LLM_MAX_WORKERS request slots, so no more
+        generation requests are in flight however many documents are rewritten at once.
+        """
+        if not self.access_token:
+            raise Exception("Watsonx service not properly initialized")
+        
+        results = map_isolated(
+            lambda text: self._rewrite(text, tone),
+            texts,
+            max_workers or Config.LLM_BATCH_WORKERS,
+            on_progress,
+        )
+        return [
+            output if error is None else getattr(error, 'output', text)
+            for text, (output, error) in zip(texts, results)
+        ]
+    
+    def _rewrite(self, text: str, tone: str, chunked: Optional[bool] = None) -> str:
+        """Rewrite one document, served from the cache when possible; raises on failure
+
+        Raises PartialRewriteError when only some chunks could be rewritten
+        """
+        chunks = self._split(text, tone) if chunked is not False else []
+        key = self._cache_key(text, tone, len(chunks) > 1)
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            return cached
+        
+        if len(chunks) > 1:
+            output, failed = self._rewrite_chunks(chunks, tone)
+        else:
+            output, failed = self._generate(self._get_tone_prompt(tone, text), text), 0
+        # Partially failed rewrites keep original passages; never cache those
+        if failed:
+            raise PartialRewriteError(output, failed, len(chunks))
+        if key:
+            self.cache.put(key, output)
+        return output
+    
+    def _cache_key(self, text: str, tone: str, chunked: bool) -> Optional[str]:
+        """Rewrite cache key covering model, prompt templates, decoding parameters and text"""
+        if self.cache is None:
+            return None
+        payload = self._payload('')
+        templates = [lambda t: self._get_tone_prompt(tone, t)]
+        params = dict(payload['parameters'])
+        # Generation lengths follow the input; key on the budget settings rather than calibrated estimates
+        del params['max_new_tokens'], params['min_new_tokens']
+        params['token_budget'] = [Config.LLM_OUTPUT_RATIO, Config.LLM_OUTPUT_MARGIN,
+                                  Config.LLM_MIN_NEW_TOKENS, Config.LLM_MAX_NEW_TOKENS]
+        if chunked:
+            templates.append(lambda t: self._get_chunk_prompt(tone, t, t))
+            params['chunking'] = [Config.LLM_CHUNK_TOKENS, Config.LLM_CHUNK_OVERLAP_CHARS]
+        return self.cache.make_key('watsonx', payload['model_id'], RewriteCache.template_version(*templates),
+                                   params, text)
+    
+    def get_cache_stats(self) -> dict:
+        """Get rewrite cache hit/miss counters (empty if caching is disabled)"""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def get_token_stats(self) -> dict:
+        """Get estimated vs actual token counts of recent requests"""
+        return self.token_estimator.stats()
+    
+    def rewrite_text_stream(self, text: str, tone: str = 'Neutral', chunked: Optional[bool] = None) -> Iterator[str]:
+        """
+        Rewrite text like rewrite_text, yielding the rewrite as it is generated
+        
+        The first (or only) chunk is streamed token by token; with chunking, the
+        remaining chunks are generated concurrently meanwhile and follow in order.
+        
+        Args:
+            text (str): Original text to rewrite
+            tone (str): Tone to apply ('Neutral', 'Suspenseful', 'Inspiring')
+            chunked (bool): Split long texts as rewrite_text does
             
-            # Make the request
-            response = requests.post(url, headers=headers, json=payload)
-            response.raise_for_status()
+        Yields:
+            str: Consecutive pieces of the rewritten text. If the rewrite fails before producing
+                anything the original text is yielded instead; a failure after that is raised
+        """
+        if not self.access_token:
+            raise Exception("Watsonx service not properly initialized")
+        
+        produced = False
+        try:
+            chunks = self._split(text, tone) if chunked is not False else []
+            key = self._cache_key(text, tone, len(chunks) > 1)
+            cached = self.cache.get(key) if key else None
+            if cached is not None:
+                produced = True
+                yield cached
+                return
             
-            # Parse response
-            result = response.json()
+            parts = []
+            failed = 0
+            if len(chunks) <= 1:
+                for piece in self._generate_stream(self._get_tone_prompt(tone, text), text):
+                    produced = True
+                    parts.append(piece)
+                    yield piece
+                if key:
+                    self.cache.put(key, "".join(parts).strip())
+                return
             
-            if 'results' in result and len(result['results']) > 0:
-                generated_text = result['results'][0]['generated_text'].strip()
-                return generated_text
-            else:
-                raise Exception("No text generated from Watsonx API")
+            prompts = self._chunk_prompts(chunks, tone)
+            workers = max(1, min(Config.LLM_MAX_WORKERS, len(prompts) - 1))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='watsonx-rewrite') as pool:
+                futures = [pool.submit(self._generate, prompt, chunk)
+                           for prompt, (chunk, _separator) in zip(prompts[1:], chunks[1:])]
+                try:
+                    for piece in self._generate_stream(prompts[0], chunks[0][0]):
+                        produced = True
+                        parts.append(piece)
+                        yield piece
+                    for (chunk, separator), future in zip(chunks[1:], futures):
+                        try:
+                            rewritten = future.result()
+                        except Exception:
+                            rewritten = chunk
+                            failed += 1
+                        parts.append(f"{separator}{rewritten}")
+                        yield parts[-1]
+                finally:
+                    # Consumer stopped early: drop chunks not started yet
+                    for future in futures:
+                        future.cancel()
+            if failed:
+                st.warning(f"{failed} of {len(chunks)} passages could not be rewritten and were kept as written.")
+            elif key:
+                self.cache.put(key, "".join(parts).strip())
                 
         except Exception as e:
+            if produced:
+                # Part of the rewrite is already out; ending quietly would pass it off as complete
+                raise
             st.error(f"Error rewriting text with Watsonx: {str(e)}")
-            # Return original text as fallback
-            return text
+            # Original text as fallback
+            yield text
+    
+    def _chunk_prompts(self, chunks: list, tone: str) -> list:
+        return [
+            self._get_chunk_prompt(tone, chunk, self._overlap(chunks[i - 1][0]) if i else '')
+            for i, (chunk, _separator) in enumerate(chunks)
+        ]
+    
+    def _rewrite_chunks(self, chunks: list, tone: str) -> tuple:
+        """Rewrite (chunk, separator) pairs concurrently; returns (stitched text, failed chunk count)"""
+        prompts = self._chunk_prompts(chunks, tone)
+        workers = max(1, min(Config.LLM_MAX_WORKERS, len(prompts)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='watsonx-rewrite') as pool:
+            futures = [pool.submit(self._generate, prompt, chunk) for prompt, (chunk, _separator) in zip(prompts, chunks)]
+
+        parts = []
+        failed = 0
+        for (chunk, separator), future in zip(chunks, futures):
+            try:
+                rewritten = future.result()
+            except Exception:
+                # Keep the original wording for this chunk rather than losing the whole rewrite
+                rewritten = chunk
+                failed += 1
+            parts.append(f"{separator}{rewritten}")
+        return "".join(parts), failed
+    
+    def _overlap(self, previous_chunk: str) -> str:
+        """The last sentences of the previous chunk, up to the overlap budget"""
+        tail = []
+        size = 0
+        for sentence in reversed(split_sentences(previous_chunk.split('\n\n')[-1])):
+            if tail and size + len(sentence) > Config.LLM_CHUNK_OVERLAP_CHARS:
+                break
+            tail.insert(0, sentence)
+            size += len(sentence) + 1
+        return " ".join(tail)
+    
+    def _split(self, text: str, tone: str) -> list:
+        """Split text into (chunk, separator) pairs that fit the chunk and context token budgets"""
+        # Prompt wording plus the continuity passage carried into every chunk prompt
+        overhead = self.token_estimator.count(self._get_chunk_prompt(tone, '', 'x' * Config.LLM_CHUNK_OVERLAP_CHARS))
+        max_tokens = min(Config.LLM_CHUNK_TOKENS, self.token_estimator.max_input_tokens(overhead))
+        return chunk_paragraphs(text, self.token_estimator.chars_for(max_tokens))
+    
+    def _budget(self, prompt: str, text: str) -> tuple:
+        """Token estimates (prompt, text, max_new_tokens) of a request; raises before calling the API when over budget"""
+        prompt_tokens = self.token_estimator.count(prompt)
+        text_tokens = self.token_estimator.count(text)
+        max_new_tokens = self.token_estimator.max_new_tokens(text_tokens)
+        if prompt_tokens + max_new_tokens > Config.LLM_CONTEXT_TOKENS:
+            raise ValueError(
+                f"Text too long for one request: ~{prompt_tokens} prompt + {max_new_tokens} output tokens "
+                f"exceed the {Config.LLM_CONTEXT_TOKENS}-token context; shorten it or enable chunking"
+            )
+        return prompt_tokens, text_tokens, max_new_tokens
+    
+    def _record(self, prompt: str, budget: tuple, result: dict):
+        """Feed the token counts reported by the API back into the estimator"""
+        self.token_estimator.record(prompt, budget[0], result.get('input_token_count'),
+                                    budget[1], result.get('generated_token_count'))
+    
+    def _payload(self, prompt: str, text_tokens: int = 0) -> dict:
+        return {
+            "input": prompt,
+            "parameters": {
+                "decoding_method": "greedy",
+                "max_new_tokens": self.token_estimator.max_new_tokens(text_tokens),
+                "min_new_tokens": self.token_estimator.min_new_tokens(text_tokens),
+                "stop_sequences": [],
+                "repetition_penalty": 1.1
+            },
+            "model_id": "ibm/granite-13b-chat-v2",
+            "project_id": self.project_id
+        }
+    
+    def _generate(self, prompt: str, text: str) -> str:
+        """Run one text generation request for the prompt rewriting text and return the generated text"""
+        budget = self._budget(prompt, text)
+        # API endpoint for text generation (current path format)
+        url = f"{self.base_url}/ml/v1/text/generation?version=2023-05-29"
+        
+        # Make the request
+        with self._request_slots:
+            response = self._post(url, self._payload(prompt, budget[1]))
+            
+            # Parse response
+            result = response.json()
+        
+        if 'results' in result and len(result['results']) > 0:
+            self._record(prompt, budget, result['results'][0])
+            return result['results'][0]['generated_text'].strip()
+        raise Exception("No text generated from Watsonx API")
+    
+    def _generate_stream(self, prompt: str, text: str) -> Iterator[str]:
+        """Run one streaming generation request, yielding text as server-sent events arrive"""
+        budget = self._budget(prompt, text)
+        url = f"{self.base_url}/ml/v1/text/generation_stream?version=2023-05-29"
+        # The request slot is held until the stream is read to the end or closed
+        with self._request_slots:
+            response = self._post(url, self._payload(prompt, budget[1]), stream=True)
+            counts = {}
+            # Event streams are UTF-8 but usually come without a charset, which requests reads as ISO-8859-1
+            response.encoding = 'utf-8'
+            try:
+                leading = True
+                # chunk_size=None hands over bytes as they arrive instead of waiting for full blocks
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    # SSE: only "data:" lines carry results; ids, event names and keep-alives are skipped
+                    if not line or not line.startswith('data:'):
+                        continue
+                    event = json.loads(line[5:].strip() or '{}')
+                    if event.get('errors'):
+                        raise Exception(f"Watsonx stream error: {event['errors']}")
+                    for result in event.get('results') or []:
+                        # Token counts are cumulative; the last event carries the totals
+                        counts.update({k: result[k] for k in ('input_token_count', 'generated_token_count') if result.get(k)})
+                        piece = result.get('generated_text') or ''
+                        if leading:
+                            # Match rewrite_text, which strips the generated text
+                            piece = piece.lstrip()
+                            leading = not piece
+                        if piece:
+                            yield piece
+                self._record(prompt, budget, counts)
+            finally:
+                response.close()
     
     def is_service_available(self) -> bool:
         """Check if the service is properly initialized"""
@@ -0,0 +1,99 @@
+"""Stand-ins for remote services used by the unit tests"""
+from concurrent.futures import CancelledError
+from types import SimpleNamespace
+
+# One MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, 417 bytes, 1152 samples
+MP3_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def fake_mp3(frames: int) -> bytes:
+    return MP3_FRAME * frames
+
+
+class FakeTTS:
+    """Synthesizes one MP3 frame per character and records which texts were requested"""
+
+    accept = 'audio/mp3'
+
+    def __init__(self):
+        self.requests = []
+
+    def iter_segments(self, texts, voice='Lisa'):
+        for text in texts:
+            self.requests.append(text)
+            yield fake_mp3(len(text))
+
+    def get_word_timings(self, text, voice='Lisa'):
+        return None
+
+
+class FakeSpaceJob:
+    """A gradio Job that finishes when the test says so"""
+
+    def __init__(self, text):
+        self.text = text
+        self.streamed = []
+        self.rank = None
+        self.code = 'IN_QUEUE'
+        self.cancelled = False
+        self._done = False
+        self._output = None
+        self._error = None
+
+    def finish(self, output=None, error=None):
+        self._output, self._error, self._done = output, error, True
+        self.code = 'FINISHED'
+
+    def done(self):
+        return self._done
+
+    def result(self, timeout=None):
+        if not self._done:
+            raise TimeoutError("job still running")
+        if self._error is not None:
+            raise self._error
+        return self._output
+
+    def outputs(self):
+        return list(self.streamed) + ([self._output] if self._done and self._output is not None else [])
+
+    def status(self):
+        return SimpleNamespace(code=self.code, rank=self.rank, queue_size=3 if self.rank is not None else None,
+                               eta=None)
+
+    def cancel(self):
+        self.cancelled = True
+        self.finish(error=CancelledError())
+        return True
+
+
+class FakeSpace:
+    """A _SpaceClient whose submissions finish as scripted: a string, an exception, or None (left running)
+
+    submit_errors maps a submission's number (0 for the first) to the exception submit() raises instead
+    """
+
+    def __init__(self, outcomes=None, submit_errors=None):
+        self.outcomes = list(outcomes or [])
+        self.submit_errors = dict(submit_errors or {})
+        self.submissions = 0
+        self.jobs = []
+        self.refreshes = 0
+
+    def submit(self, text, tone):
+        self.submissions += 1
+        if self.submissions - 1 in self.submit_errors:
+            raise self.submit_errors[self.submissions - 1]
+        job = FakeSpaceJob(text)
+        self.jobs.append(job)
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if isinstance(outcome, Exception):
+            job.finish(error=outcome)
+        elif outcome is not None:
+            job.finish(outcome)
+        return job
+
+    def refresh_endpoint(self):
+        self.refreshes += 1
+        return False
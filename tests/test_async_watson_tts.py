@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from ibm_cloud_sdk_core.authenticators import NoAuthAuthenticator
+
+from config import Config
+from services.audio_cache import AudioCache
+from services.async_watson_tts import AsyncWatsonTTSService
+from tests.fakes import fake_mp3
+
+
+async def _serve(statuses):
+    """A fake synthesize endpoint answering with the given statuses, then 200"""
+    requests = []
+
+    async def synthesize(request):
+        body = await request.json()
+        requests.append(body['text'])
+        status = statuses.pop(0) if statuses else 200
+        if status != 200:
+            return web.Response(status=status, text="busy", headers={'Retry-After': '0'})
+        return web.Response(body=fake_mp3(len(body['text'])))
+
+    app = web.Application()
+    app.router.add_post('/v1/synthesize', synthesize)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", requests
+
+
+def _service(url, cache=None):
+    return AsyncWatsonTTSService(service_url=url, authenticator=NoAuthAuthenticator(), cache=cache,
+                                 accept='audio/mp3')
+
+
+def test_refused_requests_are_retried(monkeypatch):
+    monkeypatch.setattr(Config, 'REQUEST_RETRIES', 2)
+
+    async def run():
+        runner, url, requests = await _serve([429, 503])
+        try:
+            async with _service(url) as service:
+                assert await service.synthesize_speech("Hi.") == fake_mp3(3)
+        finally:
+            await runner.cleanup()
+        return requests
+
+    assert asyncio.run(run()) == ["Hi."] * 3
+
+
+def test_server_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(Config, 'REQUEST_RETRIES', 2)
+
+    async def run():
+        runner, url, requests = await _serve([500])
+        try:
+            async with _service(url) as service:
+                with pytest.raises(Exception, match="500"):
+                    await service.synthesize_speech("Hi.")
+        finally:
+            await runner.cleanup()
+        return requests
+
+    assert asyncio.run(run()) == ["Hi."]
+
+
+def test_cached_chunks_skip_the_network(tmp_path):
+    cache = AudioCache(cache_dir=str(tmp_path))
+
+    async def run():
+        runner, url, requests = await _serve([])
+        try:
+            async with _service(url, cache) as service:
+                await service.synthesize_speech("Hi.")
+                await service.synthesize_speech("Hi.")
+        finally:
+            await runner.cleanup()
+        return requests
+
+    assert asyncio.run(run()) == ["Hi."]
+
+
+def test_session_of_a_finished_loop_is_closed_and_replaced():
+    service = _service('http://127.0.0.1:9')
+
+    async def session():
+        return await service._get_session()
+
+    first = asyncio.run(session())
+    second = asyncio.run(session())
+    assert first.closed
+    assert second is not first
@@ -0,0 +1,52 @@
+from services.audio_cache import AudioCache
+
+
+def test_make_key_normalizes_whitespace_and_url():
+    a = AudioCache.make_key("Hello   world\n", "en-US_LisaV3Voice", "audio/mp3", "https://tts.example/")
+    b = AudioCache.make_key("Hello world", "en-US_LisaV3Voice", "audio/mp3", "https://tts.example")
+    assert a == b
+    assert a != AudioCache.make_key("Hello world", "en-US_MichaelV3Voice", "audio/mp3", "https://tts.example")
+
+
+def test_put_get_and_stats(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=1000)
+    key = AudioCache.make_key("text", "voice", "audio/mp3", "url")
+    assert cache.get(key) is None
+    cache.put(key, b"audio")
+    assert cache.get(key) == b"audio"
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries'], stats['bytes']) == (1, 1, 1, 5)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=10)
+    cache.put("a" * 64, b"1234")
+    cache.put("b" * 64, b"1234")
+    cache.get("a" * 64)  # now b is the oldest
+    cache.put("c" * 64, b"1234")
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) == b"1234"
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_survive_a_restart(tmp_path):
+    AudioCache(str(tmp_path), max_bytes=100).put("d" * 64, b"data")
+    reopened = AudioCache(str(tmp_path), max_bytes=100)
+    assert reopened.stats()['entries'] == 1
+    assert reopened.get("d" * 64) == b"data"
+
+
+def test_oversized_entries_are_not_stored(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=3)
+    cache.put("e" * 64, b"toolong")
+    assert cache.get("e" * 64) is None
+
+
+def test_meta_sidecar_and_clear(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=100)
+    cache.put("f" * 64, b"audio")
+    cache.put_meta("f" * 64, {"words": [["Hi", 0.0, 0.2]]})
+    assert cache.get_meta("f" * 64) == {"words": [["Hi", 0.0, 0.2]]}
+    cache.clear()
+    assert cache.get("f" * 64) is None
+    assert cache.get_meta("f" * 64) is None
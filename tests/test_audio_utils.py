@@ -0,0 +1,117 @@
+import pytest
+
+from services.audio_utils import (
+    AudioJoiner,
+    _ogg_crc,
+    _ogg_page,
+    _ogg_pages,
+    audio_duration,
+    join_audio,
+    join_mp3,
+    mp3_duration,
+    opus_packet_samples,
+)
+from tests.fakes import MP3_FRAME, MP3_FRAME_SECONDS, fake_mp3
+
+OPUS = 'audio/ogg;codecs=opus'
+PRE_SKIP = 312
+# CELT, 20 ms, one frame per packet: 960 samples
+OPUS_PACKET = b'\xf8' + b'\x00' * 20
+
+
+def fake_opus(serial: int, packets: int, trim: int = 0, per_page: int = 2) -> bytes:
+    """An Ogg Opus file as Watson sends it: OpusHead, OpusTags, then audio pages"""
+    head = b'OpusHead\x01\x01' + PRE_SKIP.to_bytes(2, 'little') + (48000).to_bytes(4, 'little') + b'\x00\x00\x00'
+    tags = b'OpusTags' + (4).to_bytes(4, 'little') + b'test' + (0).to_bytes(4, 'little')
+    pages = [_ogg_page(0x02, 0, serial, 0, bytes([len(head)]), head),
+             _ogg_page(0x00, 0, serial, 1, bytes([len(tags)]), tags)]
+    done = 0
+    while done < packets:
+        count = min(per_page, packets - done)
+        done += count
+        last = done == packets
+        granule = done * 960 - (trim if last else 0)
+        pages.append(_ogg_page(0x04 if last else 0x00, granule, serial, len(pages),
+                               bytes([len(OPUS_PACKET)] * count), OPUS_PACKET * count))
+    return b''.join(pages)
+
+
+def fake_wav(samples: int, rate: int = 16000) -> bytes:
+    fmt = (1).to_bytes(2, 'little') + (1).to_bytes(2, 'little') + rate.to_bytes(4, 'little') \
+        + (rate * 2).to_bytes(4, 'little') + (2).to_bytes(2, 'little') + (16).to_bytes(2, 'little')
+    pcm = b'\x01\x00' * samples
+    return (b'RIFF' + (4 + 8 + len(fmt) + 8 + len(pcm)).to_bytes(4, 'little') + b'WAVE'
+            + b'fmt ' + len(fmt).to_bytes(4, 'little') + fmt + b'data' + len(pcm).to_bytes(4, 'little') + pcm)
+
+
+def test_join_mp3_strips_id3_tags_and_keeps_every_frame():
+    tagged = b'ID3\x03\x00\x00\x00\x00\x00\x0a' + b'\x00' * 10 + fake_mp3(2)
+    joined = join_mp3([tagged, fake_mp3(3)])
+    assert joined == fake_mp3(5)
+    assert mp3_duration(joined) == pytest.approx(5 * MP3_FRAME_SECONDS)
+
+
+def test_mp3_joiner_tracks_duration():
+    joiner = AudioJoiner('audio/mp3')
+    assert joiner.add(fake_mp3(2)) + joiner.add(fake_mp3(1)) + joiner.finish() == MP3_FRAME * 3
+    assert joiner.duration == pytest.approx(3 * MP3_FRAME_SECONDS)
+
+
+def test_opus_packet_samples_reads_the_toc_byte():
+    assert opus_packet_samples(b'\xf8') == 960       # CELT 20 ms, one frame
+    assert opus_packet_samples(b'\x09') == 2 * 960   # SILK 20 ms, two frames
+    assert opus_packet_samples(b'\x7b\x03') == 3 * 960  # Hybrid 20 ms, code 3 with three frames
+
+
+def test_ogg_opus_segments_become_one_logical_stream():
+    joined = join_audio([fake_opus(11, 3), fake_opus(22, 4), fake_opus(33, 2, trim=100)], OPUS)
+    pages = list(_ogg_pages(joined))
+
+    assert {serial for _type, _granule, serial, _lacing, _body in pages} == {11}
+    bodies = [body for _type, _granule, _serial, _lacing, body in pages]
+    assert sum(body.startswith(b'OpusHead') for body in bodies) == 1
+    assert sum(body.startswith(b'OpusTags') for body in bodies) == 1
+    assert [header_type & 0x02 for header_type, *_rest in pages] == [0x02] + [0] * (len(pages) - 1)
+    assert [header_type & 0x04 for header_type, *_rest in pages] == [0] * (len(pages) - 1) + [0x04]
+
+    # Granules grow with every packet across segments; the final one keeps the end trimming
+    granules = [granule for _type, granule, *_rest in pages[2:]]
+    assert granules == sorted(granules)
+    assert granules[-1] == 9 * 960 - 100
+
+    # Sequence numbers and CRCs are rewritten
+    pos = 0
+    for sequence in range(len(pages)):
+        segments = joined[pos + 26]
+        length = 27 + segments + sum(joined[pos + 27:pos + 27 + segments])
+        page = joined[pos:pos + length]
+        assert int.from_bytes(page[18:22], 'little') == sequence
+        assert int.from_bytes(page[22:26], 'little') == _ogg_crc(page[:22] + b'\x00' * 4 + page[26:])
+        pos += length
+    assert pos == len(joined)
+
+
+def test_ogg_joiner_holds_back_the_last_page_until_finish():
+    joiner = AudioJoiner(OPUS)
+    first = joiner.add(fake_opus(11, 4))
+    assert not any(header_type & 0x04 for header_type, *_rest in _ogg_pages(first))
+    tail = joiner.finish()
+    assert [header_type & 0x04 for header_type, *_rest in _ogg_pages(tail)] == [0x04]
+    assert audio_duration(first + tail, OPUS) == pytest.approx((4 * 960 - PRE_SKIP) / 48000)
+    assert joiner.duration == pytest.approx((4 * 960 - PRE_SKIP) / 48000)
+
+
+def test_wav_segments_share_one_header_with_exact_sizes():
+    joined = join_audio([fake_wav(100), fake_wav(50)], 'audio/wav')
+    assert joined.count(b'RIFF') == 1
+    assert int.from_bytes(joined[4:8], 'little') == len(joined) - 8
+    assert audio_duration(joined, 'audio/wav') == pytest.approx(150 / 16000)
+
+
+def test_formats_without_a_join_reject_a_second_segment():
+    joiner = AudioJoiner('audio/flac')
+    joiner.add(b'fLaC-first')
+    with pytest.raises(ValueError):
+        joiner.add(b'fLaC-second')
+    # A single segment passes through untouched
+    assert join_audio([b'fLaC-only'], 'audio/flac') == b'fLaC-only'
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from services.frame_index import FrameIndex
+from tests.fakes import MP3_FRAME, MP3_FRAME_SECONDS, fake_mp3
+
+FRAME_LEN = len(MP3_FRAME)
+# Main data bytes per frame: frame minus header and MPEG-1 stereo side information
+MAIN_DATA = FRAME_LEN - 4 - 32
+
+
+def _frame_with_reservoir(main_data_begin: int) -> bytes:
+    """A frame whose main data starts main_data_begin bytes back, in earlier frames"""
+    side = bytes([main_data_begin >> 1, (main_data_begin & 1) << 7])
+    return MP3_FRAME[:4] + side + MP3_FRAME[6:]
+
+
+def test_build_indexes_every_frame_and_skips_tags():
+    data = b'ID3\x03\x00\x00\x00\x00\x00\x0a' + b'\x00' * 10 + fake_mp3(5) + b'TAG' + b'\x00' * 125
+    index = FrameIndex.build(data)
+    assert len(index) == 5
+    assert index.offsets[0] == 20
+    assert index.offsets[-1] == 20 + 5 * FRAME_LEN
+    assert index.duration == pytest.approx(5 * MP3_FRAME_SECONDS)
+
+
+def test_time_and_byte_lookups():
+    index = FrameIndex.build(fake_mp3(10))
+    assert index.frame_at(3.5 * MP3_FRAME_SECONDS) == 3
+    assert index.byte_at(3.5 * MP3_FRAME_SECONDS) == 3 * FRAME_LEN
+    assert index.frame_at(1000) == 9
+    assert index.time_at_byte(3 * FRAME_LEN + 10) == pytest.approx(3 * MP3_FRAME_SECONDS)
+
+
+def test_slice_copies_whole_frames():
+    data = fake_mp3(10)
+    index = FrameIndex.build(data)
+    part = index.slice(data, 2 * MP3_FRAME_SECONDS, 4.5 * MP3_FRAME_SECONDS)
+    assert part == fake_mp3(3)
+    assert index.slice(data, 5 * MP3_FRAME_SECONDS, 5 * MP3_FRAME_SECONDS - 1) == b''
+
+
+def test_slice_includes_the_frames_holding_the_bit_reservoir():
+    data = fake_mp3(5) + _frame_with_reservoir(MAIN_DATA + 10) + fake_mp3(2)
+    index = FrameIndex.build(data)
+    part = index.slice(data, 5 * MP3_FRAME_SECONDS)
+    # Two earlier frames are needed to cover MAIN_DATA + 10 reservoir bytes
+    assert len(part) == 5 * FRAME_LEN
+    assert part[2 * FRAME_LEN:2 * FRAME_LEN + 6] == _frame_with_reservoir(MAIN_DATA + 10)[:6]
+
+
+def test_for_file_saves_and_rebuilds_stale_indexes(tmp_path):
+    path = str(tmp_path / "book.mp3")
+    with open(path, 'wb') as f:
+        f.write(fake_mp3(4))
+    assert len(FrameIndex.for_file(path)) == 4
+    assert os.path.exists(FrameIndex.path_for(path))
+    assert len(FrameIndex.for_file(path)) == 4
+
+    with open(path, 'ab') as f:
+        f.write(fake_mp3(2))
+    assert len(FrameIndex.for_file(path)) == 6
+
+
+def test_round_trips_through_bytes():
+    index = FrameIndex.build(fake_mp3(3))
+    restored = FrameIndex.from_bytes(index.to_bytes())
+    assert list(restored.offsets) == list(index.offsets)
+    assert (restored.sample_rate, restored.samples_per_frame) == (44100, 1152)
+    with pytest.raises(ValueError):
+        FrameIndex.from_bytes(b"nope")
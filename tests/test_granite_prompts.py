@@ -0,0 +1,17 @@
+from IBM_GraniteHF.prompts import TONE_PROMPTS, audio_friendly_formatting, tone_conversation
+from services.local_granite_llm import LocalGraniteLLMService
+
+
+def test_unknown_tone_falls_back_to_neutral():
+    assert tone_conversation("Hi", "shouty")[0]["content"] == TONE_PROMPTS["neutral"]
+    assert tone_conversation("Hi", "inspiring")[1]["content"] == "Please rewrite this text: Hi"
+
+
+def test_local_backend_uses_the_space_prompts():
+    service = LocalGraniteLLMService.__new__(LocalGraniteLLMService)
+    assert service._get_tone_prompt("Suspenseful", "Hi").startswith(TONE_PROMPTS["suspenseful"])
+
+
+def test_audio_friendly_formatting():
+    assert audio_friendly_formatting("Wait.....Then 3 knocks") == "Wait... Then three knocks."
+    assert audio_friendly_formatting("One,two") == "One, two."
@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from ibm_cloud_sdk_core.authenticators import NoAuthAuthenticator
+
+from config import Config
+from services.hedging import LatencyTracker, hedged_call, size_class
+from services.watson_tts import WatsonTTSService
+
+
+def test_latency_tracker_percentiles_and_window():
+    tracker = LatencyTracker(window=4)
+    assert tracker.percentile(50) is None
+    for seconds in (5.0, 1.0, 2.0, 3.0, 4.0):
+        tracker.record(seconds)
+    assert len(tracker) == 4  # 5.0 fell out of the window
+    assert tracker.percentile(50) == 2.0
+    assert tracker.percentile(100) == 4.0
+
+
+def test_size_class_buckets_by_power_of_two():
+    assert size_class(0) == size_class(256) == 0
+    assert size_class(257) == size_class(512) == 1
+    assert size_class(400) != size_class(1500)
+
+
+def test_hedged_call_returns_fast_primary_without_hedging():
+    hedges = []
+    with ThreadPoolExecutor(2) as pool:
+        assert hedged_call(pool, lambda: "primary", (), 1.0, on_hedge=lambda: hedges.append(1)) == "primary"
+    assert hedges == []
+
+
+def test_hedged_call_duplicate_wins_over_slow_primary():
+    calls = []
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        time.sleep(0.5 if first else 0.01)
+        return "slow" if first else "fast"
+
+    wins = []
+    with ThreadPoolExecutor(2) as pool:
+        assert hedged_call(pool, request, (), 0.05, on_hedge_win=lambda: wins.append(1)) == "fast"
+    assert wins == [1]
+
+
+def test_hedged_call_raises_when_both_attempts_fail():
+    def request():
+        time.sleep(0.05)
+        raise RuntimeError("down")
+
+    with ThreadPoolExecutor(2) as pool:
+        with pytest.raises(RuntimeError):
+            hedged_call(pool, request, (), 0.01)
+
+
+def test_hedge_delay_is_per_size_class(monkeypatch):
+    monkeypatch.setattr(Config, 'TTS_HEDGE_MIN_SAMPLES', 3)
+    service = WatsonTTSService(service_url='http://127.0.0.1:9', authenticator=NoAuthAuthenticator(), cache=None)
+    service.hedge_enabled = True
+    for _ in range(3):
+        service._record_latency(1500, 2.0)
+    assert service._hedge_delay(1500) == 2.0
+    # Short requests are not judged against the long ones
+    assert service._hedge_delay(300) is None
+    for _ in range(3):
+        service._record_latency(300, 0.5)
+    assert service._hedge_delay(300) == 0.5
+    assert service.get_hedge_stats()['hedge_delays'] == {512: 0.5, 2048: 2.0}
@@ -0,0 +1,32 @@
+from services.http_transport import HttpTransport, _retry_policy
+
+
+def test_post_is_retried_only_when_refused():
+    policy = _retry_policy(3, 0.1)
+    assert policy.is_retry('POST', 429)
+    assert policy.is_retry('POST', 503)
+    # The generation may already have run (and been billed)
+    assert not policy.is_retry('POST', 500)
+    assert not policy.is_retry('POST', 504)
+    assert not policy.is_retry('POST', 400)
+
+
+def test_idempotent_methods_retry_server_errors():
+    policy = _retry_policy(3, 0.1)
+    assert policy.is_retry('GET', 502)
+    assert policy.is_retry('GET', 429)
+    assert not policy.is_retry('GET', 404)
+
+
+def test_retries_survive_the_policy_being_incremented():
+    policy = _retry_policy(2, 0.1).increment('POST', 'http://x/', error=None, _pool=None)
+    assert not policy.is_retry('POST', 500)
+    assert policy.is_retry('POST', 429)
+
+
+def test_one_pooled_session_per_host():
+    transport = HttpTransport(pool_size=2, timeout=1, retries=1, backoff=0)
+    first = transport.session('https://api.example.com/v1/a')
+    assert transport.session('https://api.example.com/v2/b') is first
+    assert transport.session('https://other.example.com/') is not first
+    transport.close()
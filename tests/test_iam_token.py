@@ -0,0 +1,91 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import iam_token
+from services.iam_token import IAMTokenError, IAMTokenManager
+
+
+class FakeIAM:
+    """Issues token-1, token-2, ... (or an error status) and counts requests"""
+
+    def __init__(self, status=200, expires_in=3600):
+        self.status = status
+        self.expires_in = expires_in
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        body = {'access_token': f"token-{self.calls}", 'expires_in': self.expires_in}
+        if self.status != 200:
+            body = {'errorMessage': 'Provided API key could not be found'}
+        return SimpleNamespace(status_code=self.status, json=lambda: body, text=str(body))
+
+
+@pytest.fixture
+def iam(monkeypatch):
+    fake = FakeIAM()
+    monkeypatch.setattr(iam_token, 'get_transport', lambda: fake)
+    return fake
+
+
+def _manager(tmp_path):
+    return IAMTokenManager('key', token_url='https://iam.example/token', cache_dir=str(tmp_path))
+
+
+def test_token_is_fetched_once_and_reused(iam, tmp_path):
+    manager = _manager(tmp_path)
+    try:
+        assert manager.get_token() == "token-1"
+        assert manager.get_token() == "token-1"
+        assert iam.calls == 1
+    finally:
+        manager.stop()
+
+
+def test_other_processes_reuse_the_cached_token(iam, tmp_path):
+    first, second = _manager(tmp_path), _manager(tmp_path)
+    try:
+        assert first.get_token() == second.get_token() == "token-1"
+        assert (iam.calls, first.refreshes, second.refreshes) == (1, 1, 0)
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_invalidated_token_is_replaced_everywhere(iam, tmp_path):
+    first, second = _manager(tmp_path), _manager(tmp_path)
+    try:
+        token = first.get_token()
+        first.invalidate(token)
+        assert second._read_cache() is None
+        assert first.get_token() == "token-2"
+        # Invalidating a token that was already replaced changes nothing
+        first.invalidate(token)
+        assert first.get_token() == "token-2"
+    finally:
+        first.stop()
+        second.stop()
+
+
+def test_iam_errors_raise(monkeypatch, tmp_path):
+    monkeypatch.setattr(iam_token, 'get_transport', lambda: FakeIAM(status=400))
+    manager = _manager(tmp_path)
+    with pytest.raises(IAMTokenError, match="400"):
+        manager.get_token()
+
+
+def test_token_is_refreshed_in_the_background_before_expiry(iam, tmp_path, monkeypatch):
+    # Tokens normally refresh after 80% of an hour; here they are due as soon as they are issued
+    monkeypatch.setattr(iam_token, '_REFRESH_FRACTION', 0.0)
+    manager = _manager(tmp_path)
+    try:
+        assert manager.get_token() == "token-1"
+        deadline = time.time() + 5
+        while manager.refreshes < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert manager.refreshes >= 2
+        assert manager.get_token() != "token-1"
+    finally:
+        manager.stop()
@@ -0,0 +1,67 @@
+import sqlite3
+import time
+
+from services.rewrite_cache import RewriteCache
+
+
+def _cache(tmp_path, **kwargs):
+    return RewriteCache(path=str(tmp_path / "rewrites.sqlite3"), **kwargs)
+
+
+def test_put_then_get_and_counters(tmp_path):
+    cache = _cache(tmp_path)
+    key = RewriteCache.make_key('watsonx', 'granite', 'v1', {'max_new_tokens': 100}, "Some text.")
+    assert cache.get(key) is None
+    cache.put(key, "Rewritten text.")
+    assert cache.get(key) == "Rewritten text."
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_entries_are_shared_between_instances(tmp_path):
+    _cache(tmp_path).put("k", "v")
+    assert _cache(tmp_path).get("k") == "v"
+
+
+def test_any_change_to_the_request_changes_the_key():
+    base = ('watsonx', 'granite', 'v1', {'a': 1, 'b': 2}, "Text.")
+    key = RewriteCache.make_key(*base)
+    assert RewriteCache.make_key('watsonx', 'granite', 'v1', {'b': 2, 'a': 1}, "Text.") == key
+    for changed in (('hf',) + base[1:], base[:2] + ('v2',) + base[3:], base[:3] + ({'a': 2, 'b': 2},) + base[4:],
+                    base[:4] + ("Other text.",)):
+        assert RewriteCache.make_key(*changed) != key
+
+
+def test_template_version_follows_the_prompt_wording():
+    version = RewriteCache.template_version(lambda text: f"Rewrite: {text}")
+    assert RewriteCache.template_version(lambda text: f"Rewrite: {text}") == version
+    assert RewriteCache.template_version(lambda text: f"Rewrite this: {text}") != version
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = _cache(tmp_path, ttl=60)
+    cache.put("k", "v")
+    with sqlite3.connect(cache.path) as conn:
+        conn.execute('UPDATE rewrites SET created_at = ?', (time.time() - 120,))
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = _cache(tmp_path, max_entries=2)
+    cache.put("a", "1")
+    time.sleep(0.01)
+    cache.put("b", "2")
+    time.sleep(0.01)
+    assert cache.get("a") == "1"  # "b" is now the least recently used
+    time.sleep(0.01)
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_clear_removes_everything(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("k", "v")
+    cache.clear()
+    assert cache.stats()['entries'] == 0
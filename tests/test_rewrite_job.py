@@ -0,0 +1,152 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from config import Config
+from services import hf_llm
+from services.hf_llm import HuggingFaceLLMService, RewriteJob
+from services.rewrite_cache import RewriteCache
+from tests.fakes import FakeSpace
+
+CHUNKS = [("First part.", ""), ("Second part.", "\n\n"), ("Third part.", " ")]
+
+
+def test_chunks_are_submitted_within_the_in_flight_limit():
+    space = FakeSpace()
+    results = []
+    job = RewriteJob(space, CHUNKS, 'neutral', max_in_flight=2, on_result=results.append)
+    assert [j.text for j in space.jobs] == ["First part.", "Second part."]
+
+    space.jobs[0].finish("One.")
+    assert not job.done()
+    assert len(space.jobs) == 3  # the freed slot went to the third chunk
+    space.jobs[1].finish("Two.")
+    space.jobs[2].finish("Three.")
+    assert job.done()
+    assert job.result() == "One.\n\nTwo. Three."
+    assert results == ["One.\n\nTwo. Three."]
+
+
+def test_a_failed_chunk_is_resubmitted_once():
+    space = FakeSpace([RuntimeError("Space restarted"), "One."])
+    job = RewriteJob(space, CHUNKS[:1], 'neutral')
+    assert job.result() == "One."
+    assert space.refreshes == 1
+    assert len(space.jobs) == 2
+
+
+def test_a_chunk_failing_twice_fails_the_job():
+    space = FakeSpace([RuntimeError("down"), RuntimeError("still down")])
+    job = RewriteJob(space, CHUNKS[:1], 'neutral')
+    with pytest.raises(RuntimeError, match="still down"):
+        job.result()
+    assert job.done()
+    assert job.status()['state'] == 'failed'
+
+
+def test_space_error_text_is_retried_and_never_cached():
+    loading = "Error processing text: The model is still loading, try again shortly."
+    space = FakeSpace([loading, loading])
+    results = []
+    job = RewriteJob(space, CHUNKS[:1], 'neutral', on_result=results.append)
+    with pytest.raises(RuntimeError, match="still loading"):
+        job.result()
+    assert space.refreshes == 1
+    assert job.partial() == ""
+    assert results == []
+
+
+def test_a_chunk_that_cannot_be_submitted_fails_the_job():
+    space = FakeSpace(["One."], submit_errors={1: ConnectionError("Space unreachable")})
+    job = RewriteJob(space, CHUNKS[:2], 'neutral', max_in_flight=1)
+    assert job.done()  # polling does not raise
+    assert job.status()['state'] == 'failed'
+    with pytest.raises(ConnectionError, match="unreachable"):
+        job.result()
+    assert space.refreshes == 0
+
+
+def test_jobs_sharing_slots_stay_within_the_shared_limit():
+    space = FakeSpace()
+    slots = threading.BoundedSemaphore(2)
+    first = RewriteJob(space, CHUNKS, 'neutral', max_in_flight=2, slots=slots)
+    second = RewriteJob(space, CHUNKS, 'neutral', max_in_flight=2, slots=slots)
+    assert len(space.jobs) == 2  # the second document waits for a slot
+    space.jobs[0].finish("One.")
+    assert not first.done()  # the freed slot goes to the first document's third chunk
+    assert not second.done()
+    assert [j.text for j in space.jobs] == ["First part.", "Second part.", "Third part."]
+
+
+def test_a_failed_job_hands_its_shared_slots_back():
+    space = FakeSpace([RuntimeError("down"), None, RuntimeError("still down")])
+    slots = threading.BoundedSemaphore(2)
+    job = RewriteJob(space, CHUNKS, 'neutral', max_in_flight=2, slots=slots)
+    with pytest.raises(RuntimeError, match="still down"):
+        job.result()
+    assert space.jobs[1].cancelled
+    assert job.status()['state'] == 'failed'
+    for _ in range(2):
+        assert slots.acquire(blocking=False)
+
+
+def test_status_reports_queue_position_and_progress():
+    space = FakeSpace()
+    job = RewriteJob(space, CHUNKS[:2], 'neutral', max_in_flight=2)
+    space.jobs[0].rank, space.jobs[1].rank = 4, 5
+    status = job.status()
+    assert (status['state'], status['queue_position'], status['queue_size']) == ('queued', 4, 3)
+
+    space.jobs[0].finish("One.")
+    space.jobs[1].code, space.jobs[1].rank = 'PROCESSING', None
+    status = job.status()
+    assert (status['state'], status['chunks'], status['chunks_done']) == ('running', 2, 1)
+
+    space.jobs[1].finish("Two.")
+    assert job.status()['state'] == 'finished'
+
+
+def test_partial_shows_finished_chunks_then_the_running_one():
+    space = FakeSpace()
+    job = RewriteJob(space, CHUNKS[:2], 'neutral', max_in_flight=2)
+    space.jobs[1].finish("Two.")
+    assert job.partial() == ""  # the first chunk is not done yet
+    space.jobs[0].finish("One.")
+    space.jobs[1].streamed = ["Tw"]
+    assert job.partial() == "One.\n\nTwo."
+
+
+def test_cancel_stops_unfinished_chunks():
+    space = FakeSpace(["One."])
+    job = RewriteJob(space, CHUNKS[:2], 'neutral', max_in_flight=2)
+    assert job.cancel()
+    assert [j.cancelled for j in space.jobs] == [False, True]
+    assert job.done()
+    assert job.status()['state'] == 'cancelled'
+    with pytest.raises(CancelledError):
+        job.result()
+
+
+def test_completed_job_is_finished_and_cannot_be_cancelled():
+    job = RewriteJob.completed("Cached.")
+    assert job.done()
+    assert job.result() == job.partial() == "Cached."
+    assert job.status()['state'] == 'finished'
+    assert not job.cancel()
+
+
+def test_cached_rewrites_are_keyed_on_the_space_revision(monkeypatch, tmp_path):
+    space = FakeSpace(["One.", "Two."])
+    monkeypatch.setattr(hf_llm, 'Client', object)
+    monkeypatch.setattr(hf_llm, 'get_space_client', lambda *args: space)
+    monkeypatch.setattr(Config, 'HUGGINGFACE_TOKEN', 'hf_token')
+    monkeypatch.setattr(Config, 'HF_KEEP_WARM_INTERVAL', 0)
+    service = HuggingFaceLLMService(cache=RewriteCache(path=str(tmp_path / "rewrites.sqlite3")))
+
+    monkeypatch.setattr(Config, 'HF_SPACE_REVISION', 'v1')
+    assert service.submit_rewrite("First part.", 'Neutral').result() == "One."
+    assert service.submit_rewrite("First part.", 'Neutral').result() == "One."
+    monkeypatch.setattr(Config, 'HF_SPACE_REVISION', 'v2')
+    assert service.submit_rewrite("First part.", 'Neutral').result() == "Two."
+    assert len(space.jobs) == 2
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from services.audio_utils import mp3_duration
+from services.segments import SegmentTrack
+from tests.fakes import MP3_FRAME_SECONDS, FakeTTS
+
+TEXT = "First sentence here. Second sentence here. Third sentence here. Fourth sentence here."
+
+
+def _track(tmp_path):
+    # A first render packs two sentences per group; edited sentences go out alone
+    return SegmentTrack(str(tmp_path), max_chars=25, chunk_chars=45)
+
+
+def _render(track, tts, text, voice='Lisa'):
+    return b"".join(track.render(tts, text, voice))
+
+
+def test_first_render_synthesizes_every_group(tmp_path):
+    tts = FakeTTS()
+    track = _track(tmp_path)
+    audio = _render(track, tts, TEXT)
+    assert tts.requests == ["First sentence here. Second sentence here.",
+                            "Third sentence here. Fourth sentence here."]
+    assert (track.last_synthesized, track.last_reused) == (2, 0)
+    assert mp3_duration(audio) == pytest.approx(len("".join(tts.requests)) * MP3_FRAME_SECONDS)
+
+
+def test_editing_one_sentence_only_resynthesizes_its_group(tmp_path):
+    tts = FakeTTS()
+    track = _track(tmp_path)
+    _render(track, tts, TEXT)
+    tts.requests.clear()
+    _render(track, tts, TEXT.replace("Fourth", "Last"))
+    assert tts.requests == ["Third sentence here.", "Last sentence here."]
+    assert (track.last_synthesized, track.last_reused) == (2, 1)
+    # The replaced group's file is deleted
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_edits_to_an_edited_sentence_stay_small(tmp_path):
+    tts = FakeTTS()
+    track = _track(tmp_path)
+    _render(track, tts, TEXT)
+    _render(track, tts, TEXT.replace("Fourth", "Last"))
+    tts.requests.clear()
+    _render(track, tts, TEXT.replace("Fourth", "Final"))
+    assert tts.requests == ["Final sentence here."]
+    assert (track.last_synthesized, track.last_reused) == (1, 2)
+
+
+def test_groups_keep_paragraph_breaks(tmp_path):
+    tts = FakeTTS()
+    _render(_track(tmp_path), tts, "First sentence here.\n\nSecond one.")
+    assert tts.requests == ["First sentence here.\n\nSecond one."]
+
+
+def test_changing_voice_renders_everything_again(tmp_path):
+    tts = FakeTTS()
+    track = _track(tmp_path)
+    _render(track, tts, TEXT)
+    _render(track, tts, TEXT, voice='Michael')
+    assert (track.last_synthesized, track.last_reused) == (2, 0)
+
+
+def test_timing_index_covers_the_render(tmp_path):
+    tts = FakeTTS()
+    track = _track(tmp_path)
+    _render(track, tts, TEXT)
+    second = TEXT.index("Third")
+    assert track.timing_index.time_at(0) == pytest.approx(0.0)
+    assert track.timing_index.time_at(second) == pytest.approx(len(tts.requests[0]) * MP3_FRAME_SECONDS, abs=0.05)
@@ -0,0 +1,43 @@
+import os
+
+from services.spool import sweep_spool
+
+OLD = "a" * 32
+NEW = "b" * 32
+
+
+def _touch(path, mtime):
+    with open(path, 'wb') as f:
+        f.write(b"x")
+    os.utime(path, (mtime, mtime))
+
+
+def test_sweep_removes_only_idle_sessions(tmp_path):
+    now = 1_000_000.0
+    _touch(tmp_path / f"{OLD}.ogg", now - 7200)
+    _touch(tmp_path / f"{OLD}_Lisa.ogg", now - 7200)
+    segments = tmp_path / f"{OLD}_segments"
+    segments.mkdir()
+    _touch(segments / "seg.ogg", now - 7200)
+    os.utime(segments, (now - 7200, now - 7200))
+    _touch(tmp_path / f"{NEW}.ogg", now - 10)
+    (tmp_path / "iam").mkdir()  # not a session entry
+
+    assert sweep_spool(str(tmp_path), ttl=3600, now=now) == 3
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{NEW}.ogg", "iam"])
+
+
+def test_a_recent_file_keeps_the_whole_session(tmp_path):
+    now = 1_000_000.0
+    _touch(tmp_path / f"{OLD}.ogg", now - 7200)
+    segments = tmp_path / f"{OLD}_segments"
+    segments.mkdir()
+    _touch(segments / "seg.ogg", now - 5)
+    os.utime(segments, (now - 7200, now - 7200))
+
+    assert sweep_spool(str(tmp_path), ttl=3600, now=now) == 0
+    assert os.path.exists(tmp_path / f"{OLD}.ogg")
+
+
+def test_missing_directory_is_ignored(tmp_path):
+    assert sweep_spool(str(tmp_path / "missing"), ttl=1) == 0
@@ -0,0 +1,45 @@
+from services.text_chunking import chunk_paragraphs, chunk_text, pack_sentences, split_sentences, text_to_sentences
+
+
+def test_chunks_respect_max_chars():
+    text = "\n\n".join(" ".join(f"Sentence {p}.{i} has a few words." for i in range(12)) for p in range(5))
+    chunks = chunk_text(text, 120)
+    assert chunks
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+
+
+def test_short_paragraphs_share_a_chunk():
+    assert chunk_text("One.\n\nTwo.", 100) == ["One.\n\nTwo."]
+
+
+def test_sentences_are_not_broken_when_they_fit():
+    chunks = chunk_text("First sentence here. Second sentence here.", 25)
+    assert chunks == ["First sentence here.", "Second sentence here."]
+
+
+def test_overlong_word_is_hard_split():
+    assert chunk_text("a" * 50, 10) == ["a" * 10] * 5
+    chunks = chunk_text("hi " + "b" * 25 + " end.", 10)
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == "hi" + "b" * 25 + "end."
+
+
+def test_split_sentences_keeps_closing_quotes():
+    assert split_sentences('He said "stop." Then he left.') == ['He said "stop."', 'Then he left.']
+
+
+def test_text_to_sentences_spans_paragraphs():
+    assert text_to_sentences("A. B.\n\nC!") == ["A.", "B.", "C!"]
+
+
+def test_pack_sentences_groups_up_to_max_chars():
+    assert pack_sentences(["aaaa.", "bbbb.", "cccc."], 11) == [("aaaa.", "bbbb."), ("cccc.",)]
+
+
+def test_chunk_paragraphs_separators_restore_the_text():
+    text = "Short one.\n\n" + " ".join(f"Sentence number {i}." for i in range(20)) + "\n\nLast."
+    chunks = chunk_paragraphs(text, 80)
+    assert all(len(chunk) <= 80 for chunk, _separator in chunks)
+    assert chunks[0][1] == ""
+    assert "".join(f"{separator}{chunk}" for chunk, separator in chunks) == text
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+from ibm_cloud_sdk_core.authenticators import NoAuthAuthenticator
+
+from services.timing_index import TimingIndex, sentence_offsets
+from services.watson_tts import WatsonTTSService
+
+TEXT = "Hello brave new world. Second sentence."
+
+
+def test_add_words_maps_offsets_and_times_both_ways():
+    index = TimingIndex()
+    words = [["Hello", 0.0, 0.4], ["brave", 0.4, 0.8], ["new", 0.8, 1.0], ["world", 1.0, 1.5]]
+    assert index.add_words(TEXT, words) == TEXT.index("world") + len("world")
+    assert index.time_at(TEXT.index("brave") + 2) == pytest.approx(0.4)
+    assert index.offset_at(0.9) == TEXT.index("new")
+    assert index.duration_ms == 1500
+
+
+def test_add_words_skips_words_missing_from_the_text():
+    index = TimingIndex()
+    index.add_words(TEXT, [["Hello", 0.0, 0.4], ["missing", 0.4, 0.6], ["world", 0.6, 1.0]])
+    assert list(index.offsets) == [0, TEXT.index("world")]
+
+
+def test_add_estimate_spreads_words_over_the_duration():
+    index = TimingIndex()
+    start = TEXT.index("Second")
+    index.add_estimate(TEXT, start, len(TEXT), time_shift=2.0, duration=1.0)
+    assert index.time_at(start) == pytest.approx(2.0)
+    assert 2.0 < index.time_at(TEXT.index("sentence")) < 3.0
+    assert index.duration_ms == 3000
+
+
+def test_times_never_go_backwards():
+    index = TimingIndex()
+    index.add(10, 1.0)
+    index.add(5, 2.0)
+    index.add(20, 0.5)
+    assert len(index) == 1
+
+
+def test_round_trips_through_bytes_and_files(tmp_path):
+    index = TimingIndex([0, 6, 12], [0, 400, 800])
+    index.duration_ms = 1200
+    restored = TimingIndex.from_bytes(index.to_bytes())
+    assert list(restored.offsets) == [0, 6, 12]
+    assert list(restored.times_ms) == [0, 400, 800]
+    assert restored.duration_ms == 1200
+
+    path = str(tmp_path / "index.bin")
+    index.save(path)
+    assert list(TimingIndex.load(path).times_ms) == [0, 400, 800]
+    with pytest.raises(ValueError):
+        TimingIndex.from_bytes(b"nope")
+
+
+def test_sentence_offsets_finds_sentences_in_order():
+    assert sentence_offsets(TEXT, ["Hello brave new world.", "Second sentence."]) == [0, TEXT.index("Second")]
+
+
+def test_websocket_failure_turns_word_timings_off():
+    service = WatsonTTSService(service_url='http://127.0.0.1:9', authenticator=NoAuthAuthenticator(), cache=None)
+    service.capture_timings = True
+    attempts = []
+
+    def synthesize_using_websocket(*args, **kwargs):
+        attempts.append(1)
+        raise OSError("connection refused")
+
+    service.text_to_speech = SimpleNamespace(
+        synthesize_using_websocket=synthesize_using_websocket,
+        synthesize=lambda **kwargs: SimpleNamespace(get_result=lambda: SimpleNamespace(content=b"audio")),
+    )
+    assert service._request_chunk("One.", "en-US_LisaV3Voice") == b"audio"
+    assert service._request_chunk("Two.", "en-US_LisaV3Voice") == b"audio"
+    # Only the first chunk paid for the WebSocket attempt
+    assert attempts == [1]
+    assert service.capture_timings is False
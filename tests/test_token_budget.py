@@ -0,0 +1,75 @@
+import pytest
+
+from config import Config
+from services.token_budget import TokenEstimator
+
+
+class FakeTokenizer:
+    """One token per word"""
+
+    def encode(self, text, add_special_tokens=True):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def budget(monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_OUTPUT_RATIO', 1.5)
+    monkeypatch.setattr(Config, 'LLM_OUTPUT_MARGIN', 32)
+    monkeypatch.setattr(Config, 'LLM_MIN_NEW_TOKENS', 64)
+    monkeypatch.setattr(Config, 'LLM_MAX_NEW_TOKENS', 1000)
+    monkeypatch.setattr(Config, 'LLM_CONTEXT_TOKENS', 8192)
+
+
+def _estimator(**kwargs):
+    return TokenEstimator(tokenizer_name='', chars_per_token=4.0, **kwargs)
+
+
+def test_counts_are_estimated_from_characters_without_a_tokenizer():
+    estimator = _estimator()
+    assert not estimator.exact
+    assert estimator.count("x" * 10) == 3
+    assert estimator.count("") == 0
+    assert estimator.chars_for(100) == 400
+
+
+def test_counts_are_exact_with_a_tokenizer():
+    estimator = _estimator(tokenizer=FakeTokenizer())
+    assert estimator.exact
+    assert estimator.count("one two three") == 3
+
+
+def test_max_new_tokens_scales_with_the_input_within_bounds():
+    estimator = _estimator()
+    assert estimator.max_new_tokens(10) == 64
+    assert estimator.max_new_tokens(100) == 182
+    assert estimator.max_new_tokens(5000) == 1000
+
+
+def test_min_new_tokens_never_exceeds_half_the_input():
+    estimator = _estimator()
+    assert estimator.min_new_tokens(10) == 5
+    assert estimator.min_new_tokens(1000) == 64
+
+
+def test_max_input_tokens_leaves_room_for_the_generation():
+    estimator = _estimator()
+    longest = estimator.max_input_tokens(overhead=200, context=2048)
+    assert 200 + longest + estimator.max_new_tokens(longest) <= 2048
+    assert 200 + (longest + 10) + estimator.max_new_tokens(longest + 10) > 2048
+
+
+def test_reported_counts_calibrate_the_estimate():
+    estimator = _estimator()
+    prompt = "x" * 300
+    for _ in range(20):
+        estimator.record(prompt, estimator.count(prompt), actual=100, text_tokens=50, generated=60)
+    assert estimator.chars_per_token == pytest.approx(3.0, abs=0.05)
+    stats = estimator.stats()
+    assert stats['samples'] == 20
+    assert stats['output_ratio'] == pytest.approx(1.2)
+
+
+def test_exact_counts_are_not_recalibrated():
+    estimator = _estimator(tokenizer=FakeTokenizer())
+    estimator.record("one two", 2, actual=5)
+    assert estimator.chars_per_token == 4.0
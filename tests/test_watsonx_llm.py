@@ -0,0 +1,98 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from config import Config
+from services.watsonx_llm import PartialRewriteError, WatsonxLLMService
+
+
+def _event_stream(*pieces) -> requests.Response:
+    """A streamed response as Watsonx sends it: UTF-8 server-sent events without a charset"""
+    events = [f"data: {json.dumps({'results': [{'generated_text': piece}]}, ensure_ascii=False)}\n\n"
+              for piece in pieces]
+    response = requests.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'text/event-stream'
+    response.raw = io.BytesIO("id: 1\n".join(events).encode('utf-8'))
+    # As the requests adapter does: text/* without a charset means ISO-8859-1
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def test_stream_decodes_utf8_events(monkeypatch):
+    monkeypatch.setattr(Config, 'WATSONX_API_KEY', None)
+    monkeypatch.setattr(Config, 'REWRITE_CACHE_ENABLED', False)
+    service = WatsonxLLMService()
+    service._post = lambda url, payload, stream=False: _event_stream(" Café", " — naïve ", "façade")
+    assert "".join(service._generate_stream("Rewrite:", "text")) == "Café — naïve façade"
+
+
+def test_stream_failing_part_way_raises_instead_of_truncating(monkeypatch):
+    monkeypatch.setattr(Config, 'WATSONX_API_KEY', None)
+    monkeypatch.setattr(Config, 'REWRITE_CACHE_ENABLED', False)
+    service = WatsonxLLMService()
+    service.access_token = 'token'
+
+    def _generate_stream(prompt, text):
+        yield "The rewrite"
+        raise requests.ConnectionError("connection reset")
+
+    service._generate_stream = _generate_stream
+    stream = service.rewrite_text_stream("Some text.", chunked=False)
+    assert next(stream) == "The rewrite"
+    with pytest.raises(requests.ConnectionError):
+        next(stream)
+
+
+def _chunked_service(monkeypatch):
+    monkeypatch.setattr(Config, 'WATSONX_API_KEY', None)
+    monkeypatch.setattr(Config, 'REWRITE_CACHE_ENABLED', False)
+    monkeypatch.setattr(Config, 'LLM_MAX_WORKERS', 2)
+    service = WatsonxLLMService()
+    service.access_token = 'token'
+    # Every paragraph is its own chunk
+    service._split = lambda text, tone: [(p, '\n\n' if i else '') for i, p in enumerate(text.split('\n\n'))]
+    return service
+
+
+def test_documents_and_chunks_share_the_request_limit(monkeypatch):
+    service = _chunked_service(monkeypatch)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def _post(url, payload, stream=False):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({'results': [{'generated_text': "Rewritten."}]}).encode()
+        return response
+
+    service._post = _post
+    texts = ["One.\n\nTwo.\n\nThree.\n\nFour."] * 4
+    assert service.rewrite_many(texts, max_workers=4) == ["Rewritten.\n\n" * 3 + "Rewritten."] * 4
+    assert peak[0] == 2
+
+
+def test_partly_failed_document_is_reported_as_an_item_error(monkeypatch):
+    service = _chunked_service(monkeypatch)
+
+    def _generate(prompt, text):
+        if text == "Two.":
+            raise requests.ConnectionError("connection reset")
+        return text.upper()
+
+    service._generate = _generate
+    errors = []
+    output = service.rewrite_many(["One.\n\nTwo."], on_progress=lambda done, total, index, error: errors.append(error))
+    assert output == ["ONE.\n\nTwo."]
+    assert isinstance(errors[0], PartialRewriteError)
+    assert (errors[0].failed, errors[0].total) == (1, 2)